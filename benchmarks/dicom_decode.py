@@ -0,0 +1,138 @@
+"""
+Latencia y memoria pico de la lectura DICOM: `read_dicom_image` (completa)
+frente a `read_dicom_lean` (reducida).
+
+Cada modo corre en un proceso nuevo para que el pico de RSS sea comparable.
+
+Uso:
+    python -m benchmarks.dicom_decode data/raw/DICOM
+    python -m benchmarks.dicom_decode --synthetic 3000
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing as mp
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+
+def synthetic_dicom(size: int = 3000, bits: int = 16) -> bytes:
+    """
+    DICOM sintético (CR, MONOCHROME2, sin comprimir) de size x size.
+    """
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1"
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = FileDataset(None, {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.Modality = "CR"
+    ds.StudyInstanceUID = generate_uid()
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Rows = ds.Columns = size
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16 if bits > 8 else 8
+    ds.BitsStored = bits
+    ds.HighBit = bits - 1
+    ds.PixelRepresentation = 0
+    ds.RescaleSlope = 1
+    ds.RescaleIntercept = 0
+    ds.WindowCenter = 2 ** (bits - 1)
+    ds.WindowWidth = 2 ** bits
+
+    rng = np.random.default_rng(0)
+    dtype = np.uint16 if bits > 8 else np.uint8
+    pixels = rng.integers(0, 2 ** bits, size=(size, size), dtype=dtype)
+    ds.PixelData = pixels.tobytes()
+
+    buf = io.BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss: KiB en Linux, bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _run_mode(mode: str, payloads: List[bytes], repeats: int, out: "mp.Queue") -> None:
+    from src.data.read_img import read_dicom_image, read_dicom_lean
+
+    if mode == "full":
+        def decode(data):
+            return read_dicom_image(data)
+    else:
+        def decode(data):
+            return read_dicom_lean(data)
+
+    rss_before = _peak_rss_mb()
+    tracemalloc.start()
+    times = []
+    for _ in range(repeats):
+        for data in payloads:
+            t0 = time.perf_counter()
+            decode(data)
+            times.append((time.perf_counter() - t0) * 1000.0)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    out.put({
+        "mode": mode,
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "traced_peak_mb": traced_peak / (1024 * 1024),
+        "rss_growth_mb": _peak_rss_mb() - rss_before,
+    })
+
+
+def run(payloads: List[bytes], repeats: int = 3) -> List[Dict[str, float]]:
+    ctx = mp.get_context("spawn")
+    results = []
+    for mode in ("full", "lean"):
+        out = ctx.Queue()
+        proc = ctx.Process(target=_run_mode, args=(mode, payloads, repeats, out))
+        proc.start()
+        results.append(out.get())
+        proc.join()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", help="Archivo .dcm o carpeta")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Usar un DICOM sintético de N x N (16 bits)")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        payloads = [synthetic_dicom(args.synthetic)]
+    elif args.path:
+        root = Path(args.path)
+        files = sorted(root.glob("*.dcm")) if root.is_dir() else [root]
+        payloads = [f.read_bytes() for f in files]
+    else:
+        parser.error("indique una ruta o --synthetic N")
+
+    print(f"{'modo':<6} {'p50 ms':>9} {'p95 ms':>9} {'pico traced MB':>15} {'+RSS MB':>9}")
+    for r in run(payloads, args.repeats):
+        print(f"{r['mode']:<6} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['traced_peak_mb']:>15.1f} {r['rss_growth_mb']:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Tiempos de decodificación por formato (JPEG, PNG, DICOM): lectura completa
+(`read_image`) frente a la reducida (`read_image(..., fast=True)`).
+
+Los PNG se generan en memoria a partir de las muestras JPEG.
+
+Uso:
+    python -m benchmarks.image_decode data/raw
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from src.data.read_img import read_image, sniff_format
+
+
+def collect_payloads(root: Path) -> Dict[str, List[bytes]]:
+    """Agrupa los archivos de `root` por formato detectado por contenido."""
+    payloads: Dict[str, List[bytes]] = {"jpeg": [], "png": [], "dicom": []}
+    for path in sorted(p for p in root.rglob("*") if p.is_file()):
+        data = path.read_bytes()
+        fmt = sniff_format(data)
+        if fmt in payloads:
+            payloads[fmt].append(data)
+
+    if not payloads["png"]:
+        for data in payloads["jpeg"]:
+            img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            payloads["png"].append(cv2.imencode(".png", img)[1].tobytes())
+    return payloads
+
+
+def time_decode(payloads: List[bytes], fast: bool, repeats: int) -> List[float]:
+    times = []
+    for _ in range(repeats):
+        for data in payloads:
+            t0 = time.perf_counter()
+            read_image(data, fast=fast, preview=False)
+            times.append((time.perf_counter() - t0) * 1000.0)
+    return times
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default="data/raw")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    payloads = collect_payloads(Path(args.path))
+
+    print(f"{'formato':<8} {'n':>3} {'completa p50':>13} {'reducida p50':>13} {'speedup':>8}")
+    for fmt, items in payloads.items():
+        if not items:
+            continue
+        full = float(np.median(time_decode(items, False, args.repeats)))
+        fast = float(np.median(time_decode(items, True, args.repeats)))
+        print(f"{fmt:<8} {len(items):>3} {full:>11.1f}ms {fast:>11.1f}ms {full / fast:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Benchmark reproducible del pipeline de inferencia: latencia por etapa y
+extremo a extremo (p50/p95/p99), throughput por tamaño de lote y memoria
+pico, comparado contra un baseline guardado.
+
+Sin `--model` usa un modelo sustituto pequeño (misma arquitectura que el de
+tests/test_grad_cam.py, pesos con semilla fija), así que corre sin el .h5
+real. Los resultados son un JSON plano `métrica -> valor`; las métricas
+`*_per_sec` son "más es mejor", el resto "menos es mejor".
+
+Uso:
+    python -m benchmarks.pipeline data/raw -o bench.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline data/raw --baseline benchmarks/baseline.json --threshold 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_BATCH_SIZES = (1, 4, 8, 16)
+
+
+def stand_in_model(layer_name: str = "conv10_thisone", seed: int = 0):
+    """Modelo CNN pequeño (512,512,1) -> 3 clases, con pesos reproducibles."""
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input(shape=(512, 512, 1), name="input")
+    x = tf.keras.layers.Conv2D(8, (3, 3), activation="relu", padding="same", name=layer_name)(inputs)
+    x = tf.keras.layers.MaxPool2D(pool_size=(2, 2))(x)
+    x = tf.keras.layers.Conv2D(16, (3, 3), activation="relu", padding="same")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(3, activation="softmax", name="preds")(x)
+    return tf.keras.Model(inputs=inputs, outputs=outputs)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss: KiB en Linux, bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _percentiles(prefix: str, times_ms: Sequence[float]) -> Dict[str, float]:
+    return {
+        f"{prefix}.p50_ms": float(np.percentile(times_ms, 50)),
+        f"{prefix}.p95_ms": float(np.percentile(times_ms, 95)),
+        f"{prefix}.p99_ms": float(np.percentile(times_ms, 99)),
+    }
+
+
+def _time_each(fn: Callable, items: Sequence, repeats: int) -> List[float]:
+    fn(items[0])  # calentamiento (trazado, pools, LUTs)
+    times = []
+    for _ in range(repeats):
+        for item in items:
+            t0 = time.perf_counter()
+            fn(item)
+            times.append((time.perf_counter() - t0) * 1000.0)
+    return times
+
+
+def _traced_peak_mb(fn: Callable, items: Sequence) -> float:
+    tracemalloc.start()
+    for item in items:
+        fn(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def run(
+    data_dir: str = "data/raw",
+    model_path: Optional[str] = None,
+    repeats: int = 3,
+    batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+) -> Dict[str, object]:
+    """
+    Ejecuta el benchmark completo.
+
+    Returns:
+        {"meta": {...}, "metrics": {nombre: valor}}
+    """
+    import tensorflow as tf
+
+    from src.app.bulk_scoring import discover_images
+    from src.app.integrator import PneumoniaDetector
+    from src.data.read_img import read_dicom_image, read_gray, sniff_format
+    from src.features.preprocess_img import preprocess_batch, preprocess_image
+    from src.visualizations.grad_cam import generate_gradcam
+
+    paths = discover_images([data_dir])
+    if not paths:
+        raise ValueError(f"Sin imágenes en: {data_dir}")
+    payloads = [Path(p).read_bytes() for p in paths]
+    dicoms = [d for d in payloads if sniff_format(d) == "dicom"]
+
+    model = tf.keras.models.load_model(model_path, compile=False) if model_path else stand_in_model()
+    detector = PneumoniaDetector(model=model)
+    grad_model = detector.get_grad_model()
+
+    images = [read_gray(d) for d in payloads]
+    batches = [preprocess_image(img) for img in images]
+
+    metrics: Dict[str, float] = {}
+
+    # Etapas, imagen a imagen
+    metrics.update(_percentiles("stage.decode", _time_each(read_gray, payloads, repeats)))
+    if dicoms:
+        metrics.update(_percentiles("stage.decode_dicom_legacy", _time_each(read_dicom_image, dicoms, repeats)))
+    metrics.update(_percentiles("stage.preprocess", _time_each(preprocess_image, images, repeats)))
+    metrics.update(_percentiles("stage.predict", _time_each(detector.infer, batches, repeats)))
+    pairs = list(zip(batches, images))
+    metrics.update(_percentiles(
+        "stage.gradcam",
+        _time_each(lambda p: generate_gradcam(model, p[0], p[1], grad_model=grad_model), pairs, repeats),
+    ))
+    # Extremo a extremo: bytes -> etiqueta + heatmap (sin caché)
+    metrics.update(_percentiles("end_to_end", _time_each(detector.predict, payloads, repeats)))
+
+    # Throughput por tamaño de lote (forward + Grad-CAM, sobre tensores listos)
+    for size in batch_sizes:
+        batch = np.concatenate([batches[i % len(batches)] for i in range(size)], axis=0)
+        detector.infer_with_cam(batch)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            detector.infer_with_cam(batch)
+        elapsed = time.perf_counter() - t0
+        metrics[f"throughput.batch_{size}.images_per_sec"] = size * repeats / elapsed
+
+    # Memoria: pico de asignaciones Python/NumPy por etapa y RSS del proceso
+    metrics["memory.decode_traced_peak_mb"] = _traced_peak_mb(read_gray, payloads)
+    metrics["memory.preprocess_batch_traced_peak_mb"] = _traced_peak_mb(
+        lambda imgs: preprocess_batch(imgs), [images]
+    )
+    metrics["memory.peak_rss_mb"] = _peak_rss_mb()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "tensorflow": tf.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": model_path or "stand-in",
+            "images": len(paths),
+            "repeats": repeats,
+            "batch_sizes": list(batch_sizes),
+        },
+        "metrics": {k: round(v, 4) for k, v in metrics.items()},
+    }
+
+
+def compare(
+    current: Dict[str, float],
+    baseline: Dict[str, float],
+    threshold: float = 0.25,
+    min_delta: float = 1.0,
+) -> List[Dict[str, object]]:
+    """
+    Métricas que empeoran más de `threshold` (fracción) respecto al baseline.
+    En latencias y memoria, un cambio absoluto menor que `min_delta` (ms/MB)
+    se trata como ruido. Las métricas que faltan en alguno de los dos se
+    ignoran.
+    """
+    regressions = []
+    for name, base in sorted(baseline.items()):
+        value = current.get(name)
+        if value is None or not base:
+            continue
+        higher_is_better = name.endswith("_per_sec")
+        change = (value - base) / base
+        if higher_is_better:
+            worse = change < -threshold
+        else:
+            worse = change > threshold and value - base >= min_delta
+        if worse:
+            regressions.append({"metric": name, "baseline": base, "current": value, "change": round(change, 4)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default="data/raw")
+    parser.add_argument("--model", default=None, help="Modelo .h5/.keras (por defecto, el sustituto)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch-sizes", default=",".join(map(str, DEFAULT_BATCH_SIZES)))
+    parser.add_argument("-o", "--output", default=None, help="Guardar los resultados (JSON)")
+    parser.add_argument("--baseline", default=None, help="Baseline contra el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Empeoramiento tolerado (fracción, 0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="Cambio absoluto mínimo (ms/MB) para contar como regresión")
+    parser.add_argument("--save-baseline", default=None, help="Guardar estos resultados como baseline")
+    args = parser.parse_args(argv)
+
+    results = run(
+        args.path,
+        model_path=args.model,
+        repeats=args.repeats,
+        batch_sizes=[int(s) for s in args.batch_sizes.split(",") if s],
+    )
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    for target in (args.output, args.save_baseline):
+        if target:
+            Path(target).write_text(text + "\n", encoding="utf-8")
+
+    for name, value in results["metrics"].items():
+        print(f"{name:<48} {value:>12.2f}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(
+            results["metrics"], baseline["metrics"], args.threshold, args.min_delta
+        )
+        if regressions:
+            print(f"\n{len(regressions)} regresiones (> {args.threshold:.0%}):")
+            for r in regressions:
+                print(f"  {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} ({r['change']:+.0%})")
+            return 1
+        print(f"\nSin regresiones frente a {args.baseline} (umbral {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
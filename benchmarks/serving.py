@@ -0,0 +1,279 @@
+"""
+Carga local contra `python main.py serve`: latencia (p50/p95/p99) y
+peticiones por segundo de POST / para distintas combinaciones de workers e
+hilos de TF por worker.
+
+Cada combinación arranca un servidor nuevo con el modelo sustituto de
+`benchmarks.pipeline` (o `--model`), espera a que todos sus workers estén
+listos y lanza `--requests` peticiones con `--concurrency` clientes. La
+caché de resultados se desactiva para que cada petición pase por el modelo.
+
+Uso:
+    python -m benchmarks.serving data/raw --layouts 1x1,2x1,1x2 --concurrency 8
+    python -m benchmarks.serving --layouts 4x1,2x2,1x4 --requests 400 -o serving.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from benchmarks.pipeline import _percentiles, stand_in_model
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_LAYOUTS = "1x1,2x1,1x2"
+
+
+def parse_layouts(text: str) -> List[Tuple[int, int]]:
+    """'2x1,1x2' -> [(workers, hilos intra-op), ...]."""
+    layouts = []
+    for item in text.split(","):
+        workers, _, threads = item.strip().partition("x")
+        layouts.append((int(workers), int(threads or 0)))
+    return layouts
+
+
+def _payloads(data_dir: Optional[str], limit: int = 32) -> List[Tuple[str, bytes]]:
+    if data_dir and Path(data_dir).exists():
+        from src.app.bulk_scoring import discover_images
+
+        paths = discover_images([data_dir])[:limit]
+        if paths:
+            return [(Path(p).name, Path(p).read_bytes()) for p in paths]
+    # Sin imágenes: radiografías sintéticas (ruido) en PNG
+    import cv2
+
+    rng = np.random.default_rng(0)
+    return [
+        (f"sintetica_{i}.png", cv2.imencode(".png", rng.integers(0, 256, (1024, 1024), dtype=np.uint8))[1].tobytes())
+        for i in range(8)
+    ]
+
+
+def _multipart(filename: str, data: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    return head + data + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get_json(port: int, path: str) -> Tuple[int, Dict[str, object]]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+def start_server(
+    workers: int,
+    intra_op: int,
+    model_path: str,
+    workdir: Path,
+    timeout: float = 180.0,
+) -> Tuple[subprocess.Popen, int]:
+    """
+    Arranca el servidor (cwd = `workdir`, así uploads, heatmaps y el
+    historial no tocan el repo) y espera a que los `workers` respondan
+    /ready con 200.
+    """
+    port = _free_port()
+    env = {
+        **os.environ,
+        "UAO_MODEL_PATH": model_path,
+        "UAO_RESULTS_DB": str(workdir / "results.sqlite3"),
+        "UAO_CACHE_MAX_ENTRIES": "0",
+        "TF_CPP_MIN_LOG_LEVEL": "2",
+    }
+    cmd = [sys.executable, str(ROOT / "main.py"), "serve", "--port", str(port), "--workers", str(workers)]
+    if intra_op:
+        cmd += ["--intra-op", str(intra_op)]
+    with open(workdir / f"server_{port}.log", "wb") as log:
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=log)
+
+    ready = set()
+    deadline = time.monotonic() + timeout
+    while len(ready) < workers:
+        if proc.poll() is not None or time.monotonic() > deadline:
+            stop_server(proc)
+            raise RuntimeError(f"El servidor no quedó listo (ver {workdir}/server_{port}.log)")
+        try:
+            status, body = _get_json(port, "/ready")
+        except OSError:
+            status, body = 0, {}
+        if status == 200:
+            ready.add(body["worker"]["pid"])
+        else:
+            time.sleep(0.2)
+    return proc, port
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def generate_load(
+    port: int,
+    payloads: Sequence[Tuple[str, bytes]],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, object]:
+    """
+    `requests` POST / repartidos entre `concurrency` clientes, cada uno con
+    su conexión keep-alive.
+
+    Returns:
+        dict con latencias (ms) de las respuestas 200, errores y segundos.
+    """
+    bodies = [_multipart(name, data) for name, data in payloads]
+    local = threading.local()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = {"count": 0}
+
+    def one(i: int) -> None:
+        body, content_type = bodies[i % len(bodies)]
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", "/", body=body, headers={"Content-Type": content_type})
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            ok = False
+        ms = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            if ok:
+                latencies.append(ms)
+            else:
+                errors["count"] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return {"latencies_ms": latencies, "errors": errors["count"], "elapsed_s": time.perf_counter() - started}
+
+
+def run(
+    data_dir: Optional[str] = "data/raw",
+    model_path: Optional[str] = None,
+    layouts: Sequence[Tuple[int, int]] = parse_layouts(DEFAULT_LAYOUTS),
+    requests: int = 200,
+    concurrency: int = 8,
+    warmup_requests: int = 8,
+) -> Dict[str, object]:
+    """
+    Mide cada layout (workers, hilos intra-op; 0 = derivado).
+
+    Returns:
+        {"meta": {...}, "metrics": {"<W>x<T>.<métrica>": valor}}
+    """
+    from src.app.serving import available_cpus
+
+    payloads = _payloads(data_dir)
+    stand_in = model_path is None
+    metrics: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory(prefix="uao-serving-") as tmp:
+        workdir = Path(tmp)
+        if stand_in:
+            model_path = str(workdir / "stand_in.keras")
+            stand_in_model().save(model_path)
+        model_path = os.path.abspath(model_path)
+
+        for workers, intra_op in layouts:
+            name = f"{workers}x{intra_op or 'auto'}"
+            proc, port = start_server(workers, intra_op, model_path, workdir)
+            try:
+                generate_load(port, payloads, warmup_requests, concurrency)
+                result = generate_load(port, payloads, requests, concurrency)
+            finally:
+                stop_server(proc)
+            times = result["latencies_ms"]
+            metrics[f"{name}.requests_per_sec"] = len(times) / result["elapsed_s"]
+            metrics[f"{name}.errors"] = float(result["errors"])
+            if times:
+                metrics.update(_percentiles(name, times))
+
+    return {
+        "meta": {
+            "cpus": available_cpus(),
+            "model": "stand-in" if stand_in else model_path,
+            "images": len(payloads),
+            "requests": requests,
+            "concurrency": concurrency,
+            "layouts": [f"{w}x{t or 'auto'}" for w, t in layouts],
+        },
+        "metrics": {k: round(v, 2) for k, v in metrics.items()},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default="data/raw", help="Imágenes a enviar (o sintéticas)")
+    parser.add_argument("--model", default=None, help="Modelo .h5/.keras (por defecto, el sustituto)")
+    parser.add_argument("--layouts", default=DEFAULT_LAYOUTS,
+                        help="Combinaciones workers x hilos intra-op (0 = derivado), separadas por comas")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes simultáneos")
+    parser.add_argument("-o", "--output", default=None, help="Guardar los resultados (JSON)")
+    args = parser.parse_args(argv)
+
+    results = run(
+        args.path,
+        model_path=args.model,
+        layouts=parse_layouts(args.layouts),
+        requests=args.requests,
+        concurrency=args.concurrency,
+    )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    print(f"{'layout':<10} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    m = results["metrics"]
+    for layout in results["meta"]["layouts"]:
+        print(
+            f"{layout:<10} {m[f'{layout}.requests_per_sec']:>8.2f} {m.get(f'{layout}.p50_ms', 0):>9.1f} "
+            f"{m.get(f'{layout}.p95_ms', 0):>9.1f} {m.get(f'{layout}.p99_ms', 0):>9.1f} {m[f'{layout}.errors']:>8.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
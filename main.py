@@ -1,6 +1,294 @@
-def main():
-    print("Hello from uao-neumonia!")
+"""
+Línea de comandos de UAONeumonia.
+
+Uso:
+    python main.py score data/raw/DICOM data/raw/JPG -o resultados.csv
+    python main.py score data/raw -o resultados.jsonl --gradcam-dir heatmaps
+    python main.py quantize --backend tflite-int8 --calibration-dir data/raw data/raw
+    python main.py study data/estudios -o estudios.jsonl
+    python main.py evaluate data/raw --model models/conv_MLP_84.h5
+    python main.py serve --host 0.0.0.0 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+
+# Igual que integrator.BACKENDS (sin importar TensorFlow al parsear)
+BACKEND_CHOICES = ("keras", "tflite-float16", "tflite-int8")
+
+
+def _print_progress(stats) -> None:
+    done = stats.scored + stats.errors
+    print(
+        f"\r{done}/{stats.total - stats.skipped} imágenes "
+        f"({stats.images_per_sec:.1f} img/s, {stats.errors} errores)",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def cmd_score(args: argparse.Namespace) -> int:
+    from src.app.bulk_scoring import discover_images, score_paths
+    from src.app.integrator import PneumoniaDetector
+
+    paths = discover_images(args.paths)
+    if not paths:
+        print("No se encontraron imágenes (.dcm/.jpg/.jpeg/.png)", file=sys.stderr)
+        return 1
+
+    detector = PneumoniaDetector(
+        model_path=args.model,
+        layer_name=args.layer,
+        engine=args.engine,
+        jit_compile=args.xla,
+        backend=args.backend,
+        calibration_dir=args.calibration_dir,
+    )
+    stats = score_paths(
+        detector,
+        paths,
+        output_path=args.output,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        prefetch=args.prefetch,
+        gradcam_dir=args.gradcam_dir,
+        resume=not args.no_resume,
+        progress=None if args.quiet else _print_progress,
+    )
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    stages = ", ".join(f"{k}={v:.1f}s" for k, v in stats.stage_s.items())
+    print(
+        f"{stats.scored} puntuadas, {stats.errors} errores, {stats.skipped} ya completadas; "
+        f"{stats.images_per_sec:.1f} img/s en {stats.elapsed_s:.1f}s ({stages})"
+    )
+    return 0
+
+
+def cmd_quantize(args: argparse.Namespace) -> int:
+    from src.app.bulk_scoring import discover_images
+    from src.app.integrator import LABELS, PneumoniaDetector
+    from src.models.tflite_backend import agreement_report
+
+    detector = PneumoniaDetector(
+        model_path=args.model,
+        backend=args.backend,
+        calibration_dir=args.calibration_dir,
+    )
+    # Convierte (o reutiliza) el .tflite junto a los pesos
+    quantized = detector.get_backend()
+    print(f"{args.backend}: {quantized.size_bytes / 1e6:.2f} MB", file=sys.stderr)
+
+    paths = discover_images(args.paths)
+    if not paths:
+        print("No se encontraron imágenes (.dcm/.jpg/.jpeg/.png)", file=sys.stderr)
+        return 1
+
+    model = detector.model
+    report = agreement_report(
+        lambda batch: model(batch, training=False).numpy(),
+        quantized.predict,
+        paths,
+        LABELS,
+    )
+    report["backend"] = args.backend
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+def cmd_study(args: argparse.Namespace) -> int:
+    from src.app.integrator import PneumoniaDetector
+    from src.app.studies import predict_studies
+    from src.data.series import find_dicom_files
+
+    sources = find_dicom_files(args.paths)
+    if not sources:
+        print("No se encontraron archivos .dcm", file=sys.stderr)
+        return 1
+
+    detector = PneumoniaDetector(
+        model_path=args.model,
+        layer_name=args.layer,
+        engine=args.engine,
+        jit_compile=args.xla,
+        backend=args.backend,
+        calibration_dir=args.calibration_dir,
+    )
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for study in predict_studies(detector, sources, batch_size=args.batch_size):
+            summary = study.to_dict()
+            print(f"{summary['study_uid']}: {summary['label']} {summary['probability']:.2f}% "
+                  f"({summary['frames']} frames)")
+            if out is not None:
+                out.write(json.dumps(summary, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        if out is not None:
+            out.close()
+    return 0
+
+
+def cmd_evaluate(args: argparse.Namespace) -> int:
+    from src.app.bulk_scoring import discover_images
+    from src.app.integrator import LABELS, PneumoniaDetector
+    from src.features.tensor_cache import TensorCache
+    from src.models.evaluate import evaluate, format_confusion
+
+    paths = discover_images(args.paths)
+    if not paths:
+        print("No se encontraron imágenes (.dcm/.jpg/.jpeg/.png)", file=sys.stderr)
+        return 1
+
+    detector = PneumoniaDetector(
+        model_path=args.model,
+        engine=args.engine,
+        jit_compile=args.xla,
+        backend=args.backend,
+        calibration_dir=args.calibration_dir,
+    )
+    report = evaluate(detector.infer, paths, LABELS, TensorCache(args.cache_dir),
+                      batch_size=args.batch_size)
+    report["model"] = detector.model_id
+
+    cache = report["cache"]
+    print(f"Caché: {cache['reused']} reutilizados, {cache['processed']} procesados "
+          f"({cache['build_s']:.1f}s), {len(cache['errors'])} errores", file=sys.stderr)
+    accuracy = "-" if report["accuracy"] is None else f"{report['accuracy']:.2%}"
+    print(f"Exactitud: {accuracy} sobre {report['labelled']} imágenes etiquetadas; "
+          f"{report['images_per_sec']} img/s")
+    print(format_confusion(report["confusion"]))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    import logging
+
+    from src.app.serving import serve, thread_budget
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    budget = thread_budget(
+        workers=args.workers,
+        intra_op=args.intra_op or None,
+        inter_op=args.inter_op or None,
+        cv2_threads=args.cv2_threads or None,
+    )
+    # La app sabe así que comparte carpetas y trabajos con otros workers
+    os.environ["UAO_WORKERS"] = str(budget.workers)
+
+    def load_app():
+        from ui.main import app
+
+        return app
+
+    return serve(
+        load_app,
+        host=args.host,
+        port=args.port,
+        budget=budget,
+        preload_modules=not args.no_preload,
+        preload_model=os.environ.get("UAO_MODEL_PATH", "models/conv_MLP_84.h5"),
+        access_log=args.access_log,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="uao-neumonia", description="Detección de neumonía en radiografías")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser("score", help="Puntuar carpetas completas de imágenes")
+    score.add_argument("paths", nargs="+", help="Carpetas o archivos (.dcm/.jpg/.jpeg/.png)")
+    score.add_argument("-o", "--output", default="resultados.csv", help="Salida .csv o .jsonl")
+    score.add_argument("--model", default="models/conv_MLP_84.h5", help="Ruta del modelo .h5")
+    score.add_argument("--layer", default="conv10_thisone", help="Capa conv para Grad-CAM")
+    score.add_argument("--engine", choices=("eager", "compiled"), default="eager",
+                       help="Motor de inferencia")
+    score.add_argument("--xla", action="store_true", help="Compilar con XLA (motor compilado)")
+    score.add_argument("--backend", choices=BACKEND_CHOICES, default="keras",
+                       help="Backend de la predicción (Grad-CAM siempre en Keras)")
+    score.add_argument("--calibration-dir", default="data/raw", help="Imágenes de calibración int8")
+    score.add_argument("--batch-size", type=int, default=16)
+    score.add_argument("--workers", type=int, default=None, help="Procesos de decodificación")
+    score.add_argument("--prefetch", type=int, default=4, help="Lotes decodificados por adelantado")
+    score.add_argument("--gradcam-dir", default=None, help="Guardar heatmaps Grad-CAM en esta carpeta")
+    score.add_argument("--no-resume", action="store_true", help="Reescribir la salida desde cero")
+    score.add_argument("-q", "--quiet", action="store_true")
+    score.set_defaults(func=cmd_score)
+
+    quantize = sub.add_parser("quantize", help="Convertir a TFLite y comparar con el modelo float32")
+    quantize.add_argument("paths", nargs="+", help="Carpetas etiquetadas para el reporte de concordancia")
+    quantize.add_argument("--backend", choices=BACKEND_CHOICES[1:], default="tflite-int8")
+    quantize.add_argument("--model", default="models/conv_MLP_84.h5", help="Ruta del modelo .h5")
+    quantize.add_argument("--calibration-dir", default="data/raw", help="Imágenes de calibración int8")
+    quantize.add_argument("-o", "--output", default=None, help="Guardar el reporte JSON")
+    quantize.set_defaults(func=cmd_quantize)
+
+    study = sub.add_parser("study", help="Puntuar estudios DICOM (series y multi-frame) por StudyInstanceUID")
+    study.add_argument("paths", nargs="+", help="Carpetas o archivos .dcm")
+    study.add_argument("-o", "--output", default=None, help="Salida .jsonl (un estudio por línea)")
+    study.add_argument("--model", default="models/conv_MLP_84.h5", help="Ruta del modelo .h5")
+    study.add_argument("--layer", default="conv10_thisone", help="Capa conv para Grad-CAM")
+    study.add_argument("--engine", choices=("eager", "compiled"), default="eager",
+                       help="Motor de inferencia")
+    study.add_argument("--xla", action="store_true", help="Compilar con XLA (motor compilado)")
+    study.add_argument("--backend", choices=BACKEND_CHOICES, default="keras",
+                       help="Backend de la predicción (Grad-CAM siempre en Keras)")
+    study.add_argument("--calibration-dir", default="data/raw", help="Imágenes de calibración int8")
+    study.add_argument("--batch-size", type=int, default=8, help="Frames por forward")
+    study.set_defaults(func=cmd_study)
+
+    evaluate = sub.add_parser("evaluate", help="Exactitud y matriz de confusión sobre carpetas etiquetadas")
+    evaluate.add_argument("paths", nargs="+", help="Carpetas etiquetadas (bacteria/normal/virus)")
+    evaluate.add_argument("--model", default="models/conv_MLP_84.h5", help="Ruta del modelo .h5")
+    evaluate.add_argument("--engine", choices=("eager", "compiled"), default="eager",
+                          help="Motor de inferencia")
+    evaluate.add_argument("--xla", action="store_true", help="Compilar con XLA (motor compilado)")
+    evaluate.add_argument("--backend", choices=BACKEND_CHOICES, default="keras",
+                          help="Backend de la predicción")
+    evaluate.add_argument("--calibration-dir", default="data/raw", help="Imágenes de calibración int8")
+    evaluate.add_argument("--cache-dir", default="data/processed/tensors",
+                          help="Caché de tensores preprocesados (shards .npy)")
+    evaluate.add_argument("--batch-size", type=int, default=16)
+    evaluate.add_argument("-o", "--output", default=None, help="Guardar el reporte JSON")
+    evaluate.set_defaults(func=cmd_evaluate)
+
+    env = os.environ.get
+    serve = sub.add_parser("serve", help="Servir la UI y la API con varios procesos (prefork)")
+    serve.add_argument("--host", default=env("UAO_HOST", "127.0.0.1"))
+    serve.add_argument("--port", type=int, default=int(env("UAO_PORT", "5000")))
+    serve.add_argument("--workers", type=int, default=int(env("UAO_WORKERS", "1")),
+                       help="Procesos (cada uno con su modelo y sus hilos)")
+    serve.add_argument("--intra-op", type=int, default=int(env("UAO_TF_INTRA_THREADS", "0")),
+                       help="Hilos de TF por op en cada worker (0 = núcleos / workers)")
+    serve.add_argument("--inter-op", type=int, default=int(env("UAO_TF_INTER_THREADS", "0")),
+                       help="Hilos de TF entre ops en cada worker (0 = derivar)")
+    serve.add_argument("--cv2-threads", type=int, default=int(env("UAO_CV2_THREADS", "0")),
+                       help="Hilos de OpenCV y del preprocesamiento por worker (0 = derivar)")
+    serve.add_argument("--no-preload", action="store_true", help="No precargar módulos antes del fork")
+    serve.add_argument("--access-log", action="store_true", help="Registrar cada petición")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Carpetas de artefactos acotadas (originales subidos, CAMs persistidos).
+
+Cada carpeta tiene una cuota en bytes y un TTL desde el último acceso. El
+uso se lleva de forma incremental: la carpeta se recorre al arrancar y
+después cada escritura o borrado ajusta el contador, así que imponer la
+cuota no vuelve a listar el directorio. Los archivos se mantienen en orden
+LRU; al superar la cuota se borran los menos usados y los que llevan más
+de `ttl_seconds` sin tocarse se borran al escribir o al barrer.
+
+Si varios procesos comparten la carpeta (`python main.py serve --workers
+N`), `rescan_seconds` hace que cada uno vuelva a contar el disco como
+mucho una vez por intervalo antes de imponer la cuota y el TTL, y un
+archivo que escribió otro proceso se adopta al abrirlo.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+# Nombres planos (sin separadores ni "..")
+_NAME = re.compile(r"[0-9A-Za-z_-][0-9A-Za-z._-]{0,127}")
+# Un .tmp más viejo que esto es de una escritura que no terminó
+_STALE_TMP_SECONDS = 60.0
+
+
+class ArtifactStore:
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        rescan_seconds: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            root: Carpeta de los artefactos.
+            max_bytes: Cuota total (None = sin cuota).
+            ttl_seconds: Vida máxima sin accesos (None = sin TTL).
+            rescan_seconds: Cada cuánto volver a contar la carpeta, para
+                que la cuota y el TTL cubran lo que escriben otros procesos
+                (None = solo al arrancar).
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.ttl_seconds = float(ttl_seconds) if ttl_seconds else None
+        self.rescan_seconds = float(rescan_seconds) if rescan_seconds else None
+
+        self._lock = threading.Lock()
+        # nombre -> (bytes, último acceso), del menos al más reciente
+        self._files: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._bytes = 0
+        self.writes = 0
+        self.evictions = {"quota": 0, "ttl": 0}
+        self.evicted_bytes = 0
+        self.rescans = 0
+        self._scanned_at = 0.0
+        with self._lock:
+            self._scan(cleanup=True)
+        self.sweep()
+
+    def _scan(self, cleanup: bool = False) -> None:
+        # Requiere self._lock. Rehace el índice desde el disco: el último
+        # acceso de cada archivo es su mtime (`open` lo persiste).
+        now = time.time()
+        found = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # otro proceso lo borró entretanto
+                if entry.name.endswith(".tmp"):
+                    # Escritura interrumpida (la de otro proceso vivo es reciente)
+                    if cleanup and now - st.st_mtime > _STALE_TMP_SECONDS:
+                        _unlink(entry.path)
+                    continue
+                found.append((st.st_mtime, entry.name, st.st_size))
+        self._files = OrderedDict((name, (size, mtime)) for mtime, name, size in sorted(found))
+        self._bytes = sum(size for size, _ in self._files.values())
+        self._scanned_at = now
+
+    def _maybe_rescan(self, now: float) -> None:
+        # Requiere self._lock
+        if self.rescan_seconds is not None and now - self._scanned_at >= self.rescan_seconds:
+            self._scan()
+            self.rescans += 1
+
+    def path(self, name: str) -> Path:
+        """Ruta del artefacto `name` (exista o no)."""
+        if not _NAME.fullmatch(name):
+            raise ValueError(f"Nombre de artefacto inválido: {name!r}")
+        return self.root / name
+
+    def write(self, name: str, data: bytes) -> Path:
+        """
+        Escribe (o reemplaza) un artefacto de forma atómica y aplica la
+        cuota y el TTL.
+        """
+        path = self.path(name)
+        tmp = path.with_name(f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        now = time.time()
+        with self._lock:
+            self._maybe_rescan(now)
+            old = self._files.pop(name, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._files[name] = (len(data), now)
+            self._bytes += len(data)
+            self.writes += 1
+            doomed = self._expired(now) + self._over_quota(keep=name)
+        self._remove(doomed)
+        return path
+
+    def open(self, name: str) -> Optional[Path]:
+        """
+        Ruta de un artefacto vigente (None si no existe o caducó). Cuenta
+        como acceso para el LRU y el TTL.
+        """
+        try:
+            path = self.path(name)
+        except ValueError:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._files.get(name) or self._adopt(name)
+            if entry is None:
+                return None
+            if self.ttl_seconds is not None and now - entry[1] > self.ttl_seconds:
+                doomed = [(name, "ttl", self._forget(name))]
+            else:
+                doomed = []
+                self._files[name] = (entry[0], now)
+                self._files.move_to_end(name)
+        if doomed:
+            self._remove(doomed)
+            return None
+        try:
+            # Persistir el acceso para que el orden sobreviva a un reinicio
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(name)
+            return None
+        return path
+
+    def read(self, name: str) -> Optional[bytes]:
+        path = self.open(name)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            known = self._forget(name)
+        if known is not None:
+            _unlink(self.path(name))
+
+    def sweep(self) -> int:
+        """Borra lo caducado y lo que exceda la cuota; retorna cuántos borró."""
+        now = time.time()
+        with self._lock:
+            self._maybe_rescan(now)
+            doomed = self._expired(now) + self._over_quota()
+        self._remove(doomed)
+        return len(doomed)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            self._maybe_rescan(time.time())
+            return {
+                "files": len(self._files),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "writes": self.writes,
+                "evictions": dict(self.evictions),
+                "evicted_bytes": self.evicted_bytes,
+                "rescans": self.rescans,
+            }
+
+    def _expired(self, now: float):
+        # Requiere self._lock. En orden LRU los caducados están al principio.
+        doomed = []
+        if self.ttl_seconds is None:
+            return doomed
+        while self._files:
+            name, (_, accessed) = next(iter(self._files.items()))
+            if now - accessed <= self.ttl_seconds:
+                break
+            doomed.append((name, "ttl", self._forget(name)))
+        return doomed
+
+    def _over_quota(self, keep: Optional[str] = None):
+        # Requiere self._lock. Nunca expulsa `keep` (lo recién escrito).
+        doomed = []
+        if self.max_bytes is None:
+            return doomed
+        while self._bytes > self.max_bytes and len(self._files) > (keep is not None):
+            name = next(iter(self._files))
+            if name == keep:
+                self._files.move_to_end(name)
+                continue
+            doomed.append((name, "quota", self._forget(name)))
+        return doomed
+
+    def _adopt(self, name: str) -> Optional[Tuple[int, float]]:
+        # Requiere self._lock. Archivo que no está en el índice pero sí en
+        # disco (lo escribió otro proceso): se suma al uso con su mtime.
+        try:
+            st = os.stat(self.root / name)
+        except FileNotFoundError:
+            return None
+        entry = self._files[name] = (st.st_size, st.st_mtime)
+        self._bytes += st.st_size
+        return entry
+
+    def _forget(self, name: str) -> Optional[int]:
+        # Requiere self._lock. Retorna el tamaño del archivo olvidado.
+        entry = self._files.pop(name, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[0]
+        return entry[0]
+
+    def _remove(self, doomed) -> None:
+        # Fuera del lock: el borrado toca disco
+        for name, reason, size in doomed:
+            with self._lock:
+                if name in self._files:
+                    continue  # se volvió a escribir entretanto
+                self.evictions[reason] += 1
+                self.evicted_bytes += size
+            _unlink(self.root / name)
+
+
+def _unlink(path: Union[str, Path]) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
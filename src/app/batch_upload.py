@@ -0,0 +1,147 @@
+"""
+Lotes subidos por HTTP (un ZIP o muchos archivos en un multipart).
+
+Los miembros del ZIP se leen de a uno desde el archivo subido, sin
+descomprimirlo a disco, y pasan por el modelo en lotes; cada resultado se
+entrega en cuanto termina su lote, así que el cliente recibe las primeras
+filas mucho antes de que se procese la última imagen. Los límites se
+comprueban con el directorio central del ZIP antes de decodificar nada y
+se vuelven a imponer al leer (un tamaño declarado falso no infla la
+memoria).
+"""
+
+from __future__ import annotations
+
+import posixpath
+import zipfile
+from collections import deque
+from dataclasses import dataclass
+from typing import IO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.app.bulk_scoring import IMAGE_EXTENSIONS
+from src.app.integrator import PneumoniaDetector, PredictionResult
+from src.app.metrics import METRICS
+
+ResultCallback = Callable[[str, PredictionResult], Optional[Dict[str, object]]]
+
+
+class BatchLimitError(ValueError):
+    """El lote supera alguno de los límites configurados."""
+
+
+@dataclass(frozen=True)
+class BatchLimits:
+    # Tamaño del ZIP (o del cuerpo multipart) subido
+    max_archive_bytes: int = 512 * 1024 * 1024
+    # Imágenes por lote
+    max_members: int = 1000
+    # Tamaño descomprimido de una imagen y del lote completo
+    max_member_bytes: int = 64 * 1024 * 1024
+    max_total_bytes: int = 2 * 1024 * 1024 * 1024
+
+
+def _is_image(name: str) -> bool:
+    base = posixpath.basename(name)
+    return (
+        not name.startswith("__MACOSX/")
+        and not base.startswith(".")
+        and posixpath.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def open_zip(fileobj: IO[bytes], limits: BatchLimits) -> Tuple[zipfile.ZipFile, List[zipfile.ZipInfo]]:
+    """
+    Abre un ZIP subido (stream con seek) y valida su directorio central.
+
+    Returns:
+        El ZipFile y sus miembros de imagen, en el orden del archivo.
+
+    Raises:
+        BatchLimitError: Demasiados miembros o demasiados bytes.
+        ValueError: Si no es un ZIP válido.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as exc:
+        raise ValueError(f"ZIP inválido: {exc}") from None
+
+    members = [i for i in archive.infolist() if not i.is_dir() and _is_image(i.filename)]
+    if len(members) > limits.max_members:
+        raise BatchLimitError(f"Máximo {limits.max_members} imágenes por lote")
+    big = next((i for i in members if i.file_size > limits.max_member_bytes), None)
+    if big is not None:
+        raise BatchLimitError(f"{big.filename}: supera {limits.max_member_bytes} bytes")
+    if sum(i.file_size for i in members) > limits.max_total_bytes:
+        raise BatchLimitError(f"El lote descomprimido supera {limits.max_total_bytes} bytes")
+    return archive, members
+
+
+def iter_zip_members(
+    archive: zipfile.ZipFile,
+    members: Iterable[zipfile.ZipInfo],
+    limits: BatchLimits,
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    (nombre, bytes) de cada miembro, leído solo cuando se pide.
+
+    Raises:
+        BatchLimitError: Si un miembro descomprime más de lo declarado.
+    """
+    for info in members:
+        with archive.open(info) as f:
+            data = f.read(min(info.file_size, limits.max_member_bytes) + 1)
+        if len(data) > info.file_size:
+            raise BatchLimitError(f"{info.filename}: tamaño declarado inválido")
+        yield info.filename, data
+
+
+def score_stream(
+    detector: PneumoniaDetector,
+    items: Iterable[Tuple[str, bytes]],
+    batch_size: int = 8,
+    on_result: Optional[ResultCallback] = None,
+) -> Iterator[Dict[str, object]]:
+    """
+    Puntúa (nombre, bytes) en lotes y entrega una fila por imagen, en el
+    orden de entrada, a medida que termina cada lote. Una imagen que no se
+    puede leer produce una fila con "error" y no detiene el lote.
+
+    Args:
+        detector: Detector ya configurado.
+        items: Imágenes a puntuar, leídas de forma perezosa.
+        batch_size: Imágenes por forward.
+        on_result: Recibe (nombre, PredictionResult) con CAM e imagen; lo
+            que retorne se añade a la fila.
+    """
+    # Filas en espera de su turno: nombres ya leídos o errores de lectura
+    pending: Deque[Tuple[str, Optional[str]]] = deque()
+
+    def images():
+        for name, data in items:
+            try:
+                image = detector.read(data)
+            except Exception as exc:  # noqa: BLE001 - se reporta en la fila de esa imagen
+                pending.append((name, f"{type(exc).__name__}: {exc}"))
+                continue
+            pending.append((name, None))
+            yield image
+
+    def failed() -> Iterator[Dict[str, object]]:
+        while pending and pending[0][1] is not None:
+            name, error = pending.popleft()
+            METRICS.inc("batch_upload_images", status="error")
+            yield {"name": name, "error": error}
+
+    for result in detector.predict_frames(images(), batch_size=batch_size):
+        yield from failed()
+        name, _ = pending.popleft()
+        row: Dict[str, object] = {
+            "name": name,
+            "label": result.label,
+            "probability": round(result.probability, 2),
+        }
+        if on_result is not None:
+            row.update(on_result(name, result) or {})
+        METRICS.inc("batch_upload_images", status="ok")
+        yield row
+    yield from failed()
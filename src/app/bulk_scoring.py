@@ -0,0 +1,298 @@
+"""
+Puntuación masiva de carpetas de estudios.
+
+Pipeline en streaming: un pool de procesos decodifica y preprocesa, una
+ventana de prefetch acotada mantiene al modelo con lotes llenos, Grad-CAM
+es opcional y cada resultado se escribe al momento en CSV/JSONL, así que un
+corte a mitad de un archivo de 100k imágenes se reanuda desde el último
+archivo completado.
+
+Este módulo no importa TensorFlow a nivel de módulo: los procesos del pool
+solo cargan OpenCV/pydicom.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+IMAGE_EXTENSIONS = (".dcm", ".jpg", ".jpeg", ".png")
+
+
+def discover_images(roots: Iterable[str]) -> List[str]:
+    """
+    Lista (ordenada) de imágenes bajo las rutas dadas, recursivamente.
+
+    Args:
+        roots: Carpetas o archivos.
+
+    Returns:
+        Rutas normalizadas.
+    """
+    found: List[str] = []
+    for root in roots:
+        path = Path(root)
+        if path.is_file():
+            found.append(os.path.normpath(str(path)))
+            continue
+        for p in path.rglob("*"):
+            if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS:
+                found.append(os.path.normpath(str(p)))
+    return sorted(set(found))
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """
+    Rutas ya puntuadas en un CSV/JSONL de resultados previo (para reanudar).
+    Las filas con error no cuentan: al reanudar se reintentan (la fila
+    nueva queda después de la anterior). Una última línea truncada por un
+    corte se ignora.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    done: Set[str] = set()
+    with open(output_path, newline="", encoding="utf-8") as f:
+        if output_path.endswith(".jsonl"):
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    path = row["path"]
+                except (ValueError, KeyError):
+                    continue
+                if not row.get("error"):
+                    done.add(path)
+        else:
+            for row in csv.DictReader(f):
+                # error ausente = fila truncada; no vacío = falló
+                if row.get("path") and row.get("error") == "":
+                    done.add(row["path"])
+    return done
+
+
+class ResultWriter:
+    """
+    Escritor incremental de resultados (CSV o JSONL según la extensión):
+    cada fila se vuelca a disco en cuanto se escribe.
+    """
+
+    def __init__(self, output_path: str, fields: Sequence[str], append: bool = False) -> None:
+        self.output_path = output_path
+        self.fields = list(fields)
+        self.jsonl = output_path.endswith(".jsonl")
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        exists = append and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        self._file = open(output_path, "a" if exists else "w", newline="", encoding="utf-8")
+
+        if exists:
+            # Si el corte dejó una línea a medias, empezar en una nueva
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+        self._csv = None
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._file, fieldnames=self.fields)
+            if not exists:
+                self._csv.writeheader()
+
+    def write(self, row: Dict[str, object]) -> None:
+        if self.jsonl:
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            self._csv.writerow(row)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+@dataclass
+class ScoreStats:
+    total: int = 0
+    skipped: int = 0
+    scored: int = 0
+    errors: int = 0
+    batches: int = 0
+    elapsed_s: float = 0.0
+    stage_s: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def images_per_sec(self) -> float:
+        done = self.scored + self.errors
+        return done / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def _init_worker() -> None:
+    # Un hilo de OpenCV por proceso: el paralelismo lo da el pool
+    import cv2
+
+    cv2.setNumThreads(1)
+
+
+def _decode_worker(path: str, keep_image: bool) -> Tuple[str, Optional[np.ndarray], Optional[np.ndarray], Optional[str]]:
+    """
+    Lee y preprocesa un archivo en un proceso del pool.
+
+    Returns:
+        (ruta, tensor (512,512) float32, gris (512,512) uint8 si se pidió,
+        mensaje de error o None)
+    """
+    from src.data.read_img import read_gray
+    from src.features.preprocess_img import preprocess_image
+
+    try:
+        image = read_gray(path)
+        tensor = preprocess_image(image)[0, :, :, 0]
+    except Exception as exc:  # noqa: BLE001 - el error queda en la fila
+        return path, None, None, f"{type(exc).__name__}: {exc}"
+    return path, tensor, image.pixels if keep_image else None, None
+
+
+def heatmap_name(path: str) -> str:
+    """Nombre plano y sin colisiones para el heatmap de `path`."""
+    rel = os.path.relpath(path) if not os.path.isabs(path) else path.lstrip(os.sep)
+    return rel.replace(os.sep, "__").replace("/", "__") + ".png"
+
+
+def score_paths(
+    detector,
+    paths: Sequence[str],
+    output_path: str,
+    batch_size: int = 16,
+    workers: Optional[int] = None,
+    prefetch: int = 4,
+    gradcam_dir: Optional[str] = None,
+    resume: bool = True,
+    progress: Optional[Callable[[ScoreStats], None]] = None,
+) -> ScoreStats:
+    """
+    Puntúa una lista de imágenes y escribe un resultado por archivo.
+
+    Args:
+        detector: PneumoniaDetector ya construido.
+        paths: Imágenes a puntuar.
+        output_path: CSV o JSONL (según extensión) de salida.
+        batch_size: Tamaño de lote del modelo.
+        workers: Procesos de decodificación (None = núcleos disponibles).
+        prefetch: Lotes que se decodifican por adelantado.
+        gradcam_dir: Carpeta para los heatmaps PNG (None = sin Grad-CAM).
+        resume: Saltar los archivos ya presentes en `output_path`.
+        progress: Callback tras cada lote.
+
+    Returns:
+        ScoreStats con conteos, tiempos por etapa e imágenes/seg.
+    """
+    from PIL import Image
+
+    from src.app.integrator import LABELS
+    from src.visualizations.grad_cam import overlay_cam_batch
+
+    fields = ["path", "label", "probability"] + [f"p_{name}" for name in LABELS.values()] + ["heatmap", "error"]
+
+    completed = load_completed(output_path) if resume else set()
+    todo = [p for p in paths if p not in completed]
+    stats = ScoreStats(total=len(paths), skipped=len(paths) - len(todo))
+    stats.stage_s = {"wait_decode": 0.0, "model": 0.0, "gradcam": 0.0, "write": 0.0}
+
+    if gradcam_dir:
+        Path(gradcam_dir).mkdir(parents=True, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    window = max(batch_size * prefetch, batch_size)
+    buffer = np.empty((batch_size, 512, 512, 1), dtype=np.float32)
+    keep_image = gradcam_dir is not None
+    started = time.perf_counter()
+
+    with ResultWriter(output_path, fields, append=resume) as writer, ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+    ) as pool:
+        pending: Deque[Future] = deque()
+        queue_iter = iter(todo)
+
+        def refill() -> None:
+            while len(pending) < window:
+                try:
+                    path = next(queue_iter)
+                except StopIteration:
+                    return
+                pending.append(pool.submit(_decode_worker, path, keep_image))
+
+        refill()
+        while pending:
+            items: List[Tuple[str, Optional[np.ndarray]]] = []
+            t0 = time.perf_counter()
+            while pending and len(items) < batch_size:
+                path, tensor, gray, error = pending.popleft().result()
+                refill()
+                if error is not None:
+                    writer.write({"path": path, "error": error})
+                    stats.errors += 1
+                    continue
+                buffer[len(items), :, :, 0] = tensor
+                items.append((path, gray))
+            stats.stage_s["wait_decode"] += time.perf_counter() - t0
+
+            if not items:
+                continue
+
+            batch = buffer[:len(items)]
+            t0 = time.perf_counter()
+            if keep_image:
+                preds, cams = detector.infer_with_cam(batch)
+            else:
+                preds = detector.infer(batch)
+            stats.stage_s["model"] += time.perf_counter() - t0
+
+            heatmap_files: List[str] = [""] * len(items)
+            if keep_image:
+                t0 = time.perf_counter()
+                heatmaps = overlay_cam_batch(cams, [gray for _, gray in items])
+                for i, ((path, _), heatmap) in enumerate(zip(items, heatmaps)):
+                    heatmap_files[i] = os.path.join(gradcam_dir, heatmap_name(path))
+                    Image.fromarray(heatmap).save(heatmap_files[i])
+                stats.stage_s["gradcam"] += time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for (path, _), p, heatmap_file in zip(items, preds, heatmap_files):
+                class_index = int(np.argmax(p))
+                row = {
+                    "path": path,
+                    "label": LABELS.get(class_index, str(class_index)),
+                    "probability": round(float(p[class_index]) * 100.0, 4),
+                    "heatmap": heatmap_file,
+                    "error": "",
+                }
+                for idx, name in LABELS.items():
+                    row[f"p_{name}"] = round(float(p[idx]), 6)
+                writer.write(row)
+            stats.stage_s["write"] += time.perf_counter() - t0
+
+            stats.scored += len(items)
+            stats.batches += 1
+            stats.elapsed_s = time.perf_counter() - started
+            if progress is not None:
+                progress(stats)
+
+    stats.elapsed_s = time.perf_counter() - started
+    return stats
@@ -0,0 +1,220 @@
+"""
+Caché de resultados direccionada por contenido.
+
+La clave es un hash de los bytes subidos + identidad del modelo + capa de
+Grad-CAM, así que la misma radiografía subida dos veces no vuelve a pasar
+por el modelo. Se guarda el CAM crudo (no el overlay pintado): es pequeño
+y permite volver a renderizar con otros parámetros. Nivel en memoria LRU
+(acotado por entradas y bytes), nivel opcional en disco y deduplicación de
+peticiones concurrentes (single-flight).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    label: str
+    probability: float
+    # CAM crudo (h,w) float32 de la clase predicha
+    cam: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.cam.nbytes + len(self.label) + 64
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[Union[str, Path]] = None,
+    ) -> None:
+        """
+        Args:
+            max_entries: Máximo de entradas en memoria.
+            max_bytes: Máximo de bytes en memoria (suma de los CAM).
+            disk_dir: Carpeta del nivel en disco (None = sin disco).
+        """
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, Future] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(data: bytes, model_id: str, layer_name: str) -> str:
+        """Hash SHA-256 de (bytes de la imagen, modelo, capa)."""
+        h = hashlib.sha256()
+        h.update(data)
+        h.update(b"\0")
+        h.update(model_id.encode("utf-8"))
+        h.update(b"\0")
+        h.update(layer_name.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Busca en memoria y luego en disco (promoviendo a memoria)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._put_memory(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CachedResult) -> None:
+        with self._lock:
+            self._put_memory(key, entry)
+        self._write_disk(key, entry)
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], CachedResult],
+    ) -> CachedResult:
+        """
+        Retorna la entrada cacheada o la calcula una sola vez aunque lleguen
+        varias peticiones idénticas a la vez (las demás esperan el resultado).
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            # El líder pudo guardar (y dejar de estar en vuelo) entre el
+            # `get` de arriba y este lock
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            entry = compute()
+            self.put(key, entry)
+            future.set_result(entry)
+            return entry
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.deduplicated
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "deduplicated": self.deduplicated,
+                "evictions": self.evictions,
+                "hit_rate": (
+                    (self.hits + self.disk_hits + self.deduplicated) / lookups
+                    if lookups else 0.0
+                ),
+            }
+
+    def _put_memory(self, key: str, entry: CachedResult) -> None:
+        # Requiere self._lock
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        if entry.nbytes > self.max_bytes:
+            return
+
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _disk_paths(self, key: str):
+        assert self.disk_dir is not None
+        return self.disk_dir / f"{key}.json", self.disk_dir / f"{key}.npy"
+
+    def _read_disk(self, key: str) -> Optional[CachedResult]:
+        if self.disk_dir is None:
+            return None
+        meta_path, cam_path = self._disk_paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            cam = np.load(cam_path, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        return CachedResult(
+            label=meta["label"],
+            probability=float(meta["probability"]),
+            cam=cam,
+        )
+
+    def _write_disk(self, key: str, entry: CachedResult) -> None:
+        if self.disk_dir is None:
+            return
+        meta_path, cam_path = self._disk_paths(key)
+        # CAM primero y JSON al final: el JSON marca la entrada como completa
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(entry.cam, dtype=np.float32), allow_pickle=False)
+        _atomic_write(cam_path, buf.getvalue())
+        _atomic_write(
+            meta_path,
+            json.dumps(
+                {"label": entry.label, "probability": entry.probability}
+            ).encode("utf-8"),
+        )
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
@@ -0,0 +1,290 @@
+"""
+Heatmaps bajo demanda.
+
+Por cada resultado se guarda solo el CAM crudo (al tamaño de la capa conv)
+y la imagen de trabajo en gris. El overlay se pinta cuando alguien lo pide,
+con el tamaño, mapa de color, umbral y alpha solicitados, y cada render se
+memoiza (LRU acotado por bytes): re-umbralizar no vuelve a pasar por el
+modelo y una respuesta que nadie mira no paga la mezcla ni el PNG.
+
+El render por defecto de cada resultado nuevo se codifica en un hilo
+aparte (`prerender`), en PNG con el nivel de compresión configurado o en
+WebP; si el navegador lo pide antes de que termine, espera a ese mismo
+trabajo en lugar de codificarlo dos veces. Los CAMs persistidos van a un
+`ArtifactStore` con cuota y TTL.
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from src.app.artifacts import ArtifactStore
+from src.app.metrics import timed
+from src.data.image import GrayImage
+from src.visualizations.grad_cam import COLORMAPS, render_cam
+
+_RESULT_ID = re.compile(r"[0-9a-f]{8,64}")
+
+RenderParams = Tuple[int, str, float, float]
+RenderKey = Tuple[str, RenderParams, str]
+
+# Formato -> tipo MIME
+FORMATS = {"png": "image/png", "webp": "image/webp"}
+
+
+def render_params(
+    size: Union[int, str] = 512,
+    colormap: str = "jet",
+    threshold: Union[float, str] = 0.10,
+    alpha: Union[float, str] = 0.4,
+) -> RenderParams:
+    """
+    Valida y normaliza los parámetros de render (también desde query strings).
+
+    Raises:
+        ValueError: Si algún parámetro está fuera de rango.
+    """
+    size = int(size)
+    threshold = round(float(threshold), 3)
+    alpha = round(float(alpha), 3)
+    colormap = str(colormap).lower()
+    if not 32 <= size <= 2048:
+        raise ValueError("size debe estar entre 32 y 2048")
+    if colormap not in COLORMAPS:
+        raise ValueError(f"colormap debe ser uno de: {', '.join(sorted(COLORMAPS))}")
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError("threshold debe estar entre 0 y 1")
+    if not 0.0 <= alpha <= 1.0:
+        raise ValueError("alpha debe estar entre 0 y 1")
+    return size, colormap, threshold, alpha
+
+
+class HeatmapStore:
+    def __init__(
+        self,
+        max_results: int = 512,
+        max_render_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[Union[str, Path]] = None,
+        artifacts: Optional[ArtifactStore] = None,
+        image_format: str = "png",
+        png_level: int = 1,
+        webp_quality: int = 80,
+        encode_workers: int = 1,
+    ) -> None:
+        """
+        Args:
+            max_results: CAMs (con su imagen) retenidos en memoria.
+            max_render_bytes: Máximo de bytes de imágenes renderizadas en memoria.
+            disk_dir: Carpeta donde persistir los CAMs (sin cuota ni TTL).
+            artifacts: Almacén acotado para los CAMs (tiene prioridad sobre
+                `disk_dir`). Sin ninguno de los dos, solo memoria.
+            image_format: Formato por defecto de los renders ("png" o "webp").
+            png_level: Nivel de compresión PNG (0-9).
+            webp_quality: Calidad WebP (1-100).
+            encode_workers: Hilos para la codificación en segundo plano.
+        """
+        self.max_results = int(max_results)
+        self.max_render_bytes = int(max_render_bytes)
+        if artifacts is None and disk_dir:
+            artifacts = ArtifactStore(disk_dir)
+        self.artifacts = artifacts
+        self.image_format = _check_format(image_format)
+        if not 0 <= int(png_level) <= 9:
+            raise ValueError("png_level debe estar entre 0 y 9")
+        if not 1 <= int(webp_quality) <= 100:
+            raise ValueError("webp_quality debe estar entre 1 y 100")
+        self.png_level = int(png_level)
+        self.webp_quality = int(webp_quality)
+        self.encode_workers = int(encode_workers)
+
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[str, Tuple[np.ndarray, GrayImage]]" = OrderedDict()
+        self._renders: "OrderedDict[RenderKey, bytes]" = OrderedDict()
+        self._pending: "Dict[RenderKey, Future]" = {}
+        self._render_bytes = 0
+        self._encoder: Optional[ThreadPoolExecutor] = None
+
+        self.renders = 0
+        self.render_hits = 0
+        self.render_waits = 0
+        self.prerenders = 0
+
+    def put(self, result_id: str, cam: np.ndarray, image: GrayImage) -> Tuple[np.ndarray, GrayImage]:
+        """
+        Registra el CAM crudo y la imagen de un resultado.
+
+        Returns:
+            La entrada guardada (para `save`, que puede correr después de
+            que la memoria ya la haya expulsado).
+        """
+        if not _RESULT_ID.fullmatch(result_id):
+            raise ValueError(f"Identificador de resultado inválido: {result_id!r}")
+        # Solo la imagen de trabajo: la vista previa a resolución completa no hace falta
+        entry = (np.asarray(cam, dtype=np.float32), GrayImage(image.pixels))
+        with self._lock:
+            self._results[result_id] = entry
+            self._results.move_to_end(result_id)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return entry
+
+    def save(self, result_id: str, entry: Optional[Tuple[np.ndarray, GrayImage]] = None) -> None:
+        """
+        Persiste en disco el CAM y la imagen de `result_id` (si hay disco).
+        `entry` es lo que retornó `put`; sin ella se busca en memoria.
+        """
+        if entry is None:
+            with self._lock:
+                entry = self._results.get(result_id)
+        if self.artifacts is None or entry is None:
+            return
+        cam, image = entry
+        buf = io.BytesIO()
+        np.savez(buf, cam=cam, pixels=image.pixels)
+        self.artifacts.write(f"{result_id}.npz", buf.getvalue())
+
+    def get(self, result_id: str) -> Optional[Tuple[np.ndarray, GrayImage]]:
+        """CAM crudo e imagen de un resultado (memoria y luego disco)."""
+        if not _RESULT_ID.fullmatch(result_id):
+            return None
+        with self._lock:
+            entry = self._results.get(result_id)
+            if entry is not None:
+                self._results.move_to_end(result_id)
+                return entry
+
+        path = self.artifacts.open(f"{result_id}.npz") if self.artifacts is not None else None
+        if path is None:
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                cam, pixels = data["cam"], data["pixels"]
+        except (OSError, ValueError, KeyError):
+            return None
+        self.put(result_id, cam, GrayImage(pixels))
+        return cam, GrayImage(pixels)
+
+    def render_image(
+        self,
+        result_id: str,
+        size: int = 512,
+        colormap: str = "jet",
+        threshold: float = 0.10,
+        alpha: float = 0.4,
+        image_format: Optional[str] = None,
+    ) -> Optional[bytes]:
+        """
+        Overlay codificado con los parámetros dados; memoizado por
+        (resultado, parámetros, formato). Si el mismo render ya se está
+        codificando (p. ej. en `prerender`), espera a ese resultado.
+
+        Returns:
+            bytes de la imagen, o None si el resultado no existe.
+        """
+        params = render_params(size, colormap, threshold, alpha)
+        fmt = _check_format(image_format or self.image_format)
+        key = (result_id, params, fmt)
+        with self._lock:
+            data = self._renders.get(key)
+            if data is not None:
+                self._renders.move_to_end(key)
+                self.render_hits += 1
+                return data
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+            else:
+                self.render_waits += 1
+        if not owner:
+            return future.result()
+
+        try:
+            data = self._render(result_id, params, fmt)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(data)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        return data
+
+    def render_png(self, result_id: str, *args, **kwargs) -> Optional[bytes]:
+        """`render_image` en PNG."""
+        return self.render_image(result_id, *args, image_format="png", **kwargs)
+
+    def prerender(self, result_id: str) -> Future:
+        """Codifica en segundo plano el render por defecto de `result_id`."""
+        with self._lock:
+            if self._encoder is None:
+                self._encoder = ThreadPoolExecutor(
+                    max_workers=self.encode_workers, thread_name_prefix="heatmap-encode"
+                )
+            self.prerenders += 1
+        return self._encoder.submit(self.render_image, result_id)
+
+    @timed("heatmap_encode")
+    def encode(self, rgb: np.ndarray, image_format: Optional[str] = None) -> bytes:
+        fmt = _check_format(image_format or self.image_format)
+        buf = io.BytesIO()
+        if fmt == "webp":
+            Image.fromarray(rgb).save(buf, format="WEBP", quality=self.webp_quality)
+        else:
+            Image.fromarray(rgb).save(buf, format="PNG", compress_level=self.png_level)
+        return buf.getvalue()
+
+    def _render(self, result_id: str, params: RenderParams, fmt: str) -> Optional[bytes]:
+        entry = self.get(result_id)
+        if entry is None:
+            return None
+        cam, image = entry
+        data = self.encode(render_cam(cam, image, *params), fmt)
+
+        key = (result_id, params, fmt)
+        with self._lock:
+            self.renders += 1
+            old = self._renders.pop(key, None)
+            if old is not None:
+                self._render_bytes -= len(old)
+            if len(data) <= self.max_render_bytes:
+                self._renders[key] = data
+                self._render_bytes += len(data)
+                while self._render_bytes > self.max_render_bytes:
+                    _, evicted = self._renders.popitem(last=False)
+                    self._render_bytes -= len(evicted)
+        return data
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats: Dict[str, object] = {
+                "results": len(self._results),
+                "format": self.image_format,
+                "renders_cached": len(self._renders),
+                "render_bytes": self._render_bytes,
+                "renders": self.renders,
+                "render_hits": self.render_hits,
+                "render_waits": self.render_waits,
+                "prerenders": self.prerenders,
+                "encoding": len(self._pending),
+            }
+        if self.artifacts is not None:
+            stats["disk"] = self.artifacts.stats()
+        return stats
+
+
+def _check_format(image_format: str) -> str:
+    fmt = str(image_format).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato debe ser uno de: {', '.join(sorted(FORMATS))}")
+    return fmt
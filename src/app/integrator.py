@@ -5,26 +5,67 @@ Retorna SOLO lo necesario para la UI.
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from functools import cached_property
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 from PIL import Image
 
-from src.data.read_img import read_dicom_image, read_image_file
-from src.features.preprocess_img import preprocess_image
-from src.models.load_model import load_pneumonia_model
-from src.visualizations.grad_cam import generate_gradcam
+from src.app.cache import CachedResult, ResultCache
+from src.app.metrics import METRICS, collect_timings, stage
+from src.app.startup import StartupTimer
+from src.data.image import GrayImage
+from src.data.read_img import ImageSource, load_bytes, read_gray
+from src.features.preprocess_img import preprocess_batch, preprocess_image
+from src.models.registry import ModelRegistry, get_registry
+from src.visualizations.grad_cam import (
+    build_grad_model,
+    gradcam_forward_batch,
+    overlay_cam,
+    render_cam,
+)
 
 LABELS = {0: "bacteriana", 1: "normal", 2: "viral"}
+BACKENDS = ("keras", "tflite-float16", "tflite-int8")
 
 
 @dataclass(frozen=True)
 class PredictionResult:
     label: str
     probability: float
-    heatmap: np.ndarray
-    original_image: Image.Image
+    # CAM crudo (h,w) float32 de la clase predicha, al tamaño de la capa conv
+    cam: np.ndarray
+    # Imagen de trabajo (gris 512x512; con vista previa si full_preview)
+    image: GrayImage
+    # ms por etapa de esta petición (con record_timings=True)
+    timings: Optional[Dict[str, float]] = None
+    # Probabilidad (%) de cada clase; None en aciertos de caché
+    probabilities: Optional[Tuple[float, ...]] = None
+
+    @cached_property
+    def heatmap(self) -> np.ndarray:
+        """Overlay JET por defecto, RGB (512,512,3) uint8; se pinta al pedirlo."""
+        return overlay_cam(self.cam, self.image)
+
+    @cached_property
+    def original_image(self) -> Image.Image:
+        return self.image.to_pil()
+
+    def render(
+        self,
+        size: int = 512,
+        colormap: str = "jet",
+        threshold: float = 0.10,
+        alpha: float = 0.4,
+    ) -> np.ndarray:
+        """Overlay con otros parámetros, sin volver a pasar por el modelo."""
+        return render_cam(self.cam, self.image, size, colormap, threshold, alpha)
 
 
 class PneumoniaDetector:
@@ -32,34 +73,555 @@ class PneumoniaDetector:
         self,
         model_path: str = "models/conv_MLP_84.h5",
         layer_name: str = "conv10_thisone",
+        model=None,
+        cache: Optional[ResultCache] = None,
+        full_preview: bool = False,
+        lazy: bool = False,
+        timer: Optional[StartupTimer] = None,
+        registry: Optional[ModelRegistry] = None,
+        engine: str = "eager",
+        jit_compile: bool = False,
+        backend: str = "keras",
+        calibration_dir: str = "data/raw",
+        record_timings: bool = False,
     ) -> None:
-        self.model = load_pneumonia_model(model_path)
+        """
+        Args:
+            model_path: Ruta del modelo .h5.
+            layer_name: Capa conv objetivo de Grad-CAM.
+            model: Modelo ya cargado (omite el registro y `model_path`).
+            cache: Caché de resultados por contenido (opcional).
+            full_preview: Construir `original_image` a resolución completa;
+                por defecto queda en gris a la resolución de trabajo
+                (512x512), igual que la imagen que recibe el modelo.
+            lazy: Diferir la carga del modelo hasta el primer uso (o hasta
+                `warmup`).
+            timer: Registro de tiempos de arranque por fase (opcional).
+            registry: Registro de modelos (por defecto, el del proceso).
+            engine: "eager" (llamadas Keras directas) o "compiled"
+                (`tf.function` con firma fija y lotes por buckets).
+            jit_compile: Con engine="compiled", compilar además con XLA.
+            backend: Forward de la predicción: "keras" (float32),
+                "tflite-float16" o "tflite-int8". Grad-CAM siempre corre
+                sobre el grafo Keras.
+            calibration_dir: Imágenes de calibración para "tflite-int8".
+            record_timings: Adjuntar a cada resultado los ms por etapa.
+        """
+        if engine not in ("eager", "compiled"):
+            raise ValueError(f"Motor de inferencia desconocido: {engine!r}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend!r}")
+        self.model_path = model_path
         self.layer_name = layer_name
+        self.cache = cache
+        self.full_preview = full_preview
+        self.timer = timer or StartupTimer()
+        self.registry = registry or get_registry()
+        self._injected_model = model
+        # Modelos de Grad-CAM ya construidos, por (id del modelo, capa)
+        self._grad_models: Dict[Tuple[int, str], object] = {}
+        self._grad_models_lock = threading.Lock()
+        self.engine = engine
+        self.jit_compile = jit_compile
+        # Motor compilado del modelo vigente: (id del modelo, motor)
+        self._compiled: Optional[Tuple[int, object]] = None
+        self.engine_parity: Optional[Dict[str, object]] = None
+        self.backend = backend
+        self.calibration_dir = calibration_dir
+        self.record_timings = record_timings
+        # Modelo TFLite del modelo vigente: (id del modelo, TFLiteModel)
+        self._tflite: Optional[Tuple[int, object]] = None
+
+        if not lazy:
+            _ = self.model
 
-    def predict(self, file_path: str) -> PredictionResult:
-        if file_path.lower().endswith(".dcm"):
-            rgb, pil = read_dicom_image(file_path)
+    @property
+    def model(self):
+        """
+        Modelo Keras vigente. Sale del registro compartido (una carga por
+        proceso), así que refleja un cambio de pesos en caliente.
+        """
+        if self._injected_model is not None:
+            return self._injected_model
+        entry = self.registry.peek(self.model_path)
+        if entry is None:
+            with self.timer.phase("model_load"):
+                entry = self.registry.entry(self.model_path)
+        return entry.model
+
+    @model.setter
+    def model(self, value) -> None:
+        self._injected_model = value
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._injected_model is not None or self.registry.peek(self.model_path) is not None
+
+    @property
+    def model_id(self) -> str:
+        """Identidad del modelo vigente para las claves de caché."""
+        if self._injected_model is not None:
+            model = self._injected_model
+            identity = f"{getattr(model, 'name', type(model).__name__)}:{id(model)}"
         else:
-            rgb, pil = read_image_file(file_path)
+            identity = self.registry.entry(self.model_path).identity
+        # Otro backend da otras probabilidades: no comparten caché
+        return identity if self.backend == "keras" else f"{identity}:{self.backend}"
+
+    def swap_model(self, new_path: Optional[str] = None) -> str:
+        """
+        Cambia en caliente a otros pesos (o recarga los actuales). Las
+        peticiones en curso terminan con el modelo anterior.
+
+        Returns:
+            Nueva identidad del modelo.
+        """
+        if self._injected_model is not None:
+            raise RuntimeError("El detector usa un modelo inyectado; no hay slot que cambiar")
+        return self.registry.swap(self.model_path, new_path).identity
+
+    def warmup(self) -> Dict[str, object]:
+        """
+        Carga el modelo y pasa un lote de prueba por la predicción y por
+        Grad-CAM, para que la primera petición real no pague la carga ni el
+        trazado del grafo.
+
+        Returns:
+            Tiempos de arranque por fase.
+        """
+        _ = self.model
+        if self.backend != "keras":
+            with self.timer.phase("backend_load"):
+                self.get_backend()
+        with self.timer.phase("grad_model"):
+            self.get_grad_model()
+
+        dummy = np.zeros((1, 512, 512, 1), dtype=np.float32)
+        with self.timer.phase("warmup_infer"):
+            self.infer(dummy)
+        with self.timer.phase("warmup_gradcam"):
+            preds, cams = self.infer_with_cam(dummy)
+            overlay_cam(cams[0], GrayImage(np.zeros((512, 512), dtype=np.uint8)))
+        if self.engine == "compiled":
+            with self.timer.phase("engine_parity"):
+                probe = np.random.default_rng(0).random((2, 512, 512, 1), dtype=np.float32)
+                self.engine_parity = self.get_engine().check_parity(probe)
+            if not self.engine_parity["ok"]:
+                raise RuntimeError(f"El motor compilado difiere del eager: {self.engine_parity}")
+
+        return self.timer.as_dict()
+
+    def get_grad_model(self, layer_name: Optional[str] = None):
+        """
+        Modelo auxiliar de Grad-CAM para (modelo actual, capa), construido una
+        sola vez y reutilizado entre peticiones.
+        """
+        layer_name = layer_name or self.layer_name
+        # Una sola lectura: un cambio de pesos en medio no mezcla modelos
+        model = self.model
+        key = (id(model), layer_name)
+        grad_model = self._grad_models.get(key)
+        if grad_model is None:
+            with self._grad_models_lock:
+                grad_model = self._grad_models.get(key)
+                if grad_model is None:
+                    grad_model = build_grad_model(model, layer_name)
+                    # Descartar los de modelos anteriores (cambio en caliente)
+                    for old_key in [k for k in self._grad_models if k[0] != id(model)]:
+                        del self._grad_models[old_key]
+                    self._grad_models[key] = grad_model
+        return grad_model
+
+    def get_engine(self):
+        """
+        Motor compilado (`CompiledEngine`) del modelo vigente, construido una
+        sola vez por modelo; se rehace tras un cambio de pesos.
+        """
+        model = self.model
+        compiled = self._compiled
+        if compiled is None or compiled[0] != id(model):
+            with self._grad_models_lock:
+                compiled = self._compiled
+                if compiled is None or compiled[0] != id(model):
+                    from src.models.engine import CompiledEngine
+
+                    engine = CompiledEngine(model, self.layer_name, jit_compile=self.jit_compile)
+                    compiled = self._compiled = (id(model), engine)
+        return compiled[1]
+
+    def get_backend(self):
+        """
+        Modelo TFLite (`TFLiteModel`) del modelo vigente. Con el modelo del
+        registro, el `.tflite` convertido se guarda junto a los pesos.
+        """
+        model = self.model
+        current = self._tflite
+        if current is None or current[0] != id(model):
+            with self._grad_models_lock:
+                current = self._tflite
+                if current is None or current[0] != id(model):
+                    from src.models.tflite_backend import (
+                        calibration_fingerprint,
+                        load_tflite_model,
+                        tflite_artifact_path,
+                    )
+
+                    quantization = self.backend.split("-", 1)[1]
+                    artifact = None
+                    if self._injected_model is None:
+                        entry = self.registry.entry(self.model_path)
+                        # int8: otra calibración no reutiliza el artefacto anterior
+                        calibration = (
+                            calibration_fingerprint(self.calibration_dir) if quantization == "int8" else None
+                        )
+                        artifact = tflite_artifact_path(entry.path, entry.sha256, quantization, calibration)
+                    tflite = load_tflite_model(
+                        model, quantization, self.calibration_dir, artifact=artifact
+                    )
+                    current = self._tflite = (id(model), tflite)
+        return current[1]
 
-        batch = preprocess_image(rgb)
+    def engine_stats(self) -> Dict[str, object]:
+        """Motor en uso y, si es el compilado, sus trazas y llamadas."""
+        stats: Dict[str, object] = {"engine": self.engine, "backend": self.backend}
+        if self.engine == "compiled" and self._compiled is not None:
+            stats.update(self._compiled[1].stats())
+            stats["parity"] = self.engine_parity
+        return stats
 
-        preds = self.model(batch, training=False).numpy()[0]
+    def read(self, source: ImageSource) -> GrayImage:
+        """
+        Lee una imagen DICOM/JPG/PNG (ruta, bytes o stream) directo a un
+        canal a 512x512; el formato se detecta por contenido.
+        """
+        return read_gray(source, preview=self.full_preview)
+
+    def load_inputs(self, source: ImageSource) -> Tuple[GrayImage, np.ndarray]:
+        """
+        Lee y preprocesa una imagen (ruta, bytes o stream).
+
+        Returns:
+            image: Imagen original en gris (512,512) uint8.
+            batch: Tensor (1,512,512,1) listo para el modelo.
+        """
+        image = self.read(source)
+        return image, preprocess_image(image)
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Forward del modelo sobre un lote (N,512,512,1).
+
+        Returns:
+            np.ndarray: probabilidades (N, num_classes).
+        """
+        with stage("forward"):
+            if self.backend != "keras":
+                return self.get_backend().predict(batch)
+            if self.engine == "compiled":
+                return self.get_engine().infer(batch)
+            return self.model(batch, training=False).numpy()
+
+    def infer_with_cam(self, batch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predicción y CAM crudo de un lote (N,512,512,1) en un solo forward.
+
+        Returns:
+            preds: probabilidades (N, num_classes).
+            cams: mapas CAM crudos (N,h,w) de la clase predicha.
+        """
+        with stage("forward_gradcam"):
+            if self.backend != "keras":
+                # Probabilidades del backend; el CAM (Keras) explica esa misma clase
+                preds = self.get_backend().predict(batch)
+                _, cams = gradcam_forward_batch(
+                    self.get_grad_model(), batch, np.argmax(preds, axis=1)
+                )
+                return preds, cams
+            if self.engine == "compiled":
+                return self.get_engine().infer_with_cam(batch)
+            return gradcam_forward_batch(self.get_grad_model(), batch)
+
+    def build_result(
+        self,
+        image: GrayImage,
+        preds: np.ndarray,
+        cam: np.ndarray,
+    ) -> PredictionResult:
+        """
+        Construye el resultado final a partir de las probabilidades y el CAM
+        crudo ya calculados de una sola imagen. El overlay no se pinta aquí.
+        """
         class_index = int(np.argmax(preds))
-        prob = float(np.max(preds)) * 100.0
-        label = LABELS.get(class_index, str(class_index))
-
-        heatmap = generate_gradcam(
-            model=self.model,
-            image_batch=batch,
-            original_rgb=rgb,
-            layer_name=self.layer_name,
-            class_index=class_index,
+
+        return PredictionResult(
+            label=LABELS.get(class_index, str(class_index)),
+            probability=float(preds[class_index]) * 100.0,
+            cam=np.asarray(cam, dtype=np.float32),
+            image=image,
+            probabilities=tuple(float(p) * 100.0 for p in preds),
         )
 
+    def predict(self, source: ImageSource) -> PredictionResult:
+        return self.run_cached(source, self._predict_uncached)
+
+    def run_cached(
+        self,
+        source: ImageSource,
+        compute: Callable[[ImageSource], PredictionResult],
+    ) -> PredictionResult:
+        """
+        Ejecuta `compute(source)` pasando por la caché de resultados.
+
+        En un acierto no se toca el modelo: se reutiliza el CAM guardado.
+        Sin caché configurada, equivale a `compute(source)`.
+        """
+        if not self.record_timings:
+            with stage("predict"):
+                return self._run_cached(source, compute)
+
+        with collect_timings() as timings:
+            with stage("predict"):
+                result = self._run_cached(source, compute)
+        return replace(result, timings={k: round(v, 3) for k, v in timings.items()})
+
+    def _run_cached(
+        self,
+        source: ImageSource,
+        compute: Callable[[ImageSource], PredictionResult],
+    ) -> PredictionResult:
+        if self.cache is None:
+            METRICS.inc("predictions", cache="off")
+            return compute(source)
+
+        # Los bytes se leen una sola vez: sirven para la clave y para decodificar
+        data = load_bytes(source)
+        key = ResultCache.make_key(data, self.model_id, self.layer_name)
+
+        computed: Dict[str, PredictionResult] = {}
+
+        def run() -> CachedResult:
+            result = compute(data)
+            computed["result"] = result
+            return CachedResult(result.label, result.probability, result.cam)
+
+        entry = self.cache.get_or_compute(key, run)
+        if "result" in computed:
+            METRICS.inc("predictions", cache="miss")
+            return computed["result"]
+        METRICS.inc("predictions", cache="hit")
+
+        # Acierto (memoria/disco) o petición idéntica resuelta por otro hilo
         return PredictionResult(
-            label=label,
-            probability=prob,
-            heatmap=heatmap,
-            original_image=pil,
+            label=entry.label,
+            probability=entry.probability,
+            cam=entry.cam,
+            image=self.read(data),
         )
+
+    def _predict_uncached(self, source: ImageSource) -> PredictionResult:
+        image, batch = self.load_inputs(source)
+
+        # Predicción y Grad-CAM salen del mismo forward
+        preds, cams = self.infer_with_cam(batch)
+
+        return self.build_result(image, preds[0], cams[0])
+
+    def predict_batch(self, sources: Sequence[ImageSource]) -> List[PredictionResult]:
+        """
+        Predicción + CAM de varias imágenes con un único forward.
+        """
+        if not sources:
+            return []
+
+        images = [self.read(src) for src in sources]
+        batch = preprocess_batch(images)
+
+        preds, cams = self.infer_with_cam(batch)
+
+        return [
+            self.build_result(image, p, cam)
+            for image, p, cam in zip(images, preds, cams)
+        ]
+
+    def predict_frames(
+        self,
+        frames: Iterable[GrayImage],
+        batch_size: int = 8,
+    ) -> Iterator[PredictionResult]:
+        """
+        Predicción + CAM de una secuencia de imágenes (p. ej. los frames de
+        un estudio) en lotes de `batch_size`, a medida que se consumen.
+
+        El iterador de entrada se lee de a un lote y el buffer del lote se
+        reutiliza, así que la memoria no depende del largo de la secuencia.
+        """
+        buffer = np.empty((batch_size, 512, 512, 1), dtype=np.float32)
+        iterator = iter(frames)
+        while True:
+            images = list(islice(iterator, batch_size))
+            if not images:
+                return
+            batch = preprocess_batch(images, out=buffer)
+            preds, cams = self.infer_with_cam(batch)
+            for image, p, cam in zip(images, preds, cams):
+                yield self.build_result(image, p, cam)
+
+
+@dataclass
+class _PendingItem:
+    batch: np.ndarray
+    future: Future
+    enqueued_at: float
+
+
+class BatchScheduler:
+    """
+    Micro-batching: agrupa predicciones concurrentes en un único forward.
+
+    Cada llamador lee y preprocesa su imagen en su propio hilo, encola el
+    tensor y espera; un hilo de fondo junta hasta `max_batch_size` tensores
+    (o lo que llegue en `max_wait_ms` desde el primero) y ejecuta una sola
+    pasada con Grad-CAM para todo el lote. Cada llamador recibe su CAM
+    crudo; el overlay se pinta solo si alguien lo pide.
+    """
+
+    def __init__(
+        self,
+        detector: PneumoniaDetector,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size debe ser >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms no puede ser negativo")
+
+        self.detector = detector
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_ms = float(max_wait_ms)
+
+        self._queue: "queue.Queue[Optional[_PendingItem]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes: Dict[int, int] = {}
+        self._wait_ms_total = 0.0
+        # `submit` y `close` lo toman: nada entra a la cola después del centinela
+        self._submit_lock = threading.Lock()
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="batch-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, batch: np.ndarray) -> Future:
+        """
+        Encola un tensor (1,512,512,1) y retorna un Future con
+        (probabilidades (num_classes,), CAM crudo (h,w)).
+        """
+        future: Future = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("BatchScheduler cerrado")
+            self._queue.put(_PendingItem(batch, future, time.perf_counter()))
+        return future
+
+    def predict(self, source: ImageSource) -> PredictionResult:
+        return self.detector.run_cached(source, self._predict_uncached)
+
+    def _predict_uncached(self, source: ImageSource) -> PredictionResult:
+        image, batch = self.detector.load_inputs(source)
+        # Espera en cola + forward del lote, vista desde el llamador
+        with stage("batched_forward"):
+            preds, cam = self.submit(batch).result()
+        return self.detector.build_result(image, preds, cam)
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Profundidad de cola y distribución de tamaños de lote.
+        """
+        with self._stats_lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": batches,
+                "items": items,
+                "mean_batch_size": items / batches if batches else 0.0,
+                "mean_queue_wait_ms": self._wait_ms_total / items if items else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            }
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Detiene el hilo de fondo tras vaciar lo ya encolado."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            items: List[_PendingItem] = [first]
+            deadline = first.enqueued_at + self.max_wait_ms / 1000.0
+            while len(items) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = (
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                items.append(item)
+
+            self._run_batch(items)
+
+        # Con el lock de `submit` no debería quedar nada; si quedara, que
+        # ningún llamador espere para siempre
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item.future.set_exception(RuntimeError("BatchScheduler cerrado"))
+
+    def _run_batch(self, items: List[_PendingItem]) -> None:
+        started = time.perf_counter()
+        try:
+            preds, cams = self.detector.infer_with_cam(
+                np.concatenate([it.batch for it in items], axis=0)
+            )
+        except Exception as exc:  # noqa: BLE001 - se propaga a cada llamador
+            for it in items:
+                it.future.set_exception(exc)
+            return
+
+        for it, p, cam in zip(items, preds, cams):
+            METRICS.observe("batch_queue_wait", started - it.enqueued_at)
+            it.future.set_result((p, cam))
+        METRICS.inc("batches")
+        METRICS.inc("batched_items", len(items))
+
+        size = len(items)
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._wait_ms_total += sum(
+                (started - it.enqueued_at) * 1000.0 for it in items
+            )
@@ -0,0 +1,265 @@
+"""
+Cola de trabajos asíncrona con un pool de hilos acotado.
+
+La petición HTTP solo encola y retorna un id; los hilos del pool ejecutan
+el análisis y los clientes consultan (o se suscriben) al estado. Si la cola
+está llena, `submit` falla de inmediato en lugar de acumular hilos.
+
+Con varios procesos (`python main.py serve --workers N`) el trabajo corre
+en el worker que lo recibió, pero la consulta puede llegar a otro: con un
+`store` compartido cada cambio de estado se publica como `<id>.json` y los
+demás workers lo leen de ahí.
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from src.app.artifacts import ArtifactStore
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+
+class QueueFullError(RuntimeError):
+    """La cola de trabajos está llena."""
+
+
+@dataclass
+class Job:
+    id: str
+    payload: Any
+    status: str = QUEUED
+    submitted_at: float = field(default_factory=time.perf_counter)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, ERROR)
+
+    @property
+    def queue_wait_ms(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.submitted_at) * 1000.0
+
+    @property
+    def service_ms(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at) * 1000.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "job_id": self.id,
+            "status": self.status,
+            "queue_wait_ms": self.queue_wait_ms,
+            "service_ms": self.service_ms,
+        }
+        if self.status == DONE:
+            data["result"] = self.result
+        elif self.status == ERROR:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    def __init__(
+        self,
+        handler: Callable[[Any], Any],
+        workers: int = 2,
+        max_queue: int = 16,
+        max_finished: int = 1000,
+        store: Optional[ArtifactStore] = None,
+        poll_interval: float = 0.25,
+    ) -> None:
+        """
+        Args:
+            handler: Función que procesa el payload de un trabajo.
+            workers: Hilos del pool.
+            max_queue: Trabajos en espera admitidos antes de rechazar.
+            max_finished: Trabajos terminados que se conservan para consulta.
+            store: Carpeta compartida donde publicar el estado de cada
+                trabajo (varios procesos); None = solo memoria.
+            poll_interval: Segundos entre lecturas del estado publicado
+                por otro proceso.
+        """
+        self.handler = handler
+        self.store = store
+        self.poll_interval = float(poll_interval)
+        self.max_queue = int(max_queue)
+        self.max_finished = int(max_finished)
+
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=self.max_queue)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._changed = threading.Condition()
+        self._rejected = 0
+        self._queue_wait_ms: List[float] = []
+        self._service_ms: List[float] = []
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            for i in range(int(workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, payload: Any) -> Job:
+        """
+        Encola un trabajo y retorna de inmediato.
+
+        Raises:
+            QueueFullError: Si ya hay `max_queue` trabajos esperando.
+        """
+        job = Job(id=uuid.uuid4().hex, payload=payload)
+        with self._changed:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._rejected += 1
+                raise QueueFullError("Servidor ocupado: cola de trabajos llena") from None
+            self._jobs[job.id] = job
+            self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._changed:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Estado del trabajo como dict (`Job.to_dict`): el de este proceso o,
+        si lo recibió otro worker, el publicado en `store`.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            with self._changed:
+                return job.to_dict()
+        if self.store is None:
+            return None
+        data = self.store.read(f"{job_id}.json")
+        try:
+            return json.loads(data) if data is not None else None
+        except ValueError:
+            return None  # publicación a medias no debería ocurrir (escritura atómica)
+
+    def result(self, job_id: str) -> Any:
+        """Resultado de un trabajo terminado sin error (de cualquier worker); None si no lo hay."""
+        status = self.status(job_id)
+        if status is None or status["status"] != DONE:
+            return None
+        return status["result"]
+
+    def wait_for_status(
+        self, job_id: str, last_status: Optional[str], timeout: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Como `wait_for_change`, pero también para trabajos de otro proceso
+        (sondeando lo publicado cada `poll_interval`).
+        """
+        if self.get(job_id) is not None:
+            job = self.wait_for_change(job_id, last_status, timeout)
+            if job is not None:
+                with self._changed:
+                    return job.to_dict()
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self.status(job_id)
+            if snapshot is None or snapshot["status"] != last_status or time.monotonic() >= deadline:
+                return snapshot
+            time.sleep(self.poll_interval)
+
+    def wait_for_change(self, job_id: str, last_status: Optional[str], timeout: float) -> Optional[Job]:
+        """
+        Bloquea hasta que el trabajo cambie de `last_status` o pase `timeout`.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: (job := self._jobs.get(job_id)) is None or job.status != last_status,
+                timeout=timeout,
+            )
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._changed:
+            statuses: Dict[str, int] = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {
+                "workers": len(self._threads),
+                "max_queue": self.max_queue,
+                "queue_depth": self._queue.qsize(),
+                "rejected": self._rejected,
+                "jobs": statuses,
+                "queue_wait_ms": _summary(self._queue_wait_ms),
+                "service_ms": _summary(self._service_ms),
+            }
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _set(self, job: Job, **changes: Any) -> None:
+        with self._changed:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            if job.finished:
+                self._queue_wait_ms.append(job.queue_wait_ms or 0.0)
+                self._service_ms.append(job.service_ms or 0.0)
+                del self._queue_wait_ms[:-self.max_finished]
+                del self._service_ms[:-self.max_finished]
+                self._evict_finished()
+            self._publish(job)
+            self._changed.notify_all()
+
+    def _publish(self, job: Job) -> None:
+        # Requiere self._changed: así las publicaciones salen en el orden de los cambios
+        if self.store is not None:
+            self.store.write(f"{job.id}.json", json.dumps(job.to_dict()).encode("utf-8"))
+
+    def _evict_finished(self) -> None:
+        # Requiere self._changed
+        finished = [j.id for j in self._jobs.values() if j.finished]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._set(job, status=RUNNING, started_at=time.perf_counter())
+            try:
+                result = self.handler(job.payload)
+            except Exception as exc:  # noqa: BLE001 - queda registrado en el trabajo
+                self._set(job, status=ERROR, error=f"{type(exc).__name__}: {exc}",
+                          finished_at=time.perf_counter(), payload=None)
+            else:
+                self._set(job, status=DONE, result=result,
+                          finished_at=time.perf_counter(), payload=None)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": ordered[int(0.50 * (len(ordered) - 1))],
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+    }
@@ -0,0 +1,191 @@
+"""
+Métricas de latencia por etapa (histogramas + contadores) con exportación en
+formato de texto Prometheus.
+
+Medir una etapa cuesta un `perf_counter` y un `bisect` bajo un lock por
+histograma, así que la instrumentación puede quedar activa en producción.
+"""
+
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Límites de los buckets en segundos (de 1 ms a 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tiempos de la petición en curso (ms por etapa), si alguien los está recogiendo
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += seconds
+            self._count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Conteos acumulados por bucket (el último es +Inf), suma y total."""
+        with self._lock:
+            counts, total_sum, count = list(self._counts), self._sum, self._count
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total_sum, count
+
+
+class Metrics:
+    def __init__(self, prefix: str = "uao", buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._stages: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Registra la duración de una etapa (y la anota en la petición en curso)."""
+        hist = self._stages.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._stages.setdefault(stage, Histogram(self.buckets))
+        hist.observe(seconds)
+
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds * 1000.0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Mide el bloque como la etapa `name`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name: str) -> Callable:
+        """Decorador: mide cada llamada a la función como la etapa `name`."""
+
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - t0)
+
+            return wrapper
+
+        return decorator
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Suma `value` al contador `name` (con etiquetas opcionales)."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def gauge(self, name: str, fn: Callable[[], float], help_text: str = "") -> None:
+        """Registra un gauge que se lee al exportar (p. ej. profundidad de cola)."""
+        with self._lock:
+            self._gauges[name] = (help_text, fn)
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Conteo y media (ms) por etapa."""
+        out = {}
+        for name, hist in sorted(self._stages.items()):
+            _, total, count = hist.snapshot()
+            out[name] = {"count": count, "mean_ms": total / count * 1000.0 if count else 0.0}
+        return out
+
+    def render_prometheus(self) -> str:
+        """Todas las métricas en formato de exposición de texto de Prometheus."""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Latencia por etapa del pipeline.",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        for name, hist in sorted(self._stages.items()):
+            cumulative, total, count = hist.snapshot()
+            label = _escape(name)
+            for bound, c in zip(hist.buckets, cumulative):
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{label}",le="{bound:g}"}} {c}')
+            lines.append(f'{p}_stage_seconds_bucket{{stage="{label}",le="+Inf"}} {cumulative[-1]}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{label}"}} {total:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{label}"}} {count}')
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"{p}_{name}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value:g}")
+
+        for name, (help_text, fn) in gauges:
+            try:
+                value = float(fn())
+            except Exception:  # noqa: BLE001 - un gauge roto no tumba /metrics
+                continue
+            metric = f"{p}_{name}"
+            if help_text:
+                lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """
+    Recoge en un dict los ms por etapa medidos en este hilo/contexto mientras
+    dura el bloque (las etapas corridas en otros hilos no se incluyen). Si
+    ya había una recogida abierta, al salir le suma lo medido aquí.
+    """
+    outer = _request_timings.get()
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+        if outer is not None:
+            for name, ms in timings.items():
+                outer[name] = outer.get(name, 0.0) + ms
+
+
+# Métricas del proceso
+METRICS = Metrics()
+stage = METRICS.stage
+timed = METRICS.timed
@@ -0,0 +1,333 @@
+"""
+Reportes PDF del diagnóstico (uno o varios pacientes por documento).
+
+Los estilos, los estilos de tabla y el encabezado / aviso fijos se
+construyen una sola vez por proceso. Las imágenes se reducen al tamaño de
+impresión y se incrustan como JPEG; cada una se memoiza, así que reexportar
+el mismo estudio no vuelve a decodificar ni a codificar nada.
+"""
+
+from __future__ import annotations
+
+import copy
+import io
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.app.metrics import stage
+
+# Carga una imagen (gris o RGB uint8) al lado dado en píxeles, o None
+ImageLoader = Callable[[int], Optional[np.ndarray]]
+
+DISCLAIMER = (
+    "⚠ Este reporte es generado por un sistema de inteligencia artificial con fines de apoyo diagnóstico. "
+    "No reemplaza el criterio clínico de un médico especialista."
+)
+
+
+@dataclass(frozen=True)
+class ReportEntry:
+    patient_id: str = "Sin ID"
+    patient_name: str = "Sin nombre"
+    label: str = "—"
+    probability: str = "—"
+    # Clave estable de cada imagen (memoización) y su cargador
+    original_key: Optional[str] = None
+    original: Optional[ImageLoader] = None
+    heatmap_key: Optional[str] = None
+    heatmap: Optional[ImageLoader] = None
+
+
+@lru_cache(maxsize=1)
+def _styles() -> Dict[str, object]:
+    """Estilos de párrafo y de tabla, creados una vez por proceso."""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    return {
+        "title": ParagraphStyle("title",
+            fontName="Helvetica-Bold", fontSize=18,
+            textColor=colors.HexColor("#0d1117"),
+            spaceAfter=4, alignment=TA_CENTER),
+        "subtitle": ParagraphStyle("subtitle",
+            fontName="Helvetica", fontSize=10,
+            textColor=colors.HexColor("#5a6070"),
+            spaceAfter=2, alignment=TA_CENTER),
+        "section": ParagraphStyle("section",
+            fontName="Helvetica-Bold", fontSize=11,
+            textColor=colors.HexColor("#005cff"),
+            spaceBefore=14, spaceAfter=6),
+        "body": ParagraphStyle("body",
+            fontName="Helvetica", fontSize=10,
+            textColor=colors.HexColor("#1a1a2e"),
+            spaceAfter=4, leading=15),
+        "disclaimer": ParagraphStyle("disclaimer",
+            fontName="Helvetica-Oblique", fontSize=8,
+            textColor=colors.HexColor("#888888"),
+            alignment=TA_CENTER, spaceBefore=10),
+        "meta_table": TableStyle([
+            ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
+            ("FONTNAME", (1,0), (1,-1), "Helvetica"),
+            ("FONTSIZE", (0,0), (-1,-1), 9),
+            ("TEXTCOLOR", (0,0), (-1,-1), colors.HexColor("#5a6070")),
+            ("ALIGN", (0,0), (-1,-1), "LEFT"),
+            ("BOTTOMPADDING", (0,0), (-1,-1), 3),
+        ]),
+        "patient_table": TableStyle([
+            ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
+            ("FONTNAME", (1,0), (1,-1), "Helvetica"),
+            ("FONTSIZE", (0,0), (-1,-1), 10),
+            ("TEXTCOLOR", (0,0), (0,-1), colors.HexColor("#1a1a2e")),
+            ("TEXTCOLOR", (1,0), (1,-1), colors.HexColor("#1a1a2e")),
+            ("ROWBACKGROUNDS", (0,0), (-1,-1), [colors.HexColor("#f4f6fb"), colors.white]),
+            ("BOTTOMPADDING", (0,0), (-1,-1), 7),
+            ("TOPPADDING", (0,0), (-1,-1), 7),
+            ("LEFTPADDING", (0,0), (-1,-1), 10),
+        ]),
+        "image_table": TableStyle([
+            ("ALIGN", (0,0), (-1,-1), "CENTER"),
+            ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+            ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+            ("FONTSIZE", (0,0), (-1,0), 9),
+            ("TEXTCOLOR", (0,0), (-1,0), colors.HexColor("#5a6070")),
+            ("BOTTOMPADDING", (0,0), (-1,0), 5),
+            ("TOPPADDING", (1,0), (-1,-1), 0),
+            ("COLPADDING", (0,0), (-1,-1), 5),
+        ]),
+    }
+
+
+def _result_table_style(label: str):
+    return _result_table_styles("#ff4d6d" if label == "PNEUMONIA" else "#00c9a7")
+
+
+@lru_cache(maxsize=2)
+def _result_table_styles(diag_hex: str):
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
+        ("FONTNAME", (1,0), (1,-1), "Helvetica-Bold"),
+        ("FONTSIZE", (0,0), (-1,-1), 11),
+        ("TEXTCOLOR", (0,0), (0,-1), colors.HexColor("#1a1a2e")),
+        ("TEXTCOLOR", (1,0), (1,-1), colors.HexColor(diag_hex)),
+        ("ROWBACKGROUNDS", (0,0), (-1,-1), [colors.HexColor("#f4f6fb"), colors.white]),
+        ("BOTTOMPADDING", (0,0), (-1,-1), 9),
+        ("TOPPADDING", (0,0), (-1,-1), 9),
+        ("LEFTPADDING", (0,0), (-1,-1), 10),
+        ("BOX", (0,0), (-1,-1), 1, colors.HexColor("#e0e4ef")),
+    ])
+
+
+@lru_cache(maxsize=1)
+def _static_flowables() -> Dict[str, List[object]]:
+    """Encabezado y aviso final ya parseados (se copian en cada documento)."""
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+    from reportlab.platypus import HRFlowable, Paragraph, Spacer
+
+    s = _styles()
+    return {
+        "header": [
+            Paragraph("PneumoScan", s["title"]),
+            Paragraph("Sistema de Apoyo al Diagnóstico Médico de Neumonía", s["subtitle"]),
+            Spacer(1, 0.3*cm),
+            HRFlowable(width="100%", thickness=1.5, color=colors.HexColor("#005cff")),
+            Spacer(1, 0.4*cm),
+        ],
+        "footer": [
+            HRFlowable(width="100%", thickness=0.5, color=colors.HexColor("#cccccc")),
+            Paragraph(DISCLAIMER, s["disclaimer"]),
+        ],
+        "section_patient": [Paragraph("Datos del Paciente", s["section"])],
+        "section_result": [Paragraph("Resultado del Análisis", s["section"])],
+        "image_captions": [
+            Paragraph("Radiografía original", s["body"]),
+            Paragraph("Mapa de calor Grad-CAM", s["body"]),
+        ],
+    }
+
+
+def _copies(name: str) -> List[object]:
+    # Copia superficial: cada documento guarda su propio layout (wrap/split)
+    return [copy.copy(f) for f in _static_flowables()[name]]
+
+
+class ReportBuilder:
+    def __init__(self, dpi: int = 150, jpeg_quality: int = 85, max_images: int = 256) -> None:
+        """
+        Args:
+            dpi: Resolución de impresión de las imágenes incrustadas.
+            jpeg_quality: Calidad JPEG (1-95).
+            max_images: Imágenes preparadas que se retienen (LRU).
+        """
+        self.dpi = int(dpi)
+        self.jpeg_quality = int(jpeg_quality)
+        self.max_images = int(max_images)
+
+        self._lock = threading.Lock()
+        self._images: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.image_hits = 0
+        self.image_misses = 0
+
+    def print_image(
+        self,
+        key: Optional[str],
+        loader: Optional[ImageLoader],
+        width_px: int,
+        height_px: int,
+    ) -> Optional[bytes]:
+        """
+        JPEG de la imagen reducida a (width_px, height_px), memoizado por
+        (clave, tamaño). None si no hay imagen.
+        """
+        if key is None or loader is None:
+            return None
+        memo_key = (key, width_px, height_px, self.jpeg_quality)
+        with self._lock:
+            jpeg = self._images.get(memo_key)
+            if jpeg is not None:
+                self._images.move_to_end(memo_key)
+                self.image_hits += 1
+                return jpeg
+
+        img = loader(max(width_px, height_px))
+        if img is None:
+            return None
+        if img.shape[:2] != (height_px, width_px):
+            img = cv2.resize(img, (width_px, height_px), interpolation=cv2.INTER_AREA)
+        buf = io.BytesIO()
+        Image.fromarray(img).save(buf, format="JPEG", quality=self.jpeg_quality)
+        jpeg = buf.getvalue()
+
+        with self._lock:
+            self.image_misses += 1
+            self._images[memo_key] = jpeg
+            while len(self._images) > self.max_images:
+                self._images.popitem(last=False)
+        return jpeg
+
+    def write(self, entries: Sequence[ReportEntry], out: BinaryIO) -> None:
+        """Escribe en `out` un PDF con una página por entrada."""
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import cm
+        from reportlab.platypus import PageBreak, SimpleDocTemplate
+
+        doc = SimpleDocTemplate(
+            out, pagesize=A4,
+            leftMargin=2*cm, rightMargin=2*cm,
+            topMargin=2*cm, bottomMargin=2*cm
+        )
+        story: List[object] = []
+        for i, entry in enumerate(entries):
+            if i:
+                story.append(PageBreak())
+            story.extend(self._page(entry, A4[0] - 4*cm))
+        with stage("pdf_build"):
+            doc.build(story)
+
+    def render(self, entries: Sequence[ReportEntry]) -> bytes:
+        buf = io.BytesIO()
+        self.write(entries, buf)
+        return buf.getvalue()
+
+    def stream(self, entries: Sequence[ReportEntry], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        PDF de una lista de trabajo completa, entregado por trozos. ReportLab
+        arma el documento entero antes de escribirlo, así que se escribe a un
+        temporal (en disco si crece) y se lee desde ahí, sin retenerlo entero
+        en memoria.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as tmp:
+            self.write(entries, tmp)
+            tmp.seek(0)
+            while True:
+                chunk = tmp.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "images": len(self._images),
+                "image_hits": self.image_hits,
+                "image_misses": self.image_misses,
+            }
+
+    def _page(self, entry: ReportEntry, W: float) -> List[object]:
+        from reportlab.lib.units import cm, inch
+        from reportlab.platypus import Image as RLImage
+        from reportlab.platypus import Spacer, Table
+
+        s = _styles()
+        story: List[object] = _copies("header")
+
+        # ── fecha y folio ──
+        now = datetime.now().strftime("%d/%m/%Y %H:%M")
+        meta_table = Table(
+            [["Fecha del reporte:", now], ["Folio:", uuid.uuid4().hex[:8].upper()]],
+            colWidths=[4*cm, W-4*cm],
+        )
+        meta_table.setStyle(s["meta_table"])
+        story += [meta_table, Spacer(1, 0.5*cm)]
+
+        # ── datos del paciente ──
+        story += _copies("section_patient")
+        pt = Table(
+            [["Nombre completo:", entry.patient_name], ["Cédula / ID:", entry.patient_id]],
+            colWidths=[4.5*cm, W-4.5*cm],
+        )
+        pt.setStyle(s["patient_table"])
+        story += [pt, Spacer(1, 0.5*cm)]
+
+        # ── resultado ──
+        story += _copies("section_result")
+        rt = Table(
+            [["Diagnóstico:", entry.label], ["Confianza en el modelo:", f"{entry.probability}%"]],
+            colWidths=[5.5*cm, W-5.5*cm],
+        )
+        rt.setStyle(_result_table_style(entry.label))
+        story += [rt, Spacer(1, 0.6*cm)]
+
+        # ── imágenes, ya al tamaño de impresión ──
+        img_w = (W - 0.8*cm) / 2
+        img_h = img_w * 0.9
+        px_w, px_h = round(img_w / inch * self.dpi), round(img_h / inch * self.dpi)
+
+        cells = []
+        for key, loader in ((entry.original_key, entry.original), (entry.heatmap_key, entry.heatmap)):
+            jpeg = self.print_image(key, loader, px_w, px_h) or _placeholder_jpeg()
+            cells.append(RLImage(io.BytesIO(jpeg), width=img_w, height=img_h))
+
+        img_table = Table(
+            [_copies("image_captions"), cells],
+            colWidths=[img_w, img_w], hAlign="CENTER"
+        )
+        img_table.setStyle(s["image_table"])
+        story += [img_table, Spacer(1, 0.8*cm)]
+
+        # ── línea final ──
+        story += _copies("footer")
+        return story
+
+
+@lru_cache(maxsize=1)
+def _placeholder_jpeg() -> bytes:
+    # placeholder gris
+    buf = io.BytesIO()
+    Image.new("RGB", (300, 270), color=(220, 224, 235)).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
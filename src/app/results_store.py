@@ -0,0 +1,288 @@
+"""
+Historial persistente de resultados (SQLite embebido).
+
+Cada análisis queda registrado con cédula, fecha, diagnóstico,
+probabilidad y rutas de sus artefactos, indexado por cédula y por fecha.
+Las peticiones solo encolan el registro: un hilo escritor los agrupa y los
+inserta en una transacción por lote, así que la respuesta no espera al
+disco. Las exportaciones recorren la tabla por páginas (paginación por
+clave, sin OFFSET) y nunca cargan la cohorte completa en memoria.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    result_id    TEXT PRIMARY KEY,
+    patient_id   TEXT NOT NULL DEFAULT '',
+    patient_name TEXT NOT NULL DEFAULT '',
+    created_at   TEXT NOT NULL,
+    label        TEXT NOT NULL,
+    probability  REAL NOT NULL,
+    model_id     TEXT NOT NULL DEFAULT '',
+    image        TEXT NOT NULL DEFAULT '',
+    heatmap      TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS results_patient_date ON results (patient_id, created_at, result_id);
+CREATE INDEX IF NOT EXISTS results_date ON results (created_at, result_id);
+"""
+
+_COLUMNS = (
+    "result_id", "patient_id", "patient_name", "created_at",
+    "label", "probability", "model_id", "image", "heatmap",
+)
+
+CSV_HEADER = (
+    "cedula", "nombre", "fecha", "diagnostico", "probabilidad",
+    "result_id", "imagen", "heatmap",
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+@dataclass(frozen=True)
+class ResultRecord:
+    result_id: str
+    label: str
+    probability: float
+    patient_id: str = ""
+    patient_name: str = ""
+    # ISO 8601 en UTC; el orden de texto coincide con el cronológico
+    created_at: str = field(default_factory=_now)
+    model_id: str = ""
+    # Rutas relativas a ui/static (vacías si el artefacto no se guardó)
+    image: str = ""
+    heatmap: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def csv_row(self) -> Tuple[str, ...]:
+        return (
+            self.patient_id, self.patient_name, self.created_at, self.label,
+            f"{self.probability:.2f}%", self.result_id, self.image, self.heatmap,
+        )
+
+
+def _date_bound(value: Optional[str], end: bool) -> Optional[str]:
+    """
+    Normaliza un límite de fecha. Una fecha sin hora (AAAA-MM-DD) cubre el
+    día completo cuando es el límite superior.
+
+    Raises:
+        ValueError: Si no es una fecha ISO 8601.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    parsed = datetime.fromisoformat(value)
+    if len(value) == 10 and end:
+        return value + "T99"  # mayor que cualquier hora de ese día
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.replace(tzinfo=None).isoformat(timespec="milliseconds")
+
+
+class ResultsStore:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        batch_size: int = 64,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+    ) -> None:
+        """
+        Args:
+            path: Archivo de la base de datos SQLite.
+            batch_size: Registros máximos por transacción del escritor.
+            flush_interval: Segundos máximos que un registro espera a su lote.
+            max_pending: Registros en cola antes de frenar a quien registra.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+        self._local = threading.local()
+        self._queue: "queue.Queue[Optional[ResultRecord]]" = queue.Queue(maxsize=int(max_pending))
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+        self._writer = threading.Thread(target=self._run, name="results-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, record: ResultRecord) -> None:
+        """Encola un registro; se escribe en el próximo lote del escritor."""
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """Bloquea hasta que todo lo encolado esté escrito."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Escribe lo pendiente y detiene el escritor."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _run(self) -> None:
+        conn = self._connect()
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    self._queue.task_done()
+                    return
+                batch, stop = self._drain(first)
+                self._write(conn, batch)
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _drain(self, first: ResultRecord) -> Tuple[List[ResultRecord], int]:
+        """Completa un lote hasta `batch_size` o hasta agotar `flush_interval`."""
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, 1
+            batch.append(item)
+        return batch, 0
+
+    def _write(self, conn: sqlite3.Connection, batch: List[ResultRecord]) -> None:
+        rows = [tuple(getattr(r, c) for c in _COLUMNS) for r in batch]
+        sql = (f"INSERT OR REPLACE INTO results ({', '.join(_COLUMNS)}) "
+               f"VALUES ({', '.join('?' * len(_COLUMNS))})")
+        try:
+            with conn:
+                conn.executemany(sql, rows)
+        except sqlite3.Error as exc:
+            with self._lock:
+                self.errors += len(batch)
+                self.last_error = f"{type(exc).__name__}: {exc}"
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def get(self, result_id: str) -> Optional[ResultRecord]:
+        row = self._reader().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM results WHERE result_id = ?", (result_id,)
+        ).fetchone()
+        return ResultRecord(**dict(zip(_COLUMNS, row))) if row else None
+
+    def iter_records(
+        self,
+        patient_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        page_size: int = 500,
+    ) -> Iterator[ResultRecord]:
+        """
+        Resultados en orden cronológico, filtrados por cédula y/o rango de
+        fechas (ISO 8601, ambos extremos incluidos). Se leen de a
+        `page_size` filas, cada página en su propia consulta corta, así que
+        el iterador puede consumirse despacio sin bloquear al escritor.
+
+        Raises:
+            ValueError: Si `since` o `until` no son fechas válidas (al
+                llamar, no al iterar).
+        """
+        where, params = [], []
+        if patient_id:
+            where.append("patient_id = ?")
+            params.append(patient_id)
+        since, until = _date_bound(since, end=False), _date_bound(until, end=True)
+        if since:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until:
+            where.append("created_at <= ?")
+            params.append(until)
+        return self._pages(where, params, int(page_size))
+
+    def _pages(self, where: List[str], params: List[Any], page_size: int) -> Iterator[ResultRecord]:
+        cursor: Tuple[str, str] = ("", "")
+        conditions = " AND ".join(where + ["(created_at, result_id) > (?, ?)"])
+        sql = (f"SELECT {', '.join(_COLUMNS)} FROM results WHERE {conditions} "
+               f"ORDER BY created_at, result_id LIMIT ?")
+        while True:
+            rows = self._reader().execute(sql, (*params, *cursor, page_size)).fetchall()
+            for row in rows:
+                yield ResultRecord(**dict(zip(_COLUMNS, row)))
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1][3], rows[-1][0])
+
+    def export_csv(self, page_size: int = 500, **filters: Any) -> Iterator[str]:
+        """
+        CSV de la cohorte (mismos filtros que `iter_records`), un trozo de
+        texto por página de resultados.
+        """
+        return csv_chunks(self.iter_records(page_size=page_size, **filters), page_size)
+
+    def stats(self) -> Dict[str, Any]:
+        (rows,) = self._reader().execute("SELECT COUNT(*) FROM results").fetchone()
+        with self._lock:
+            return {
+                "rows": rows,
+                "pending": self._queue.qsize(),
+                "written": self.written,
+                "batches": self.batches,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # Una conexión de lectura por hilo (SQLite no comparte cursores entre hilos)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+
+def csv_chunks(records: Iterable[ResultRecord], rows_per_chunk: int = 500) -> Iterator[str]:
+    """Serializa registros como CSV (con cabecera), de a `rows_per_chunk` filas."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    for count, record in enumerate(records, 1):
+        writer.writerow(record.csv_row())
+        if count % rows_per_chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
@@ -0,0 +1,282 @@
+"""
+Servidor de producción: varios procesos (prefork) sobre un mismo socket y
+un presupuesto explícito de hilos por proceso.
+
+El padre abre el socket, importa TensorFlow, Keras y los módulos de la app
+(la mayor parte de la memoria de un worker) y lee los pesos para calcular
+su hash; después crea los workers con fork y estos heredan esas páginas
+copy-on-write. El runtime de TensorFlow no sobrevive a un fork (sus pools
+de hilos no existen en el hijo y el primer forward se queda bloqueado), así
+que el padre nunca lo inicia: cada worker fija sus hilos de TF y OpenCV,
+importa la app y carga los pesos (del `.keras` ya convertido).
+"""
+
+from __future__ import annotations
+
+import atexit
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Módulos que el padre importa antes del fork (ninguno inicia el runtime de TF)
+PRELOAD_MODULES = (
+    "numpy",
+    "cv2",
+    "PIL.Image",
+    "pydicom",
+    "flask",
+    "tensorflow",
+    "keras",
+    "src.app.integrator",
+    "src.models.engine",
+    "src.visualizations.grad_cam",
+)
+# Código de salida de un worker que no pudo importar la app
+WORKER_BOOT_ERROR = 3
+
+
+def available_cpus() -> int:
+    """Núcleos que este proceso puede usar (respeta la afinidad / cgroups)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    workers: int
+    # Hilos de TF dentro de una op (matmul/conv) y entre ops independientes
+    intra_op: int
+    inter_op: int
+    # Hilos de OpenCV y del pool de `preprocess_batch`
+    cv2: int
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def thread_budget(
+    workers: int = 1,
+    cores: Optional[int] = None,
+    intra_op: Optional[int] = None,
+    inter_op: Optional[int] = None,
+    cv2_threads: Optional[int] = None,
+) -> ThreadBudget:
+    """
+    Reparte los núcleos entre `workers` procesos. Cada worker usa sus
+    núcleos para las ops de TF; OpenCV recibe la mitad, porque el
+    preprocesamiento de una petición corre a la vez que el forward de otra.
+    Los valores explícitos tienen prioridad.
+    """
+    workers = max(1, int(workers))
+    per_worker = max(1, (cores or available_cpus()) // workers)
+    return ThreadBudget(
+        workers=workers,
+        intra_op=intra_op or per_worker,
+        inter_op=inter_op or (1 if per_worker < 4 else 2),
+        cv2=cv2_threads or max(1, per_worker // 2),
+    )
+
+
+_applied: Optional[ThreadBudget] = None
+
+
+def configure_threads(budget: ThreadBudget) -> ThreadBudget:
+    """
+    Aplica el presupuesto al proceso. Debe llamarse antes de la primera op
+    de TF; la primera llamada gana y las siguientes devuelven el vigente.
+    """
+    global _applied
+    if _applied is not None:
+        return _applied
+
+    import cv2
+
+    from src.features import preprocess_img
+
+    cv2.setNumThreads(budget.cv2)
+    preprocess_img.set_workers(budget.cv2)
+    # TF lee estas variables al iniciar su runtime (sin importarlo aquí)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(budget.intra_op)
+    os.environ["TF_NUM_INTEROP_THREADS"] = str(budget.inter_op)
+    if "tensorflow" in sys.modules:
+        tf = sys.modules["tensorflow"]
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(budget.intra_op)
+            tf.config.threading.set_inter_op_parallelism_threads(budget.inter_op)
+        except RuntimeError:
+            logger.warning("El runtime de TF ya estaba iniciado; sus hilos no cambian")
+    _applied = budget
+    return budget
+
+
+def preload(model_path: Optional[str] = None) -> Dict[str, float]:
+    """
+    Importa `PRELOAD_MODULES` y calcula el hash de los pesos, sin iniciar
+    el runtime de TF. Se llama en el padre, antes del fork.
+
+    Returns:
+        ms por fase ("imports" y, con modelo, "model_hash").
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    timings["imports"] = (time.perf_counter() - t0) * 1000.0
+    if model_path and os.path.exists(model_path):
+        from src.models.registry import get_registry
+
+        t0 = time.perf_counter()
+        get_registry().prefetch(model_path)
+        timings["model_hash"] = (time.perf_counter() - t0) * 1000.0
+    return timings
+
+
+def _make_server(host: str, port: int, app, fd: Optional[int], access_log: bool):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    handler = WSGIRequestHandler
+    if not access_log:
+        class _QuietHandler(WSGIRequestHandler):
+            def log_request(self, code="-", size="-") -> None:
+                pass
+
+        handler = _QuietHandler
+    return make_server(host, port, app, threaded=True, request_handler=handler, fd=fd)
+
+
+def _run_worker(
+    load_app: Callable[[], object],
+    budget: ThreadBudget,
+    host: str,
+    port: int,
+    fd: Optional[int],
+    access_log: bool,
+) -> int:
+    configure_threads(budget)
+    try:
+        app = load_app()
+    except Exception:  # noqa: BLE001 - el padre decide si seguir
+        logger.exception("El worker %d no pudo cargar la app", os.getpid())
+        return WORKER_BOOT_ERROR
+    server = _make_server(host, port, app, fd, access_log)
+
+    def stop(signum, frame):
+        # shutdown() espera a serve_forever: no puede correr en este mismo hilo
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+    server.server_close()
+    return 0
+
+
+def serve(
+    load_app: Callable[[], object],
+    host: str = "127.0.0.1",
+    port: int = 5000,
+    budget: Optional[ThreadBudget] = None,
+    preload_modules: bool = True,
+    preload_model: Optional[str] = None,
+    access_log: bool = False,
+    graceful_timeout: float = 30.0,
+) -> int:
+    """
+    Sirve la app WSGI que retorna `load_app` con `budget.workers` procesos.
+
+    Con un solo worker no hay fork: la app corre en este proceso. Con
+    varios, el padre abre el socket, precarga (`preload`) y supervisa: un
+    worker que muere se reemplaza, y SIGTERM/SIGINT los detiene a todos.
+
+    Args:
+        load_app: Importa y retorna la app; corre dentro de cada worker.
+        host, port: Dirección de escucha.
+        budget: Workers e hilos por worker (por defecto, `thread_budget()`).
+        preload_modules: Importar `PRELOAD_MODULES` antes del fork.
+        preload_model: Pesos cuyo hash se calcula antes del fork.
+        access_log: Registrar cada petición (desactivado: cuesta por petición).
+        graceful_timeout: Segundos para que los workers terminen al detener.
+
+    Returns:
+        Código de salida del proceso.
+    """
+    budget = budget or thread_budget()
+    if budget.workers == 1:
+        return _run_worker(load_app, budget, host, port, None, access_log)
+
+    from werkzeug.serving import select_address_family
+
+    family = select_address_family(host, port)
+    sock = socket.create_server((host, port), family=family, backlog=128)
+    sock.set_inheritable(True)
+    if preload_modules:
+        logger.info("Precarga (ms): %s", preload(preload_model))
+    logger.info("%d workers con %s", budget.workers, budget.to_dict())
+
+    children: Dict[int, int] = {}
+    state = {"stopping": False, "exit": 0}
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                code = _run_worker(load_app, budget, host, port, sock.fileno(), access_log)
+                # os._exit no corre atexit (cierre del historial SQLite, etc.)
+                atexit._run_exitfuncs()
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum=None, frame=None) -> None:
+        state["stopping"] = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(budget.workers):
+        spawn(index)
+
+    deadline = None
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if state["stopping"]:
+                deadline = deadline or time.monotonic() + graceful_timeout
+                if time.monotonic() > deadline:
+                    for child in children:
+                        os.kill(child, signal.SIGKILL)
+            time.sleep(0.2)
+            continue
+        index = children.pop(pid, None)
+        if index is None or state["stopping"]:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if code == WORKER_BOOT_ERROR:
+            logger.error("El worker %d no pudo arrancar; se detiene el servidor", index)
+            state["exit"] = 1
+            stop()
+            continue
+        logger.warning("Worker %d (pid %d) terminó con %s; se reemplaza", index, pid, code)
+        time.sleep(1.0)
+        spawn(index)
+
+    sock.close()
+    return state["exit"]
@@ -0,0 +1,38 @@
+"""
+Tiempos de arranque por fase (imports, carga del modelo, warm-up...), para
+que una regresión en el arranque en frío sea visible.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class StartupTimer:
+    def __init__(self) -> None:
+        self._started = time.perf_counter()
+        self._phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Mide el bloque y lo acumula bajo `name` (en ms)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - t0) * 1000.0)
+
+    def record(self, name: str, ms: float) -> None:
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + ms
+
+    def as_dict(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "phases_ms": {k: round(v, 2) for k, v in self._phases.items()},
+                "since_start_ms": round((time.perf_counter() - self._started) * 1000.0, 2),
+            }
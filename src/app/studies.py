@@ -0,0 +1,142 @@
+"""
+Inferencia por estudio: todos los frames de un StudyInstanceUID (archivos
+de una serie y objetos multi-frame) pasan por el modelo en lotes y se
+resumen en un resultado por frame más un agregado del estudio.
+
+Los frames se decodifican de a uno y cada resultado se entrega a
+`on_frame` y se descarta; del estudio solo se acumulan las probabilidades
+de cada frame, así que la memoria no crece con el número de frames.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from src.app.integrator import LABELS, PneumoniaDetector, PredictionResult
+from src.app.metrics import METRICS, stage
+from src.data.read_img import ImageSource
+from src.data.series import FrameRef, group_studies, iter_study_frames
+
+FrameCallback = Callable[[FrameRef, PredictionResult], Optional[Dict[str, object]]]
+
+
+@dataclass(frozen=True)
+class FrameResult:
+    ref: FrameRef
+    label: str
+    probability: float
+    probabilities: Tuple[float, ...]
+    # Campos extra que devolvió `on_frame` (p. ej. result_id)
+    extra: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            **self.ref.to_dict(),
+            "label": self.label,
+            "probability": round(self.probability, 2),
+            **self.extra,
+        }
+
+
+@dataclass
+class StudyResult:
+    study_uid: str
+    frames: List[FrameResult] = field(default_factory=list)
+
+    @property
+    def mean_probabilities(self) -> Tuple[float, ...]:
+        """Probabilidad media (%) de cada clase sobre los frames."""
+        if not self.frames:
+            return ()
+        n = len(self.frames)
+        return tuple(sum(col) / n for col in zip(*(f.probabilities for f in self.frames)))
+
+    @property
+    def label(self) -> Optional[str]:
+        """Etiqueta del estudio: la clase con mayor probabilidad media."""
+        mean = self.mean_probabilities
+        if not mean:
+            return None
+        index = max(range(len(mean)), key=mean.__getitem__)
+        return LABELS.get(index, str(index))
+
+    def to_dict(self) -> Dict[str, object]:
+        mean = self.mean_probabilities
+        label = self.label
+        votes: Dict[str, int] = {}
+        for f in self.frames:
+            votes[f.label] = votes.get(f.label, 0) + 1
+        # Frame que más apoya la etiqueta del estudio
+        key = next((i for i, name in LABELS.items() if name == label), None)
+        top = max(self.frames, key=lambda f: f.probabilities[key]) if key is not None else None
+        return {
+            "study_uid": self.study_uid,
+            "frames": len(self.frames),
+            "label": label,
+            "probability": round(max(mean), 2) if mean else None,
+            "mean_probabilities": {LABELS.get(i, str(i)): round(p, 2) for i, p in enumerate(mean)},
+            "votes": votes,
+            "top_frame": top.to_dict() if top is not None else None,
+            "per_frame": [f.to_dict() for f in self.frames],
+        }
+
+
+def predict_study(
+    detector: PneumoniaDetector,
+    study_uid: str,
+    refs: List[FrameRef],
+    sources: Mapping[str, ImageSource],
+    batch_size: int = 8,
+    on_frame: Optional[FrameCallback] = None,
+) -> StudyResult:
+    """
+    Ejecuta el modelo sobre todos los frames de un estudio, en lotes.
+
+    Args:
+        detector: Detector ya configurado.
+        study_uid: Estudio a procesar.
+        refs: Frames del estudio (de `group_studies`).
+        sources: {nombre: ruta o bytes} de los archivos del estudio.
+        batch_size: Frames por forward.
+        on_frame: Recibe cada (FrameRef, PredictionResult) completo, con
+            su CAM e imagen; lo que retorne se añade al resumen del frame.
+
+    Returns:
+        StudyResult con el resumen por frame (sin CAMs ni imágenes).
+    """
+    study = StudyResult(study_uid)
+    decoded = iter_study_frames(refs, sources)
+    # Referencias de los frames ya leídos y aún sin resultado (a lo sumo un lote)
+    pending: Deque[FrameRef] = deque()
+
+    def images():
+        for ref, image in decoded:
+            pending.append(ref)
+            yield image
+
+    with stage("predict_study"):
+        for result in detector.predict_frames(images(), batch_size=batch_size):
+            ref = pending.popleft()
+            extra = on_frame(ref, result) if on_frame is not None else None
+            study.frames.append(FrameResult(
+                ref=ref,
+                label=result.label,
+                probability=result.probability,
+                probabilities=result.probabilities,
+                extra=dict(extra or {}),
+            ))
+    METRICS.inc("study_frames", len(study.frames))
+    return study
+
+
+def predict_studies(
+    detector: PneumoniaDetector,
+    sources: Mapping[str, ImageSource],
+    batch_size: int = 8,
+    on_frame: Optional[FrameCallback] = None,
+) -> Iterator[StudyResult]:
+    """Agrupa `sources` por StudyInstanceUID y procesa un estudio a la vez."""
+    for study_uid, refs in group_studies(sources).items():
+        yield predict_study(detector, study_uid, refs, sources, batch_size, on_frame)
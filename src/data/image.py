@@ -0,0 +1,56 @@
+"""
+Contenedor de imagen de un canal compartido por lectura, preproceso y
+Grad-CAM: evita ir y volver entre gris y RGB en cada etapa.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+@dataclass(eq=False)
+class GrayImage:
+    """
+    Imagen uint8 de un canal (H, W).
+
+    La vista RGB solo se crea (y se guarda) la primera vez que alguien la
+    pide; `preview` guarda la imagen PIL a resolución completa si el lector
+    la construyó.
+    """
+
+    pixels: np.ndarray
+    preview: Optional[Image.Image] = None
+    _rgb: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.pixels.ndim != 2 or self.pixels.dtype != np.uint8:
+            raise ValueError(
+                f"GrayImage espera (H,W) uint8, recibió {self.pixels.shape} {self.pixels.dtype}"
+            )
+
+    @classmethod
+    def from_array(cls, img: np.ndarray) -> "GrayImage":
+        """Crea el contenedor desde un array gris (H,W) o RGB (H,W,3)."""
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        return cls(np.ascontiguousarray(img, dtype=np.uint8))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.pixels.shape  # type: ignore[return-value]
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """Vista RGB (H,W,3), creada de forma perezosa."""
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.pixels, cv2.COLOR_GRAY2RGB)
+        return self._rgb
+
+    def to_pil(self) -> Image.Image:
+        """Imagen PIL para la UI (la de resolución completa si existe)."""
+        return self.preview if self.preview is not None else Image.fromarray(self.pixels)
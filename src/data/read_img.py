@@ -2,31 +2,348 @@
 Lectura de imágenes (DICOM/JPG/PNG) y conversión a:
 - array numpy para el pipeline
 - imagen PIL para mostrar en la UI
+
+Las funciones aceptan una ruta, los bytes del archivo o un stream binario,
+así que una subida puede procesarse en memoria sin escribirla a disco.
 """
 
 from __future__ import annotations
 
-from typing import Tuple
+import io
+import os
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import cv2
 import pydicom
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
+from pydicom.pixels import pixel_array as decode_dicom_pixels
+
+from src.app.metrics import stage
+from src.data.image import GrayImage
+
+ImageSource = Union[str, "os.PathLike[str]", bytes, bytearray, memoryview, BinaryIO]
+
+_JPEG_MAGIC = b"\xff\xd8\xff"
+_PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
+def load_bytes(source: ImageSource) -> bytes:
+    """
+    Obtiene los bytes de una ruta, buffer o stream binario.
 
+    Args:
+        source: Ruta, bytes o stream (se lee desde la posición actual).
 
-def read_dicom_image(file_path: str) -> Tuple[np.ndarray, Image.Image]:
+    Returns:
+        bytes: Contenido del archivo.
+    """
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    return source.read()
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """
+    Detecta el formato por contenido (no por extensión).
+
+    Args:
+        data: Primeros bytes del archivo (al menos 132 para DICOM).
+
+    Returns:
+        "dicom", "jpeg", "png" o None si no se reconoce.
+    """
+    if len(data) >= 132 and data[128:132] == b"DICM":
+        return "dicom"
+    if data.startswith(_JPEG_MAGIC):
+        return "jpeg"
+    if data.startswith(_PNG_MAGIC):
+        return "png"
+    # DICOM sin preámbulo: arranca directo con un tag de grupo 0002/0008
+    if data[:2] in (b"\x02\x00", b"\x08\x00") and data[3:4] == b"\x00":
+        return "dicom"
+    return None
+
+
+def read_image(
+    source: ImageSource,
+    fast: bool = False,
+    preview: bool = True,
+) -> Tuple[np.ndarray, Optional[Image.Image]]:
+    """
+    Lee una imagen DICOM/JPG/PNG eligiendo el lector por contenido.
+
+    Args:
+        source: Ruta, bytes o stream binario.
+        fast: Si True, usa la decodificación reducida: retorna el array ya
+            en escala de grises a la resolución de trabajo (512x512).
+        preview: Con `fast`, construir además la imagen PIL a resolución
+            completa (si False retorna None).
+
+    Returns:
+        img: RGB (H, W, 3) uint8, o gris (512, 512) uint8 con `fast`.
+        img_pil: Imagen PIL para visualización (o None).
+    """
+    data = load_bytes(source)
+    if sniff_format(data) == "dicom":
+        if fast:
+            return read_dicom_lean(data, preview=preview)
+        return read_dicom_image(data)
+    if fast:
+        return read_image_file_fast(data, preview=preview)
+    return read_image_file(data)
+
+
+def read_gray(
+    source: ImageSource,
+    size: int = 512,
+    preview: bool = False,
+) -> GrayImage:
+    """
+    Lee una imagen DICOM/JPG/PNG directo a un canal a la resolución de
+    trabajo, con la decodificación reducida.
+
+    Args:
+        source: Ruta, bytes o stream binario.
+        size: Lado de la resolución de trabajo.
+        preview: Guardar además la imagen PIL a resolución completa.
+
+    Returns:
+        GrayImage (size, size).
+    """
+    data = load_bytes(source)
+    if sniff_format(data) == "dicom":
+        with stage("decode_dicom"):
+            gray, img_pil = read_dicom_lean(data, size=size, preview=preview)
+    else:
+        with stage("decode_image"):
+            gray, img_pil = read_image_file_fast(data, size=size, preview=preview)
+    return GrayImage(gray, img_pil)
+
+
+@dataclass(frozen=True)
+class DicomHeader:
+    rows: int
+    columns: int
+    frames: int
+    bits_stored: int
+    pixel_representation: int
+    photometric: str
+    slope: float
+    intercept: float
+    window_center: Optional[float]
+    window_width: Optional[float]
+    study_uid: Optional[str]
+    series_uid: Optional[str] = None
+    instance_number: Optional[int] = None
+
+
+def _first_value(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, pydicom.multival.MultiValue)):
+        value = value[0] if len(value) else None
+    return None if value is None else float(value)
+
+
+def read_dicom_header(source: ImageSource) -> DicomHeader:
+    """
+    Lee solo la cabecera DICOM (`stop_before_pixels`), sin tocar los píxeles.
+
+    Args:
+        source: Ruta, bytes o stream binario.
+
+    Returns:
+        DicomHeader con geometría, rescale y ventana VOI.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    ds = pydicom.dcmread(source, stop_before_pixels=True)
+
+    return DicomHeader(
+        rows=int(ds.Rows),
+        columns=int(ds.Columns),
+        frames=int(ds.get("NumberOfFrames", 1) or 1),
+        bits_stored=int(ds.get("BitsStored", ds.get("BitsAllocated", 8))),
+        pixel_representation=int(ds.get("PixelRepresentation", 0)),
+        photometric=str(ds.get("PhotometricInterpretation", "MONOCHROME2")),
+        slope=_first_value(ds.get("RescaleSlope")) or 1.0,
+        intercept=_first_value(ds.get("RescaleIntercept")) or 0.0,
+        window_center=_first_value(ds.get("WindowCenter")),
+        window_width=_first_value(ds.get("WindowWidth")),
+        study_uid=str(ds.StudyInstanceUID) if "StudyInstanceUID" in ds else None,
+        series_uid=str(ds.SeriesInstanceUID) if "SeriesInstanceUID" in ds else None,
+        instance_number=int(ds.InstanceNumber) if ds.get("InstanceNumber") not in (None, "") else None,
+    )
+
+
+def _dicom_lut(header: DicomHeader, pixels: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Tabla raw -> uint8 con rescale + ventana VOI, indexada por el valor crudo
+    (int16 se indexa por su vista uint16). None si el dtype no la admite.
+    """
+    if pixels.dtype == np.uint8:
+        values = np.arange(256, dtype=np.float32)
+    elif pixels.dtype in (np.uint16, np.int16):
+        values = np.arange(65536, dtype=np.uint32).astype(np.uint16)
+        values = values.view(pixels.dtype).astype(np.float32)
+    else:
+        return None
+
+    values = values * header.slope + header.intercept
+
+    center, width = header.window_center, header.window_width
+    if center is not None and width is not None and width > 1:
+        # Ventana lineal DICOM (PS3.3 C.11.2.1.2)
+        values = ((values - (center - 0.5)) / (width - 1) + 0.5) * 255.0
+    else:
+        # Sin ventana: mismo criterio que read_dicom_image (0..máximo)
+        hi = float(pixels.max()) * header.slope + header.intercept
+        values = np.maximum(values, 0) / hi * 255.0 if hi > 0 else np.zeros_like(values)
+
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+def _apply_lut(lut: np.ndarray, pixels: np.ndarray) -> np.ndarray:
+    index = pixels.view(np.uint16) if pixels.dtype == np.int16 else pixels
+    return lut.take(index)
+
+
+def read_dicom_lean(
+    source: ImageSource,
+    size: int = 512,
+    preview: bool = False,
+    frame: Optional[int] = None,
+) -> Tuple[np.ndarray, Optional[Image.Image]]:
+    """
+    Decodificación DICOM de bajo consumo para el pipeline.
+
+    Lee la cabecera sin píxeles, decodifica el frame, lo reduce a `size`
+    antes de cualquier conversión y aplica rescale + ventana VOI en una sola
+    pasada (tabla de consulta) sobre el array pequeño. No se crean copias
+    float32 ni RGB a resolución completa.
+
+    Args:
+        source: Ruta, bytes o stream binario.
+        size: Lado de la resolución de trabajo.
+        preview: Construir también la imagen PIL a resolución completa.
+        frame: Frame a decodificar en objetos multi-frame (None = el primero).
+
+    Returns:
+        gray: (size, size) uint8.
+        img_pil: Imagen PIL a resolución completa (o None).
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    header = read_dicom_header(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+    pixels = decode_dicom_pixels(source, index=frame if frame is not None else 0)
+    return dicom_pixels_to_gray(pixels, header, size=size, preview=preview)
+
+
+def iter_dicom_frames(
+    source: ImageSource,
+    size: int = 512,
+    header: Optional[DicomHeader] = None,
+    frames: Optional[Sequence[int]] = None,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Recorre los frames de un DICOM (multi-frame o de un solo frame) de a
+    uno: cada frame se decodifica, se reduce a `size` y se suelta antes de
+    pasar al siguiente, así que la memoria no crece con el número de frames.
+
+    Args:
+        source: Ruta, bytes o stream binario.
+        size: Lado de la resolución de trabajo.
+        header: Cabecera ya leída (se lee si no se pasa).
+        frames: Índices a decodificar (None = todos, en orden).
+
+    Yields:
+        (índice del frame, gris (size, size) uint8)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from iter_dicom_frames(f, size=size, header=header, frames=frames)
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    if header is None:
+        header = read_dicom_header(source)
+    for index in range(header.frames) if frames is None else frames:
+        source.seek(0)
+        with stage("decode_dicom"):
+            pixels = decode_dicom_pixels(source, index=index)
+            gray, _ = dicom_pixels_to_gray(pixels, header, size=size)
+        yield index, gray
+
+
+def dicom_pixels_to_gray(
+    pixels: np.ndarray,
+    header: DicomHeader,
+    size: int = 512,
+    preview: bool = False,
+) -> Tuple[np.ndarray, Optional[Image.Image]]:
+    """
+    Convierte un frame DICOM crudo a gris uint8 (size, size) reduciendo
+    primero y aplicando rescale + VOI después.
+    """
+    interpolation = (
+        cv2.INTER_AREA
+        if pixels.shape[0] > size or pixels.shape[1] > size
+        else cv2.INTER_LINEAR
+    )
+
+    lut = _dicom_lut(header, pixels)
+    if lut is None:
+        # dtype poco común (p. ej. 32 bits): camino float sobre el array reducido
+        small = cv2.resize(pixels.astype(np.float32), (size, size), interpolation=interpolation)
+        small *= header.slope
+        small += header.intercept
+        hi = float(small.max())
+        np.maximum(small, 0, out=small)
+        if hi > 0:
+            small *= 255.0 / hi
+        gray = small.astype(np.uint8)
+        img_pil = Image.fromarray(gray) if preview else None
+        return gray, img_pil
+
+    small = cv2.resize(pixels, (size, size), interpolation=interpolation)
+    gray = _apply_lut(lut, small)
+
+    img_pil = Image.fromarray(_apply_lut(lut, pixels)) if preview else None
+
+    return gray, img_pil
+
+
+def read_dicom_image(source: ImageSource) -> Tuple[np.ndarray, Image.Image]:
     """
     Lee una imagen DICOM y retorna un array RGB (numpy) y una imagen PIL.
 
     Args:
-        file_path: Ruta al archivo .dcm
+        source: Ruta al archivo .dcm, sus bytes o un stream binario.
 
     Returns:
         img_rgb: Imagen en RGB (H, W, 3) uint8
         img_pil: Imagen PIL para visualización
     """
-    ds = pydicom.dcmread(file_path)
-    img_array = ds.pixel_array.astype(np.float32)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    ds = pydicom.dcmread(source)
+    img_array = ds.pixel_array
+    if int(ds.get("NumberOfFrames", 1) or 1) > 1:
+        # Multi-frame: (frames, H, W); se muestra el primero
+        img_array = img_array[0]
+    img_array = img_array.astype(np.float32)
 
     # Normalizar a 0-255 para visualización
     max_val = float(img_array.max()) if img_array.size else 0.0
@@ -39,22 +356,99 @@ def read_dicom_image(file_path: str) -> Tuple[np.ndarray, Image.Image]:
     return img_rgb, img_pil
 
 
-def read_image_file(file_path: str) -> Tuple[np.ndarray, Image.Image]:
+def read_image_file(source: ImageSource) -> Tuple[np.ndarray, Image.Image]:
     """
     Lee una imagen genérica (jpg/jpeg/png) y retorna array y PIL.
 
     Args:
-        file_path: Ruta al archivo
+        source: Ruta al archivo, sus bytes o un stream binario.
 
     Returns:
         img_rgb: Imagen en RGB (H, W, 3) uint8
         img_pil: Imagen PIL
     """
-    img_bgr = cv2.imread(file_path)
+    if isinstance(source, (str, os.PathLike)):
+        img_bgr = cv2.imread(os.fspath(source))
+    else:
+        # Decodifica directo desde memoria, sin copiar el buffer
+        data = source if isinstance(source, (bytes, bytearray, memoryview)) else source.read()
+        img_bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
     if img_bgr is None:
-        raise ValueError(f"No se pudo leer la imagen: {file_path}")
+        name = source if isinstance(source, (str, os.PathLike)) else "<memoria>"
+        raise ValueError(f"No se pudo leer la imagen: {name}")
 
     img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
     img_pil = Image.fromarray(img_rgb)
 
     return img_rgb, img_pil
+
+
+# Factores de reducción que el decodificador JPEG aplica en el dominio DCT
+_REDUCED_GRAYSCALE = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def reduced_decode_flag(height: int, width: int, size: int = 512) -> int:
+    """
+    Mayor factor IMREAD_REDUCED_GRAYSCALE_{2,4,8} que deja al menos `size`
+    px en el lado menor; IMREAD_GRAYSCALE si ninguno alcanza.
+    """
+    for factor, flag in _REDUCED_GRAYSCALE:
+        if min(height, width) // factor >= size:
+            return flag
+    return cv2.IMREAD_GRAYSCALE
+
+
+def read_image_file_fast(
+    source: ImageSource,
+    size: int = 512,
+    preview: bool = False,
+) -> Tuple[np.ndarray, Optional[Image.Image]]:
+    """
+    Decodificación reducida de jpg/jpeg/png directo a un canal.
+
+    Lee solo la cabecera para conocer el tamaño, decodifica con el mayor
+    factor de reducción que conserve al menos `size` px y redimensiona a
+    (size, size). La imagen a resolución completa solo se construye si se
+    pide `preview`.
+
+    Args:
+        source: Ruta al archivo, sus bytes o un stream binario.
+        size: Lado de la resolución de trabajo.
+        preview: Construir también la imagen PIL RGB a resolución completa.
+
+    Returns:
+        gray: (size, size) uint8.
+        img_pil: Imagen PIL (o None).
+    """
+    name = source if isinstance(source, (str, os.PathLike)) else "<memoria>"
+    data = load_bytes(source)
+
+    # PIL solo parsea la cabecera hasta que se piden los píxeles
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            width, height = header.size
+    except (UnidentifiedImageError, OSError):
+        raise ValueError(f"No se pudo leer la imagen: {name}") from None
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    gray = cv2.imdecode(buf, reduced_decode_flag(height, width, size))
+    if gray is None:
+        raise ValueError(f"No se pudo leer la imagen: {name}")
+
+    interpolation = (
+        cv2.INTER_AREA
+        if gray.shape[0] > size or gray.shape[1] > size
+        else cv2.INTER_LINEAR
+    )
+    gray = cv2.resize(gray, (size, size), interpolation=interpolation)
+
+    img_pil = None
+    if preview:
+        img_bgr = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        img_pil = Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
+
+    return gray, img_pil
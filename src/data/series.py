@@ -0,0 +1,124 @@
+"""
+Estudios DICOM: varios archivos (vistas de una serie) y objetos
+multi-frame agrupados por StudyInstanceUID.
+
+Agrupar solo lee cabeceras (`stop_before_pixels`); los píxeles se
+decodifican después, frame a frame y de forma perezosa, en el orden de la
+serie (SeriesInstanceUID, InstanceNumber, frame).
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from pydicom.errors import InvalidDicomError
+
+from src.data.image import GrayImage
+from src.data.read_img import (
+    DicomHeader,
+    ImageSource,
+    iter_dicom_frames,
+    load_bytes,
+    read_dicom_header,
+    sniff_format,
+)
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    # Nombre del archivo dentro del estudio (ruta o nombre subido)
+    name: str
+    frame: int
+    study_uid: str
+    series_uid: Optional[str] = None
+    instance_number: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"name": self.name, "frame": self.frame, "series_uid": self.series_uid,
+                "instance_number": self.instance_number}
+
+
+def find_dicom_files(roots: Iterable[str]) -> Dict[str, str]:
+    """
+    Archivos .dcm bajo las rutas dadas (recursivo), como {ruta: ruta} para
+    usarlos con `group_studies`.
+    """
+    found = {}
+    for root in roots:
+        path = Path(root)
+        candidates = [path] if path.is_file() else sorted(path.rglob("*"))
+        for p in candidates:
+            if p.is_file() and p.suffix.lower() == ".dcm":
+                name = os.path.normpath(str(p))
+                found[name] = name
+    return found
+
+
+def _header(source: ImageSource) -> Optional[DicomHeader]:
+    if not isinstance(source, (str, os.PathLike)):
+        source = load_bytes(source)
+        if sniff_format(source) != "dicom":
+            return None
+    try:
+        return read_dicom_header(source)
+    except (InvalidDicomError, AttributeError, ValueError):
+        return None
+
+
+def group_studies(sources: Mapping[str, ImageSource]) -> Dict[str, List[FrameRef]]:
+    """
+    Agrupa los frames de varios DICOM por StudyInstanceUID, leyendo solo
+    las cabeceras. Los archivos sin StudyInstanceUID forman su propio
+    estudio (con su nombre como clave) y los que no son DICOM se omiten.
+
+    Args:
+        sources: {nombre: ruta o bytes}.
+
+    Returns:
+        {study_uid: [FrameRef, ...]} en el orden de la serie.
+    """
+    studies: Dict[str, List[FrameRef]] = {}
+    for name, source in sources.items():
+        header = _header(source)
+        if header is None:
+            continue
+        study = header.study_uid or name
+        studies.setdefault(study, []).extend(
+            FrameRef(name, i, study, header.series_uid, header.instance_number)
+            for i in range(header.frames)
+        )
+    for refs in studies.values():
+        refs.sort(key=lambda r: (r.series_uid or "", r.instance_number or 0, r.name, r.frame))
+    return studies
+
+
+def iter_study_frames(
+    refs: Iterable[FrameRef],
+    sources: Mapping[str, ImageSource],
+    size: int = 512,
+) -> Iterator[Tuple[FrameRef, GrayImage]]:
+    """
+    Frames de un estudio ya decodificados a (size, size), uno a la vez.
+    Cada archivo se abre una sola vez para todos sus frames consecutivos.
+    """
+    pending: List[FrameRef] = []
+    for ref in refs:
+        if pending and pending[-1].name != ref.name:
+            yield from _decode(pending, sources, size)
+            pending = []
+        pending.append(ref)
+    if pending:
+        yield from _decode(pending, sources, size)
+
+
+def _decode(
+    refs: List[FrameRef],
+    sources: Mapping[str, ImageSource],
+    size: int,
+) -> Iterator[Tuple[FrameRef, GrayImage]]:
+    frames = iter_dicom_frames(sources[refs[0].name], size=size, frames=[r.frame for r in refs])
+    for ref, (_, gray) in zip(refs, frames):
+        yield ref, GrayImage(gray)
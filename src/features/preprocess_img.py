@@ -1,36 +1,135 @@
 """
-Preprocesamiento: resize, gray, CLAHE, normalización, batch.
+Preprocesamiento: gray, resize, CLAHE, normalización, batch.
 """
 
 from __future__ import annotations
 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Union
+
 import numpy as np
 import cv2
 
+from src.app.metrics import timed
+from src.data.image import GrayImage
+
+_local = threading.local()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Hilos del pool de preprocesamiento por lotes (ver `set_workers`)
+_workers = os.cpu_count() or 1
+
+
+def _get_clahe():
+    """CLAHE reutilizable, uno por hilo (los objetos de OpenCV no son thread-safe)."""
+    clahe = getattr(_local, "clahe", None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4))
+        _local.clahe = clahe
+    return clahe
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_workers,
+                    thread_name_prefix="preprocess",
+                )
+    return _executor
+
+
+def set_workers(workers: int) -> None:
+    """
+    Fija los hilos del pool de `preprocess_batch` (presupuesto de hilos del
+    proceso). Un pool ya creado con otro tamaño se reemplaza.
+    """
+    global _executor, _workers
+    workers = max(1, int(workers))
+    with _executor_lock:
+        if _executor is not None and workers != _workers:
+            _executor.shutdown(wait=False)
+            _executor = None
+        _workers = workers
+
+
+def _preprocess_into(image: Union[np.ndarray, GrayImage], out: np.ndarray) -> None:
+    """
+    Preprocesa una imagen escribiendo el resultado normalizado en `out`
+    (vista (512,512) float32 del buffer del lote).
+    """
+    img = image.pixels if isinstance(image, GrayImage) else image
+
+    # Gris antes de redimensionar: 1/3 de los datos a interpolar
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    if img.shape[:2] != (512, 512):
+        img = cv2.resize(img, (512, 512))
+
+    eq = _get_clahe().apply(img.astype(np.uint8, copy=False))
+
+    np.divide(eq, np.float32(255.0), out=out)
 
-def preprocess_image(image_rgb: np.ndarray) -> np.ndarray:
+
+@timed("preprocess")
+def preprocess_image(image_rgb: Union[np.ndarray, GrayImage]) -> np.ndarray:
     """
     Preprocesa imagen a (1, 512, 512, 1) normalizada.
 
     Args:
-        image_rgb: np.ndarray (H,W,3) o (H,W)
+        image_rgb: np.ndarray (H,W,3) o (H,W), o GrayImage
 
     Returns:
         np.ndarray: batch (1,512,512,1)
     """
-    img = cv2.resize(image_rgb, (512, 512))
+    batch = np.empty((1, 512, 512, 1), dtype=np.float32)
+    _preprocess_into(image_rgb, batch[0, :, :, 0])
+    return batch
 
-    if img.ndim == 3:
-        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = img
 
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4))
-    eq = clahe.apply(gray.astype(np.uint8))
+@timed("preprocess_batch")
+def preprocess_batch(
+    images: Sequence[Union[np.ndarray, GrayImage]],
+    out: Optional[np.ndarray] = None,
+    workers: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Preprocesa N imágenes en paralelo a un lote (N, 512, 512, 1).
+
+    Las llamadas de OpenCV liberan el GIL, así que un pool de hilos escala
+    con los núcleos. Cada imagen se escribe directo en su posición del
+    buffer, sin arrays intermedios por imagen.
+
+    Args:
+        images: Imágenes (H,W,3), (H,W) o GrayImage.
+        out: Buffer float32 (>=N, 512, 512, 1) a reutilizar (opcional).
+        workers: Hilos a usar (None = todos los núcleos, 1 = en serie).
+
+    Returns:
+        np.ndarray: batch (N,512,512,1) float32 (vista de `out` si se pasó).
+    """
+    n = len(images)
+    if out is None:
+        out = np.empty((n, 512, 512, 1), dtype=np.float32)
+    elif out.shape[0] < n or out.shape[1:] != (512, 512, 1) or out.dtype != np.float32:
+        raise ValueError(f"Buffer de salida inválido: {out.shape} {out.dtype}")
+    batch = out[:n]
 
-    eq = eq.astype(np.float32) / 255.0
+    if n <= 1 or workers == 1:
+        for i, image in enumerate(images):
+            _preprocess_into(image, batch[i, :, :, 0])
+        return batch
 
-    batch = np.expand_dims(eq, axis=-1)
-    batch = np.expand_dims(batch, axis=0)
+    executor = _get_executor() if workers is None else ThreadPoolExecutor(max_workers=workers)
+    try:
+        # list() propaga la primera excepción de los hilos
+        list(executor.map(lambda i: _preprocess_into(images[i], batch[i, :, :, 0]), range(n)))
+    finally:
+        if workers is not None:
+            executor.shutdown(wait=True)
 
     return batch
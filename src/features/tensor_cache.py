@@ -0,0 +1,238 @@
+"""
+Caché en disco de tensores ya preprocesados (salida de `preprocess_image`).
+
+Los tensores (512,512,1) float32 se guardan en shards `.npy` que se abren
+con memoria mapeada, más un manifiesto JSON con la ruta de origen, su
+mtime/tamaño, la etiqueta (del nombre de la carpeta) y la posición en su
+shard. Una segunda pasada no decodifica ni aplica CLAHE: los lotes son
+vistas contiguas del shard que van directo al modelo. Solo se
+reprocesan los archivos nuevos o modificados, que van a shards nuevos; los
+shards que ya nadie referencia se borran. Si cambia el código de
+lectura o de preprocesamiento, la caché entera se invalida.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.data import image, read_img
+from src.data.read_img import read_gray
+from src.features import preprocess_img
+from src.features.preprocess_img import preprocess_batch
+
+MANIFEST = "manifest.json"
+TENSOR_SHAPE = (512, 512, 1)
+# Módulos que determinan los píxeles de un tensor (decodificación y preproceso)
+_PIXEL_MODULES = (read_img, image, preprocess_img)
+
+
+def preprocess_fingerprint() -> str:
+    """Hash del código de lectura y preprocesamiento: otro código, otros tensores."""
+    h = hashlib.sha256()
+    for module in _PIXEL_MODULES:
+        h.update(Path(module.__file__).read_bytes())
+    return h.hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    path: str
+    mtime_ns: int
+    size: int
+    label: Optional[str]
+    shard: str
+    index: int
+
+
+class TensorCache:
+    def __init__(self, cache_dir: Union[str, Path], shard_size: int = 256) -> None:
+        """
+        Args:
+            cache_dir: Carpeta de los shards y el manifiesto.
+            shard_size: Tensores máximos por shard (1 MB cada uno).
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_size = int(shard_size)
+        self.fingerprint = preprocess_fingerprint()
+        self.entries: Dict[str, CacheEntry] = {}
+        self._shards: Dict[str, np.ndarray] = {}
+        self.last_build: Dict[str, object] = {}
+        self._load_manifest()
+
+    def _load_manifest(self) -> None:
+        try:
+            manifest = json.loads((self.cache_dir / MANIFEST).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if manifest.get("fingerprint") != self.fingerprint:
+            return  # preprocesamiento distinto: todo se reconstruye
+        self.entries = {
+            e["path"]: CacheEntry(**e)
+            for e in manifest.get("entries", [])
+            if (self.cache_dir / e["shard"]).exists()
+        }
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "fingerprint": self.fingerprint,
+            "shape": list(TENSOR_SHAPE),
+            "dtype": "float32",
+            "entries": [vars(e) for e in sorted(self.entries.values(), key=lambda e: e.path)],
+        }
+        path = self.cache_dir / MANIFEST
+        tmp = path.with_name(f"{MANIFEST}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def is_fresh(self, path: str) -> bool:
+        entry = self.entries.get(path)
+        if entry is None:
+            return False
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size
+
+    def build(
+        self,
+        paths: Sequence[str],
+        label_fn=None,
+        batch_size: int = 16,
+    ) -> Dict[str, object]:
+        """
+        Asegura que todos los `paths` estén en caché, procesando solo los
+        nuevos o modificados. Las entradas de rutas que ya no se piden se
+        conservan (otra evaluación puede usarlas).
+
+        Args:
+            paths: Imágenes de origen.
+            label_fn: ruta -> etiqueta esperada (o None).
+            batch_size: Imágenes decodificadas a la vez.
+
+        Returns:
+            dict con cuántos tensores se reutilizaron y cuántos se procesaron.
+        """
+        started = time.perf_counter()
+        stale = [p for p in paths if not self.is_fresh(p)]
+        errors: Dict[str, str] = {}
+        shard_name, shard, filled = None, None, 0
+
+        for start in range(0, len(stale), batch_size):
+            chunk, images = [], []
+            for path in stale[start:start + batch_size]:
+                try:
+                    images.append(read_gray(path))
+                except Exception as exc:  # noqa: BLE001 - se reporta y se sigue
+                    errors[path] = f"{type(exc).__name__}: {exc}"
+                    continue
+                chunk.append(path)
+
+            offset = 0
+            while offset < len(chunk):
+                if shard is None or filled == len(shard):
+                    if shard is not None:
+                        shard.flush()
+                    remaining = len(stale) - start - offset
+                    shard_name, shard = self._new_shard(min(self.shard_size, remaining))
+                    filled = 0
+                n = min(len(chunk) - offset, len(shard) - filled)
+                # El preproceso escribe directo en el archivo mapeado
+                preprocess_batch(images[offset:offset + n], out=shard[filled:filled + n])
+                for i, path in enumerate(chunk[offset:offset + n]):
+                    st = os.stat(path)
+                    self.entries[path] = CacheEntry(
+                        path=path,
+                        mtime_ns=st.st_mtime_ns,
+                        size=st.st_size,
+                        label=label_fn(path) if label_fn else None,
+                        shard=shard_name,
+                        index=filled + i,
+                    )
+                filled += n
+                offset += n
+
+        if shard is not None:
+            shard.flush()
+            del shard
+        removed = self._drop_unreferenced()
+        if stale or removed:
+            self._save_manifest()
+        self._shards.clear()
+
+        self.last_build = {
+            "reused": len(paths) - len(stale),
+            "processed": len(stale) - len(errors),
+            "errors": errors,
+            "shards_removed": removed,
+            "build_s": round(time.perf_counter() - started, 3),
+        }
+        return self.last_build
+
+    def _new_shard(self, rows: int) -> Tuple[str, np.ndarray]:
+        name = f"shard-{time.time_ns():x}.npy"
+        shard = np.lib.format.open_memmap(
+            self.cache_dir / name, mode="w+", dtype=np.float32, shape=(rows, *TENSOR_SHAPE)
+        )
+        return name, shard
+
+    def _drop_unreferenced(self) -> int:
+        used = {e.shard for e in self.entries.values()}
+        removed = 0
+        for path in self.cache_dir.glob("shard-*.npy"):
+            if path.name not in used:
+                path.unlink()
+                removed += 1
+        return removed
+
+    def shard(self, name: str) -> np.ndarray:
+        """Shard completo con memoria mapeada (solo lectura)."""
+        array = self._shards.get(name)
+        if array is None:
+            array = self._shards[name] = np.load(self.cache_dir / name, mmap_mode="r")
+        return array
+
+    def iter_batches(
+        self,
+        paths: Sequence[str],
+        batch_size: int = 16,
+    ) -> Iterator[Tuple[List[CacheEntry], np.ndarray]]:
+        """
+        Lotes (entradas, tensores (n,512,512,1)) de las rutas en caché.
+        Se recorren en el orden de los shards, así que cada lote es una
+        vista contigua del archivo mapeado (sin copias) salvo donde una
+        ruta se reprocesó y vive en otro shard.
+        """
+        entries = sorted(
+            (self.entries[p] for p in paths if p in self.entries),
+            key=lambda e: (e.shard, e.index),
+        )
+        run: List[CacheEntry] = []
+        for entry in entries + [None]:
+            contiguous = (
+                entry is not None and run and len(run) < batch_size
+                and entry.shard == run[-1].shard and entry.index == run[-1].index + 1
+            )
+            if run and not contiguous:
+                yield run, self.shard(run[0].shard)[run[0].index:run[-1].index + 1]
+                run = []
+            if entry is not None:
+                run.append(entry)
+
+    def stats(self) -> Dict[str, object]:
+        shards = list(self.cache_dir.glob("shard-*.npy"))
+        return {
+            "entries": len(self.entries),
+            "shards": len(shards),
+            "bytes": sum(p.stat().st_size for p in shards),
+            "fingerprint": self.fingerprint,
+        }
@@ -0,0 +1,154 @@
+"""
+Motor de inferencia compilado: forward y Grad-CAM envueltos en
+`tf.function` con firma fija (None,512,512,1) y XLA opcional.
+
+Los lotes se rellenan hasta un conjunto pequeño de tamaños ("buckets") para
+que las trazas / compilaciones XLA se reutilicen en lugar de repetirse con
+cada tamaño de lote nuevo.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, Sequence, Set, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from src.visualizations.grad_cam import build_grad_model
+
+DEFAULT_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+_INPUT_SPEC = tf.TensorSpec(shape=(None, 512, 512, 1), dtype=tf.float32)
+
+
+class CompiledEngine:
+    def __init__(
+        self,
+        model,
+        layer_name: str = "conv10_thisone",
+        buckets: Sequence[int] = DEFAULT_BUCKETS,
+        jit_compile: bool = False,
+    ) -> None:
+        """
+        Args:
+            model: Modelo Keras.
+            layer_name: Capa conv objetivo de Grad-CAM.
+            buckets: Tamaños de lote a los que se rellena cada llamada.
+            jit_compile: Compilar con XLA.
+        """
+        self.model = model
+        self.layer_name = layer_name
+        self.buckets = tuple(sorted(set(int(b) for b in buckets)))
+        self.jit_compile = bool(jit_compile)
+        self.grad_model = build_grad_model(model, layer_name)
+
+        self._lock = threading.Lock()
+        self._traces = {"forward": 0, "gradcam": 0}
+        self._calls = {"forward": 0, "gradcam": 0}
+        self._shapes: Dict[str, Set[int]] = {"forward": set(), "gradcam": set()}
+
+        self._forward = tf.function(
+            self._forward_impl, input_signature=[_INPUT_SPEC], jit_compile=self.jit_compile
+        )
+        self._gradcam = tf.function(
+            self._gradcam_impl, input_signature=[_INPUT_SPEC], jit_compile=self.jit_compile
+        )
+
+    def _forward_impl(self, x):
+        # Solo corre al trazar: cuenta trazas, no llamadas
+        self._traces["forward"] += 1
+        out = self.model(x, training=False)
+        if isinstance(out, (list, tuple)):
+            out = out[0]
+        return out
+
+    def _gradcam_impl(self, x):
+        self._traces["gradcam"] += 1
+        with tf.GradientTape() as tape:
+            conv_out, out = self.grad_model(x, training=False)
+            if isinstance(out, (list, tuple)):
+                out = out[0]
+            idx = tf.argmax(out, axis=1, output_type=tf.int32)
+            loss = tf.reduce_sum(tf.gather(out, idx[:, None], axis=1, batch_dims=1))
+
+        grads = tape.gradient(loss, conv_out)
+        weights = tf.reduce_mean(grads, axis=(1, 2))
+        cams = tf.einsum("nhwc,nc->nhw", conv_out, weights)
+        return out, cams
+
+    def bucket_for(self, n: int) -> int:
+        """Menor bucket >= n (o el mayor, si n lo supera)."""
+        for b in self.buckets:
+            if b >= n:
+                return b
+        return self.buckets[-1]
+
+    def _chunks(self, batch: np.ndarray):
+        """Trozos rellenados con ceros al tamaño de su bucket: (padded, n)."""
+        step = self.buckets[-1]
+        for start in range(0, batch.shape[0], step):
+            chunk = batch[start:start + step]
+            n = chunk.shape[0]
+            size = self.bucket_for(n)
+            if size != n:
+                padded = np.zeros((size,) + chunk.shape[1:], dtype=np.float32)
+                padded[:n] = chunk
+                chunk = padded
+            yield np.asarray(chunk, dtype=np.float32), n
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        """Forward compilado sobre (N,512,512,1). Retorna (N, num_classes)."""
+        outs = []
+        for chunk, n in self._chunks(batch):
+            self._count("forward", chunk.shape[0])
+            outs.append(self._forward(chunk).numpy()[:n])
+        return np.concatenate(outs, axis=0)
+
+    def infer_with_cam(self, batch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Predicción + CAM crudo compilados. Retorna (preds, cams)."""
+        preds, cams = [], []
+        for chunk, n in self._chunks(batch):
+            self._count("gradcam", chunk.shape[0])
+            p, c = self._gradcam(chunk)
+            preds.append(p.numpy()[:n])
+            cams.append(c.numpy()[:n])
+        return np.concatenate(preds, axis=0), np.concatenate(cams, axis=0).astype(np.float32)
+
+    def check_parity(self, batch: np.ndarray, atol: float = 1e-4) -> Dict[str, object]:
+        """
+        Compara el motor compilado con el camino eager sobre `batch`.
+
+        Returns:
+            dict con las diferencias máximas y `ok` si están dentro de `atol`
+            (los CAM se comparan normalizados por su máximo).
+        """
+        from src.visualizations.grad_cam import gradcam_forward_batch
+
+        eager_preds, eager_cams = gradcam_forward_batch(self.grad_model, batch)
+        preds, cams = self.infer_with_cam(batch)
+        forward = self.infer(batch)
+
+        scale = np.maximum(np.abs(eager_cams).max(axis=(1, 2), keepdims=True), 1e-12)
+        diffs = {
+            "forward_max_abs": float(np.abs(forward - eager_preds).max()),
+            "preds_max_abs": float(np.abs(preds - eager_preds).max()),
+            "cams_max_rel": float((np.abs(cams - eager_cams) / scale).max()),
+        }
+        return {**diffs, "ok": all(v <= atol for v in diffs.values())}
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "jit_compile": self.jit_compile,
+                "buckets": list(self.buckets),
+                "traces": dict(self._traces),
+                "calls": dict(self._calls),
+                # Con XLA, cada forma de entrada distinta es una compilación
+                "compiled_batch_sizes": {k: sorted(v) for k, v in self._shapes.items()},
+            }
+
+    def _count(self, name: str, size: int) -> None:
+        with self._lock:
+            self._calls[name] += 1
+            self._shapes[name].add(size)
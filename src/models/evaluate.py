@@ -0,0 +1,86 @@
+"""
+Evaluación offline sobre carpetas etiquetadas (p. ej. data/raw).
+
+Los tensores preprocesados salen de la caché de shards (`TensorCache`), así
+que repetir la evaluación con otros pesos o backend solo paga el forward.
+Reporta exactitud, matriz de confusión sobre `LABELS` e imágenes por
+segundo del forward.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+
+from src.features.tensor_cache import TensorCache
+from src.models.tflite_backend import label_from_path
+
+
+def evaluate(
+    predict: Callable[[np.ndarray], np.ndarray],
+    paths: Sequence[str],
+    labels: Dict[int, str],
+    cache: TensorCache,
+    batch_size: int = 16,
+) -> Dict[str, object]:
+    """
+    Evalúa `predict` (lote -> probabilidades) sobre `paths`.
+
+    La etiqueta real sale de la carpeta o del prefijo del archivo; las
+    imágenes sin etiqueta se predicen pero no cuentan en la exactitud.
+
+    Returns:
+        dict con images, labelled, accuracy, confusion (real -> predicha ->
+        n), per_class (recall por clase), images_per_sec y cache.
+    """
+    build = cache.build(paths, label_fn=label_from_path, batch_size=batch_size)
+
+    names = [labels[i] for i in sorted(labels)]
+    confusion = {truth: {pred: 0 for pred in names} for truth in names}
+    images = labelled = correct = 0
+    forward_s = 0.0
+    mistakes = []
+
+    for entries, batch in cache.iter_batches(paths, batch_size=batch_size):
+        t0 = time.perf_counter()
+        preds = np.asarray(predict(batch))
+        forward_s += time.perf_counter() - t0
+        for entry, p in zip(entries, preds):
+            images += 1
+            predicted = labels[int(np.argmax(p))]
+            if entry.label is None or entry.label not in confusion:
+                continue
+            labelled += 1
+            confusion[entry.label][predicted] += 1
+            if predicted == entry.label:
+                correct += 1
+            else:
+                mistakes.append({"path": entry.path, "label": entry.label, "predicted": predicted})
+
+    per_class = {}
+    for name in names:
+        total = sum(confusion[name].values())
+        per_class[name] = round(confusion[name][name] / total, 4) if total else None
+
+    return {
+        "images": images,
+        "labelled": labelled,
+        "accuracy": round(correct / labelled, 4) if labelled else None,
+        "confusion": confusion,
+        "per_class": per_class,
+        "images_per_sec": round(images / forward_s, 2) if forward_s else None,
+        "mistakes": mistakes,
+        "cache": {**build, **cache.stats()},
+    }
+
+
+def format_confusion(confusion: Dict[str, Dict[str, int]]) -> str:
+    """Matriz de confusión como tabla de texto (filas: real, columnas: predicha)."""
+    names = list(confusion)
+    width = max(len(n) for n in names) + 2
+    lines = ["real \\ pred".ljust(width) + "".join(n.rjust(width) for n in names)]
+    for truth in names:
+        lines.append(truth.ljust(width) + "".join(str(confusion[truth][p]).rjust(width) for p in names))
+    return "\n".join(lines)
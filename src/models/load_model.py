@@ -4,15 +4,34 @@ Carga del modelo Keras.
 
 from __future__ import annotations
 
-import os; from tensorflow.keras.models import load_model # type: ignore
+import logging
+import os
+from pathlib import Path
+from typing import Optional
 
+logger = logging.getLogger(__name__)
 
-def load_pneumonia_model(model_path: str = "models/conv_MLP_84.h5"):
+
+def converted_artifact_path(model_path: str, content_hash: str) -> str:
+    """
+    Ruta del artefacto `.keras` convertido, junto al `.h5` y atado a su
+    contenido: si el `.h5` cambia, el hash cambia y se genera uno nuevo.
+    """
+    path = Path(model_path)
+    return str(path.with_name(f"{path.stem}.{content_hash[:12]}.keras"))
+
+
+def load_pneumonia_model(model_path: str = "models/conv_MLP_84.h5", content_hash: Optional[str] = None):
     """
     Carga el modelo desde un archivo .h5.
 
+    Con `content_hash`, la primera carga guarda además una copia en formato
+    `.keras` junto al `.h5`, y las siguientes la usan en lugar de
+    deserializar el HDF5.
+
     Args:
         model_path: Ruta del modelo.
+        content_hash: Hash del contenido del .h5 (activa el artefacto convertido).
 
     Returns:
         Modelo Keras.
@@ -23,5 +42,31 @@ def load_pneumonia_model(model_path: str = "models/conv_MLP_84.h5"):
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Modelo no encontrado en: {model_path}")
 
-    return load_model(model_path, compile=False)
+    # Import diferido: TensorFlow solo se carga cuando de verdad se necesita
+    from tensorflow.keras.models import load_model  # type: ignore
+
+    if content_hash is None or not model_path.endswith(".h5"):
+        return load_model(model_path, compile=False)
+
+    artifact = converted_artifact_path(model_path, content_hash)
+    if os.path.exists(artifact):
+        try:
+            return load_model(artifact, compile=False)
+        except Exception:  # noqa: BLE001 - artefacto corrupto: se regenera
+            logger.warning("Artefacto convertido inválido, se regenera: %s", artifact)
+
+    model = load_model(model_path, compile=False)
+    _save_converted(model, artifact)
+    return model
+
 
+def _save_converted(model, artifact: str) -> None:
+    # Escritura atómica: otro proceso nunca ve un .keras a medio escribir
+    tmp = f"{artifact[:-len('.keras')]}.tmp{os.getpid()}.keras"
+    try:
+        model.save(tmp)
+        os.replace(tmp, artifact)
+    except Exception as exc:  # noqa: BLE001 - la conversión es opcional
+        logger.warning("No se pudo guardar el artefacto convertido %s: %s", artifact, exc)
+        if os.path.exists(tmp):
+            os.remove(tmp)
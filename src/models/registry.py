@@ -0,0 +1,218 @@
+"""
+Registro de modelos del proceso.
+
+Cada archivo de pesos se carga una sola vez por proceso (clave: ruta, mtime
+y hash del contenido) y se comparte entre todos los detectores. Un "slot"
+(la ruta configurada del modelo) puede apuntar atómicamente a otros pesos
+sin reiniciar el servidor: las peticiones en curso terminan con el modelo
+que ya tenían y las nuevas usan el nuevo.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from src.models.load_model import load_pneumonia_model
+
+
+@dataclass(frozen=True)
+class ModelEntry:
+    model: object
+    path: str
+    mtime_ns: int
+    sha256: str
+    loaded_at: float
+    load_ms: float
+
+    @property
+    def identity(self) -> str:
+        """Identidad del contenido (para claves de caché de resultados)."""
+        return f"{self.path}:{self.sha256}"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        loader: Callable[..., object] = load_pneumonia_model,
+        convert: bool = True,
+    ) -> None:
+        """
+        Args:
+            loader: Función de carga `loader(path, content_hash=...)`.
+            convert: Guardar/usar el artefacto `.keras` convertido.
+        """
+        self.loader = loader
+        self.convert = convert
+
+        self._lock = threading.Lock()
+        # slot (ruta configurada) -> entrada vigente
+        self._slots: Dict[str, ModelEntry] = {}
+        # (ruta, mtime, hash) -> entrada ya cargada
+        self._loaded: Dict[Tuple[str, int, str], ModelEntry] = {}
+        # (ruta, tamaño, mtime) -> hash, para no releer el archivo
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.swaps = 0
+
+    def peek(self, slot: str) -> Optional[ModelEntry]:
+        """Entrada vigente del slot, sin cargar nada."""
+        return self._slots.get(os.path.abspath(slot))
+
+    def entry(self, slot: str) -> ModelEntry:
+        """Entrada vigente del slot; la carga la primera vez."""
+        key = os.path.abspath(slot)
+        current = self._slots.get(key)
+        if current is not None:
+            return current
+
+        with self._slot_lock(key):
+            current = self._slots.get(key)
+            if current is None:
+                current = self.load(key)
+                with self._lock:
+                    self._slots.setdefault(key, current)
+                    current = self._slots[key]
+        return current
+
+    def get(self, slot: str):
+        """Modelo vigente del slot (cargado una sola vez por proceso)."""
+        return self.entry(slot).model
+
+    def prefetch(self, path: str) -> str:
+        """
+        Lee el archivo de pesos y recuerda su hash sin cargar el modelo (ni
+        iniciar TensorFlow). Los procesos creados con fork después heredan
+        el hash y el archivo queda en la caché de páginas.
+        """
+        path = os.path.abspath(path)
+        return self._hash(path, os.stat(path))
+
+    def load(self, path: str) -> ModelEntry:
+        """
+        Carga (o reutiliza) los pesos de `path`, identificados por ruta,
+        mtime y hash del contenido.
+        """
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Modelo no encontrado en: {path}")
+
+        st = os.stat(path)
+        sha = self._hash(path, st)
+        key = (path, st.st_mtime_ns, sha)
+
+        with self._slot_lock(f"load:{path}"):
+            cached = self._loaded.get(key)
+            if cached is not None:
+                return cached
+
+            t0 = time.perf_counter()
+            kwargs = {"content_hash": sha} if self.convert else {}
+            model = self.loader(path, **kwargs)
+            entry = ModelEntry(
+                model=model,
+                path=path,
+                mtime_ns=st.st_mtime_ns,
+                sha256=sha,
+                loaded_at=time.time(),
+                load_ms=(time.perf_counter() - t0) * 1000.0,
+            )
+            with self._lock:
+                self._loaded[key] = entry
+                self.loads += 1
+        return entry
+
+    def swap(self, slot: str, new_path: Optional[str] = None) -> ModelEntry:
+        """
+        Apunta el slot a otros pesos (o recarga los suyos si cambiaron).
+
+        La carga ocurre fuera del lock; el reemplazo es una sola asignación,
+        así que ninguna petición ve un modelo a medio cargar.
+        """
+        key = os.path.abspath(slot)
+        entry = self.load(new_path or key)
+        with self._lock:
+            old = self._slots.get(key)
+            self._slots[key] = entry
+            if old is not entry:
+                self.swaps += 1
+                self._forget(old)
+        return entry
+
+    def reload_if_changed(self, slot: str) -> bool:
+        """Recarga el slot si el archivo en disco cambió (mtime/hash)."""
+        current = self.peek(slot)
+        if current is None:
+            return False
+        try:
+            st = os.stat(current.path)
+        except OSError:
+            return False
+        if st.st_mtime_ns == current.mtime_ns:
+            return False
+        return self.swap(slot, current.path) is not current
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "swaps": self.swaps,
+                "slots": {
+                    slot: {
+                        "path": e.path,
+                        "sha256": e.sha256,
+                        "mtime_ns": e.mtime_ns,
+                        "load_ms": round(e.load_ms, 2),
+                    }
+                    for slot, e in self._slots.items()
+                },
+            }
+
+    def _forget(self, old: Optional[ModelEntry]) -> None:
+        # Requiere self._lock. Libera la entrada si ya ningún slot la usa
+        if old is None or any(e is old for e in self._slots.values()):
+            return
+        self._loaded.pop((old.path, old.mtime_ns, old.sha256), None)
+
+    def _hash(self, path: str, st: os.stat_result) -> str:
+        key = (path, st.st_size, st.st_mtime_ns)
+        sha = self._hashes.get(key)
+        if sha is None:
+            sha = file_sha256(path)
+            with self._lock:
+                self._hashes[key] = sha
+        return sha
+
+    def _slot_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._load_locks.get(key)
+            if lock is None:
+                lock = self._load_locks[key] = threading.Lock()
+            return lock
+
+
+_default_registry: Optional[ModelRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Registro compartido por todo el proceso."""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = ModelRegistry()
+    return _default_registry
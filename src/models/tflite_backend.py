@@ -0,0 +1,263 @@
+"""
+Backend de inferencia TFLite (float16 / int8 post-entrenamiento) para CPU.
+
+Solo cubre el forward: TFLite no graba gradientes, así que Grad-CAM sigue
+corriendo sobre el grafo Keras del detector.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("float16", "int8")
+
+# Nombre de carpeta / prefijo de archivo -> etiqueta del modelo
+_LABEL_ALIASES = {
+    "bacteria": "bacteriana",
+    "bacteriana": "bacteriana",
+    "normal": "normal",
+    "virus": "viral",
+    "viral": "viral",
+}
+
+
+def tflite_artifact_path(
+    model_path: str,
+    content_hash: str,
+    quantization: str,
+    calibration: Optional[str] = None,
+) -> str:
+    """
+    Ruta del `.tflite` convertido, atada al contenido del modelo fuente y,
+    en int8, al conjunto de calibración (`calibration_fingerprint`).
+    """
+    path = Path(model_path)
+    tag = f"{quantization}-{calibration}" if calibration else quantization
+    return str(path.with_name(f"{path.stem}.{content_hash[:12]}.{tag}.tflite"))
+
+
+def calibration_fingerprint(data_dir: str, limit: int = 64) -> str:
+    """
+    Huella del conjunto de calibración int8: nombres, tamaños y mtimes de
+    las imágenes que usaría `representative_batches` y el límite. Otro
+    conjunto (o el mismo con archivos cambiados) da otro artefacto.
+    """
+    from src.app.bulk_scoring import discover_images
+
+    h = hashlib.sha256(f"{os.path.abspath(data_dir)}\0{limit}".encode("utf-8"))
+    for path in sorted(discover_images([data_dir])[:limit]):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        h.update(f"\0{path}\0{st.st_size}\0{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def representative_batches(data_dir: str, limit: int = 64) -> Iterator[List[np.ndarray]]:
+    """
+    Conjunto representativo para calibrar int8: imágenes reales de
+    `data_dir` pasadas por el mismo preproceso que en producción.
+    """
+    from src.app.bulk_scoring import discover_images
+    from src.data.read_img import read_gray
+    from src.features.preprocess_img import preprocess_image
+
+    paths = discover_images([data_dir])[:limit]
+    if not paths:
+        raise ValueError(f"Sin imágenes de calibración en: {data_dir}")
+    for path in paths:
+        try:
+            yield [preprocess_image(read_gray(path))]
+        except Exception as exc:  # noqa: BLE001 - se omite el archivo ilegible
+            logger.warning("Calibración: se omite %s (%s)", path, exc)
+
+
+def convert_model(
+    model,
+    quantization: str = "float16",
+    calibration_dir: Optional[str] = None,
+    calibration_limit: int = 64,
+) -> bytes:
+    """
+    Convierte un modelo Keras a TFLite.
+
+    Args:
+        model: Modelo Keras float32.
+        quantization: "float16" (pesos en fp16) o "int8" (pesos y
+            activaciones int8, calibrado con `calibration_dir`).
+        calibration_dir: Carpeta de imágenes para calibrar (requerida en int8).
+        calibration_limit: Máximo de imágenes de calibración.
+
+    Returns:
+        bytes del modelo .tflite.
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Cuantización desconocida: {quantization!r}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        if calibration_dir is None:
+            raise ValueError("La cuantización int8 requiere calibration_dir")
+        converter.representative_dataset = lambda: representative_batches(
+            calibration_dir, calibration_limit
+        )
+        # Entrada/salida siguen en float32: la interfaz no cambia
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def load_tflite_model(
+    model,
+    quantization: str = "float16",
+    calibration_dir: Optional[str] = None,
+    artifact: Optional[str] = None,
+    num_threads: Optional[int] = None,
+    calibration_limit: int = 64,
+) -> "TFLiteModel":
+    """
+    Modelo TFLite listo para inferir. Con `artifact`, reutiliza el `.tflite`
+    ya convertido o lo guarda tras convertir (escritura atómica). En int8
+    el nombre del artefacto debe incluir `calibration_fingerprint`: si ya
+    existe, `calibration_dir` no se vuelve a leer.
+    """
+    if artifact is not None and os.path.exists(artifact):
+        with open(artifact, "rb") as f:
+            return TFLiteModel(f.read(), num_threads=num_threads)
+
+    content = convert_model(model, quantization, calibration_dir, calibration_limit)
+    if artifact is not None:
+        tmp = f"{artifact}.tmp{os.getpid()}"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, artifact)
+        except OSError as exc:
+            logger.warning("No se pudo guardar el artefacto TFLite %s: %s", artifact, exc)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return TFLiteModel(content, num_threads=num_threads)
+
+
+class TFLiteModel:
+    def __init__(self, content: bytes, num_threads: Optional[int] = None) -> None:
+        """
+        Args:
+            content: bytes del modelo .tflite.
+            num_threads: Hilos del intérprete (por defecto, los de TFLite).
+        """
+        import tensorflow as tf
+
+        self.size_bytes = len(content)
+        self._interpreter = tf.lite.Interpreter(model_content=content, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        # El intérprete no es reentrante
+        self._lock = threading.Lock()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Probabilidades (N, num_classes) de un lote (N,512,512,1)."""
+        with self._lock:
+            return np.stack([self._invoke(x[None]) for x in batch])
+
+    def _invoke(self, x: np.ndarray) -> np.ndarray:
+        inp, out = self._input, self._output
+        if inp["dtype"] != np.float32:
+            scale, zero = inp["quantization"]
+            x = np.round(x / scale + zero).astype(inp["dtype"])
+        self._interpreter.set_tensor(inp["index"], np.ascontiguousarray(x, dtype=inp["dtype"]))
+        self._interpreter.invoke()
+        y = self._interpreter.get_tensor(out["index"])[0]
+        if out["dtype"] != np.float32:
+            scale, zero = out["quantization"]
+            y = (y.astype(np.float32) - zero) * scale
+        return y.astype(np.float32)
+
+
+def label_from_path(path: str) -> Optional[str]:
+    """Etiqueta esperada según la carpeta o el prefijo del archivo (o None)."""
+    p = Path(path)
+    candidates = [p.parent.name.lower(), p.stem.lower().split(" ")[0].split("_")[0]]
+    for name in candidates:
+        if name in _LABEL_ALIASES:
+            return _LABEL_ALIASES[name]
+    return None
+
+
+def agreement_report(
+    reference,
+    candidate,
+    paths: Sequence[str],
+    labels: Dict[int, str],
+) -> Dict[str, object]:
+    """
+    Compara un backend contra el modelo float32 de referencia.
+
+    Args:
+        reference: Callable lote -> probabilidades (modelo float32).
+        candidate: Callable lote -> probabilidades (backend a evaluar).
+        paths: Imágenes a comparar; la etiqueta real sale de la ruta.
+        labels: Índice de clase -> etiqueta.
+
+    Returns:
+        dict con la concordancia de etiquetas, las diferencias de
+        probabilidad (en puntos porcentuales) y la exactitud de cada uno
+        sobre las imágenes etiquetadas.
+    """
+    from src.data.read_img import read_gray
+    from src.features.preprocess_img import preprocess_image
+
+    agree = 0
+    diffs: List[float] = []
+    correct = {"reference": 0, "candidate": 0}
+    labelled = 0
+    disagreements = []
+
+    for path in paths:
+        batch = preprocess_image(read_gray(path))
+        ref = np.asarray(reference(batch))[0]
+        cand = np.asarray(candidate(batch))[0]
+        ref_label = labels[int(np.argmax(ref))]
+        cand_label = labels[int(np.argmax(cand))]
+
+        diffs.append(float(np.abs(ref - cand).max()) * 100.0)
+        if ref_label == cand_label:
+            agree += 1
+        else:
+            disagreements.append({"path": path, "reference": ref_label, "candidate": cand_label})
+
+        truth = label_from_path(path)
+        if truth is not None:
+            labelled += 1
+            correct["reference"] += ref_label == truth
+            correct["candidate"] += cand_label == truth
+
+    n = len(paths)
+    return {
+        "images": n,
+        "label_agreement": agree / n if n else 0.0,
+        "prob_diff_pp": {
+            "mean": float(np.mean(diffs)) if diffs else 0.0,
+            "max": float(np.max(diffs)) if diffs else 0.0,
+        },
+        "labelled": labelled,
+        "accuracy": {
+            k: (v / labelled if labelled else None) for k, v in correct.items()
+        },
+        "disagreements": disagreements,
+    }
@@ -1,93 +1,350 @@
 """
 Grad-CAM TF2 para modelo multiclase.
+
+TensorFlow se importa dentro de las funciones que lo usan: importar este
+módulo (p. ej. solo para pintar overlays) no paga el costo de cargarlo.
 """
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple, Union
 
 import cv2
 import numpy as np
-import tensorflow as tf
 
+from src.app.metrics import timed
+from src.data.image import GrayImage
 
-def generate_gradcam(
-    model,
-    image_batch: np.ndarray,
-    original_rgb: np.ndarray,
-    layer_name: str = "conv10_thisone",
-    class_index: Optional[int] = None,
-    threshold: float = 0.10,
-) -> np.ndarray:
+if TYPE_CHECKING:
+    import tensorflow as tf
+
+
+def build_grad_model(model, layer_name: str = "conv10_thisone") -> tf.keras.Model:
     """
-    Genera heatmap Grad-CAM superpuesto (estilo JET clásico).
+    Construye el modelo auxiliar de Grad-CAM: (activaciones conv, predicción).
+
+    Es costoso (reconstruye el grafo), así que conviene crearlo una sola vez
+    por (modelo, capa) y reutilizarlo.
 
     Args:
         model: Modelo Keras.
-        image_batch: (1,512,512,1) normalizado.
-        original_rgb: (H,W,3) uint8 en RGB.
         layer_name: Capa conv objetivo.
-        class_index: índice de clase objetivo (si None, usa argmax).
-        threshold: umbral para eliminar ruido en el CAM (0-1).
 
     Returns:
-        np.ndarray: RGB (512,512,3) uint8.
+        tf.keras.Model con salidas [conv_out, preds].
     """
-    # Predicción
-    preds = model(image_batch, training=False)
-    if isinstance(preds, (list, tuple)):
-        preds = preds[0]
-    preds = preds.numpy()[0]
-
-    # Si no llega class_index, usamos argmax (esto es clave)
-    if class_index is None:
-        class_index = int(np.argmax(preds))
+    import tensorflow as tf
 
-    # Modelo para Grad-CAM
-    grad_model = tf.keras.Model(
+    return tf.keras.Model(
         inputs=model.inputs,
         outputs=[model.get_layer(layer_name).output, model.output],
     )
 
+
+def gradcam_forward_batch(
+    grad_model: tf.keras.Model,
+    image_batch: np.ndarray,
+    class_indices: Optional[Sequence[int]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predicción + CAM de N imágenes en una sola pasada con GradientTape.
+
+    Cada imagen solo influye en su propia salida, así que el gradiente de la
+    suma de los scores objetivo da el gradiente por imagen en un solo paso.
+
+    Args:
+        grad_model: Modelo de `build_grad_model`.
+        image_batch: (N,512,512,1) normalizado.
+        class_indices: índice de clase objetivo por imagen (si None, usa el
+            argmax de esta misma pasada).
+
+    Returns:
+        preds: probabilidades (N, num_classes).
+        cams: mapas CAM crudos (N,h,w) float32 al tamaño de la capa conv.
+    """
+    import tensorflow as tf
+
     with tf.GradientTape() as tape:
         conv_out, out = grad_model(image_batch, training=False)
 
         if isinstance(out, (list, tuple)):
             out = out[0]
 
-        # out shape: (1, num_classes)
-        loss = out[:, class_index]
+        # out shape: (N, num_classes)
+        if class_indices is None:
+            idx = tf.argmax(out, axis=1, output_type=tf.int32)
+        else:
+            idx = tf.constant(np.asarray(class_indices, dtype=np.int32).reshape(-1))
+        loss = tf.reduce_sum(tf.gather(out, idx[:, None], axis=1, batch_dims=1))
+
+    grads = tape.gradient(loss, conv_out)               # (N,H,W,C)
+    weights = tf.reduce_mean(grads, axis=(1, 2))        # (N,C)
+
+    cams = tf.einsum("nhwc,nc->nhw", conv_out, weights)  # (N,H,W)
+
+    return out.numpy(), cams.numpy().astype(np.float32)
+
+
+def gradcam_forward(
+    grad_model: tf.keras.Model,
+    image_batch: np.ndarray,
+    class_index: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Predicción + CAM de una imagen en una sola pasada con GradientTape.
+
+    Args:
+        grad_model: Modelo de `build_grad_model`.
+        image_batch: (1,512,512,1) normalizado.
+        class_index: índice de clase objetivo (si None, usa argmax de esta
+            misma pasada).
+
+    Returns:
+        preds: probabilidades (num_classes,).
+        cam: mapa CAM crudo (h,w) float32 al tamaño de la capa conv.
+    """
+    preds, cams = gradcam_forward_batch(
+        grad_model,
+        image_batch[:1],
+        None if class_index is None else [class_index],
+    )
+    return preds[0], cams[0]
+
+
+def _resize_stack(stack: np.ndarray, size: int) -> np.ndarray:
+    """
+    Redimensiona (N,h,w) a (N,size,size) con cv2 tratando N como canales.
+    """
+    out = np.empty((stack.shape[0], size, size), dtype=stack.dtype)
+    # cv2 admite hasta 512 canales por llamada
+    for i in range(0, stack.shape[0], 512):
+        chunk = np.ascontiguousarray(stack[i:i + 512].transpose(1, 2, 0))
+        resized = cv2.resize(chunk, (size, size))
+        out[i:i + 512] = resized.reshape(size, size, -1).transpose(2, 0, 1)
+    return out
+
+
+# JET en orden RGB indexado por el valor del CAM (0-255): sin BGR<->RGB
+_JET_RGB = cv2.applyColorMap(
+    np.arange(256, dtype=np.uint8).reshape(256, 1), cv2.COLORMAP_JET
+)[:, 0, ::-1].copy()
+
+# Overlay 0.6*gris + 0.4*JET precalculado: (gris, cam) -> RGB uint8
+_BLEND_GRAY_JET = np.clip(
+    np.rint(
+        0.6 * np.arange(256, dtype=np.float64)[:, None, None]
+        + 0.4 * _JET_RGB[None, :, :].astype(np.float64)
+    ),
+    0,
+    255,
+).astype(np.uint8)
+
 
-    grads = tape.gradient(loss, conv_out)               # (1,H,W,C)
-    weights = tf.reduce_mean(grads, axis=(1, 2))        # (1,C)
+# Mapas de color disponibles para `render_cam`
+COLORMAPS = {
+    "jet": cv2.COLORMAP_JET,
+    "turbo": cv2.COLORMAP_TURBO,
+    "inferno": cv2.COLORMAP_INFERNO,
+    "magma": cv2.COLORMAP_MAGMA,
+    "plasma": cv2.COLORMAP_PLASMA,
+    "viridis": cv2.COLORMAP_VIRIDIS,
+    "hot": cv2.COLORMAP_HOT,
+    "bone": cv2.COLORMAP_BONE,
+}
+_COLORMAP_LUTS = {"jet": _JET_RGB}
 
-    conv_out = conv_out[0].numpy()                      # (H,W,C)
-    weights = weights[0].numpy()                        # (C,)
 
-    cam = np.tensordot(conv_out, weights, axes=([2], [0])).astype(np.float32)  # (H,W)
+def _colormap_rgb(name: str) -> np.ndarray:
+    lut = _COLORMAP_LUTS.get(name)
+    if lut is None:
+        if name not in COLORMAPS:
+            raise ValueError(f"Mapa de color desconocido: {name!r}")
+        lut = cv2.applyColorMap(
+            np.arange(256, dtype=np.uint8).reshape(256, 1), COLORMAPS[name]
+        )[:, 0, ::-1].copy()
+        _COLORMAP_LUTS[name] = lut
+    return lut
 
-    # ReLU + normalización a [0,1]
-    cam = np.maximum(cam, 0)
-    cam_max = float(cam.max())
-    cam = cam / cam_max if cam_max > 0 else cam
+
+def normalize_cams(cams: np.ndarray, threshold: Optional[float] = 0.10) -> np.ndarray:
+    """
+    ReLU + normalización a [0,1] por mapa y umbral de ruido.
+
+    Args:
+        cams: mapas CAM crudos (N,h,w).
+        threshold: valores por debajo pasan a 0 (0-1).
+
+    Returns:
+        np.ndarray: (N,h,w) float32 en [0,1].
+    """
+    cams = np.maximum(cams, 0).astype(np.float32)
+    cam_max = cams.max(axis=(1, 2), keepdims=True)
+    np.divide(cams, cam_max, out=cams, where=cam_max > 0)
 
     # Quitar ruido
     if threshold is not None and threshold > 0:
-        cam[cam < threshold] = 0
+        cams[cams < threshold] = 0
+    return cams
+
+
+@timed("gradcam_overlay_batch")
+def overlay_cam_batch(
+    cams: np.ndarray,
+    originals_rgb: Sequence[Union[np.ndarray, GrayImage]],
+    threshold: float = 0.10,
+) -> np.ndarray:
+    """
+    Normaliza N CAMs y los superpone sobre sus imágenes originales (JET).
+
+    Args:
+        cams: mapas CAM crudos (N,h,w).
+        originals_rgb: N imágenes GrayImage, (H,W) en gris o (H,W,3) en RGB,
+            uint8 (tamaños libres).
+        threshold: umbral para eliminar ruido en el CAM (0-1).
+
+    Returns:
+        np.ndarray: RGB (N,512,512,3) uint8.
+    """
+    n = cams.shape[0]
+    cam_u8 = np.uint8(255 * _resize_stack(normalize_cams(cams, threshold), 512))
+
+    out = np.empty((n, 512, 512, 3), dtype=np.uint8)
+    for i, original in enumerate(originals_rgb):
+        if isinstance(original, GrayImage):
+            original = original.pixels
+        base = original if original.shape[:2] == (512, 512) else cv2.resize(original, (512, 512))
+
+        if base.ndim == 2:
+            # Gris: una sola consulta a la tabla, directo en RGB
+            out[i] = _BLEND_GRAY_JET[base, cam_u8[i]]
+        else:
+            # Overlay clásico sobre la base RGB
+            out[i] = cv2.addWeighted(base, 0.6, _JET_RGB[cam_u8[i]], 0.4, 0)
+
+    return out
+
+
+@timed("gradcam_overlay")
+def overlay_cam(
+    cam: np.ndarray,
+    original_rgb: Union[np.ndarray, GrayImage],
+    threshold: float = 0.10,
+) -> np.ndarray:
+    """
+    Normaliza el CAM y lo superpone sobre la imagen original (estilo JET).
+
+    Args:
+        cam: mapa CAM crudo (h,w).
+        original_rgb: GrayImage, (H,W) en gris o (H,W,3) uint8 en RGB.
+        threshold: umbral para eliminar ruido en el CAM (0-1).
+
+    Returns:
+        np.ndarray: RGB (512,512,3) uint8.
+    """
+    return overlay_cam_batch(cam[None], [original_rgb], threshold)[0]
+
+
+@timed("gradcam_render")
+def render_cam(
+    cam: np.ndarray,
+    original: Union[np.ndarray, GrayImage],
+    size: int = 512,
+    colormap: str = "jet",
+    threshold: float = 0.10,
+    alpha: float = 0.4,
+) -> np.ndarray:
+    """
+    Pinta un CAM crudo sobre su imagen con parámetros de visualización
+    libres; con los valores por defecto equivale a `overlay_cam`.
+
+    Args:
+        cam: mapa CAM crudo (h,w) al tamaño de la capa conv.
+        original: GrayImage, (H,W) en gris o (H,W,3) uint8 en RGB.
+        size: Lado del overlay de salida.
+        colormap: Nombre en `COLORMAPS`.
+        threshold: umbral para eliminar ruido en el CAM (0-1).
+        alpha: Peso del mapa de color en la mezcla (0-1).
+
+    Returns:
+        np.ndarray: RGB (size,size,3) uint8.
+    """
+    if size == 512 and colormap == "jet" and alpha == 0.4:
+        return overlay_cam(cam, original, threshold)
+
+    lut = _colormap_rgb(colormap)
+    if isinstance(original, GrayImage):
+        original = original.pixels
+    base = original if original.shape[:2] == (size, size) else cv2.resize(original, (size, size))
+    if base.ndim == 2:
+        base = cv2.cvtColor(base, cv2.COLOR_GRAY2RGB)
+
+    cam_u8 = np.uint8(255 * cv2.resize(normalize_cams(cam[None], threshold)[0], (size, size)))
+    return cv2.addWeighted(base, 1.0 - alpha, lut[cam_u8], alpha, 0)
+
+
+@timed("gradcam")
+def generate_gradcam(
+    model,
+    image_batch: np.ndarray,
+    original_rgb: Union[np.ndarray, GrayImage],
+    layer_name: str = "conv10_thisone",
+    class_index: Optional[int] = None,
+    threshold: float = 0.10,
+    grad_model: Optional[tf.keras.Model] = None,
+) -> np.ndarray:
+    """
+    Genera heatmap Grad-CAM superpuesto (estilo JET clásico).
 
-    cam = cv2.resize(cam, (512, 512))
+    Args:
+        model: Modelo Keras.
+        image_batch: (1,512,512,1) normalizado.
+        original_rgb: GrayImage, (H,W) en gris o (H,W,3) uint8 en RGB.
+        layer_name: Capa conv objetivo.
+        class_index: índice de clase objetivo (si None, usa argmax).
+        threshold: umbral para eliminar ruido en el CAM (0-1).
+        grad_model: modelo de `build_grad_model` ya construido (evita
+            reconstruir el grafo en cada llamada).
 
-    # Heatmap en BGR (OpenCV)
-    heatmap_bgr = cv2.applyColorMap(np.uint8(255 * cam), cv2.COLORMAP_JET)
+    Returns:
+        np.ndarray: RGB (512,512,3) uint8.
+    """
+    if grad_model is None:
+        grad_model = build_grad_model(model, layer_name)
 
-    # Base: aseguramos que esté en BGR para mezclar correctamente con OpenCV
-    base_rgb = cv2.resize(original_rgb, (512, 512))
-    base_bgr = cv2.cvtColor(base_rgb, cv2.COLOR_RGB2BGR)
+    # Si no llega class_index, se usa el argmax del mismo forward
+    _, cam = gradcam_forward(grad_model, image_batch, class_index)
 
-    # Overlay clásico
-    superimposed_bgr = cv2.addWeighted(base_bgr, 0.6, heatmap_bgr, 0.4, 0)
+    return overlay_cam(cam, original_rgb, threshold)
+
+
+@timed("gradcam_batch")
+def generate_gradcam_batch(
+    model,
+    image_batch: np.ndarray,
+    originals_rgb: Sequence[Union[np.ndarray, GrayImage]],
+    layer_name: str = "conv10_thisone",
+    class_indices: Optional[Sequence[int]] = None,
+    threshold: float = 0.10,
+    grad_model: Optional[tf.keras.Model] = None,
+) -> np.ndarray:
+    """
+    Versión por lotes de `generate_gradcam`: N heatmaps con un solo forward.
+
+    Args:
+        model: Modelo Keras.
+        image_batch: (N,512,512,1) normalizado.
+        originals_rgb: N imágenes GrayImage, (H,W) o (H,W,3) uint8.
+        layer_name: Capa conv objetivo.
+        class_indices: índice de clase objetivo por imagen (si None, argmax).
+        threshold: umbral para eliminar ruido en el CAM (0-1).
+        grad_model: modelo de `build_grad_model` ya construido.
+
+    Returns:
+        np.ndarray: RGB (N,512,512,3) uint8.
+    """
+    if grad_model is None:
+        grad_model = build_grad_model(model, layer_name)
 
-    # Volver a RGB para PIL / UI
-    superimposed_rgb = cv2.cvtColor(superimposed_bgr, cv2.COLOR_BGR2RGB)
+    _, cams = gradcam_forward_batch(grad_model, image_batch, class_indices)
 
-    return superimposed_rgb.astype(np.uint8)
+    return overlay_cam_batch(cams, originals_rgb, threshold)
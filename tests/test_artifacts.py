@@ -0,0 +1,64 @@
+import os
+import time
+
+from src.app.artifacts import ArtifactStore
+
+
+def test_quota_evicts_least_recently_used(tmp_path):
+    store = ArtifactStore(tmp_path, max_bytes=250)
+    for name in ("a.bin", "b.bin"):
+        store.write(name, b"x" * 100)
+    assert store.open("a.bin") is not None  # "a" pasa a ser el más reciente
+    store.write("c.bin", b"x" * 100)
+
+    assert sorted(os.listdir(tmp_path)) == ["a.bin", "c.bin"]
+    stats = store.stats()
+    assert stats["bytes"] == 200 and stats["files"] == 2
+    assert stats["evictions"] == {"quota": 1, "ttl": 0}
+    assert stats["evicted_bytes"] == 100
+
+    # Reemplazar ajusta el uso sin recorrer la carpeta; lo recién escrito se conserva
+    store.write("c.bin", b"x" * 300)
+    assert store.stats()["bytes"] == 300 and os.listdir(tmp_path) == ["c.bin"]
+    assert store.read("c.bin") == b"x" * 300
+
+
+def test_ttl_and_restart_scan(tmp_path):
+    (tmp_path / "stale.npz").write_bytes(b"old")
+    (tmp_path / "fresh.npz").write_bytes(b"new")
+    (tmp_path / "half.npz.123.tmp").write_bytes(b"?")
+    (tmp_path / "writing.npz.456.tmp").write_bytes(b"?")
+    past = time.time() - 3600
+    os.utime(tmp_path / "stale.npz", (past, past))
+    os.utime(tmp_path / "half.npz.123.tmp", (past, past))
+
+    # Al arrancar se cuenta lo existente y se barre lo caducado; un .tmp
+    # reciente puede ser la escritura en curso de otro worker
+    store = ArtifactStore(tmp_path, ttl_seconds=60)
+    assert sorted(os.listdir(tmp_path)) == ["fresh.npz", "writing.npz.456.tmp"]
+    os.unlink(tmp_path / "writing.npz.456.tmp")
+    assert store.stats()["evictions"]["ttl"] == 1 and store.stats()["bytes"] == 3
+
+    assert store.open("../fresh.npz") is None
+    assert store.open("missing.npz") is None
+    store.delete("fresh.npz")
+    assert store.stats()["files"] == 0 and not os.listdir(tmp_path)
+
+
+def test_shared_folder_adopts_and_rescans_other_writers(tmp_path):
+    # Dos workers sobre la misma carpeta, con la cuota completa cada uno
+    a = ArtifactStore(tmp_path, max_bytes=250, rescan_seconds=0.01)
+    b = ArtifactStore(tmp_path, max_bytes=250, rescan_seconds=0.01)
+
+    a.write("uno.npz", b"x" * 100)
+    # Lo que escribió otro proceso se encuentra al abrirlo
+    assert b.read("uno.npz") == b"x" * 100
+    assert b.stats()["files"] == 1
+
+    b.write("dos.npz", b"x" * 100)
+    time.sleep(0.02)
+    a.write("tres.npz", b"x" * 100)
+
+    # La cuota se impone sobre el total en disco, no sobre lo propio
+    assert sorted(os.listdir(tmp_path)) == ["dos.npz", "tres.npz"]
+    assert a.stats()["bytes"] == 200 and a.stats()["rescans"] >= 1
@@ -0,0 +1,56 @@
+import io
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from src.app.batch_upload import BatchLimitError, BatchLimits, iter_zip_members, open_zip, score_stream
+from src.app.integrator import PneumoniaDetector
+from tests.test_grad_cam import _build_tiny_model
+
+
+def _png(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    return cv2.imencode(".png", rng.integers(0, 256, size=(600, 600), dtype=np.uint8))[1].tobytes()
+
+
+def _zip(members) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def test_zip_limits_are_checked_before_decoding():
+    members = [(f"lista/p{i}.png", _png(i)) for i in range(3)] + [
+        ("lista/", b""), ("__MACOSX/lista/._p0.png", b"x"), ("lista/notas.txt", b"x"),
+    ]
+    archive, infos = open_zip(_zip(members), BatchLimits())
+    assert [i.filename for i in infos] == ["lista/p0.png", "lista/p1.png", "lista/p2.png"]
+    assert [len(d) for _, d in iter_zip_members(archive, infos, BatchLimits())] == [len(d) for _, d in members[:3]]
+
+    with pytest.raises(BatchLimitError):
+        open_zip(_zip(members), BatchLimits(max_members=2))
+    with pytest.raises(BatchLimitError):
+        open_zip(_zip(members), BatchLimits(max_member_bytes=100))
+    with pytest.raises(ValueError):
+        open_zip(io.BytesIO(b"no es un zip"), BatchLimits())
+
+
+def test_score_stream_keeps_order_and_reports_bad_members():
+    items = [("a.png", _png(0)), ("roto.png", b"\x89PNG\r\n\x1a\nbasura"), ("b.png", _png(1)), ("c.png", _png(2))]
+    detector = PneumoniaDetector(model=_build_tiny_model())
+
+    seen = []
+    rows = list(score_stream(detector, iter(items), batch_size=2,
+                             on_result=lambda name, r: seen.append(name) or {"cam": r.cam.shape}))
+    assert [r["name"] for r in rows] == ["a.png", "roto.png", "b.png", "c.png"]
+    assert "error" in rows[1] and "label" not in rows[1]
+    assert seen == ["a.png", "b.png", "c.png"]
+
+    single = detector.predict(items[2][1])
+    assert rows[2]["probability"] == round(single.probability, 2)
+    assert rows[2]["label"] == single.label
@@ -0,0 +1,36 @@
+from benchmarks.pipeline import compare, run
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {
+        "stage.predict.p50_ms": 100.0,
+        "stage.preprocess.p50_ms": 1.0,
+        "throughput.batch_8.images_per_sec": 50.0,
+        "memory.peak_rss_mb": 500.0,
+    }
+    current = {
+        "stage.predict.p50_ms": 140.0,              # +40%: regresión
+        "stage.preprocess.p50_ms": 1.6,             # +60% pero < min_delta: ruido
+        "throughput.batch_8.images_per_sec": 30.0,  # -40%: regresión
+        "memory.peak_rss_mb": 520.0,                # +4%: dentro del umbral
+    }
+
+    regressions = compare(current, baseline, threshold=0.25, min_delta=1.0)
+
+    assert [r["metric"] for r in regressions] == [
+        "stage.predict.p50_ms",
+        "throughput.batch_8.images_per_sec",
+    ]
+    assert compare(baseline, baseline) == []
+
+
+def test_run_reports_stages_throughput_and_memory():
+    results = run("data/raw/DICOM", repeats=1, batch_sizes=(1, 2))
+    metrics = results["metrics"]
+
+    for stage in ("decode", "preprocess", "predict", "gradcam"):
+        assert metrics[f"stage.{stage}.p99_ms"] >= metrics[f"stage.{stage}.p50_ms"] > 0
+    assert metrics["end_to_end.p50_ms"] > 0
+    assert metrics["throughput.batch_2.images_per_sec"] > 0
+    assert metrics["memory.peak_rss_mb"] > 0
+    assert results["meta"]["model"] == "stand-in"
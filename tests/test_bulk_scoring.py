@@ -0,0 +1,64 @@
+import csv
+import json
+from pathlib import Path
+
+from src.app.bulk_scoring import discover_images, load_completed, score_paths
+from src.app.integrator import PneumoniaDetector
+from tests.test_grad_cam import _build_tiny_model
+
+
+def test_score_paths_streams_results_and_resumes(tmp_path):
+    paths = discover_images(["data/raw/DICOM", "data/raw/JPG/normal"])
+    assert len(paths) == 8
+
+    detector = PneumoniaDetector(model=_build_tiny_model())
+    output = str(tmp_path / "resultados.jsonl")
+
+    # Simula un corte: 3 filas completas y una línea truncada
+    with open(output, "w", encoding="utf-8") as f:
+        for p in paths[:3]:
+            f.write(json.dumps({"path": p, "label": "normal"}) + "\n")
+        f.write('{"path": "')
+
+    stats = score_paths(
+        detector,
+        paths,
+        output_path=output,
+        batch_size=4,
+        workers=2,
+        gradcam_dir=str(tmp_path / "heatmaps"),
+    )
+
+    assert stats.skipped == 3
+    assert stats.scored == 5
+    assert stats.errors == 0
+    assert load_completed(output) == set(paths)
+
+    with open(output, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    new_rows = [json.loads(line) for line in lines[4:]]
+    assert len(new_rows) == 5
+    assert all(Path(r["heatmap"]).exists() for r in new_rows)
+
+
+def test_score_paths_writes_csv_with_error_rows(tmp_path):
+    bad = tmp_path / "roto.jpg"
+    bad.write_bytes(b"no es una imagen")
+    paths = ["data/raw/JPG/virus/person1499_virus_2609.jpeg", str(bad)]
+
+    output = str(tmp_path / "resultados.csv")
+    stats = score_paths(PneumoniaDetector(model=_build_tiny_model()), paths, output, workers=1)
+
+    assert stats.scored == 1 and stats.errors == 1
+    with open(output, newline="", encoding="utf-8") as f:
+        rows = {r["path"]: r for r in csv.DictReader(f)}
+    assert rows[paths[0]]["label"] in ("bacteriana", "normal", "viral")
+    assert rows[str(bad)]["error"]
+
+    # Al reanudar, solo se reintenta el archivo que falló
+    bad.write_bytes(Path(paths[0]).read_bytes())
+    assert load_completed(output) == {paths[0]}
+    stats = score_paths(PneumoniaDetector(model=_build_tiny_model()), paths, output, workers=1)
+
+    assert stats.skipped == 1 and stats.scored == 1 and stats.errors == 0
+    assert load_completed(output) == set(paths)
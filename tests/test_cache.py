@@ -0,0 +1,75 @@
+import threading
+import time
+
+import numpy as np
+
+from src.app.cache import CachedResult, ResultCache
+
+
+def _entry(label: str = "normal", size: int = 100) -> CachedResult:
+    return CachedResult(label=label, probability=90.0, cam=np.ones(size // 4, dtype=np.float32))
+
+
+def test_result_cache_lru_eviction_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2, max_bytes=1000)
+
+    cache.put("a", _entry())
+    cache.put("b", _entry())
+    assert cache.get("a") is not None  # "a" pasa a ser el más reciente
+    cache.put("c", _entry())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    # Una entrada grande expulsa por bytes
+    cache.put("d", _entry(size=900))
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["evictions"] >= 2
+
+
+def test_result_cache_single_flight_and_disk_tier(tmp_path):
+    cache = ResultCache(disk_dir=tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return _entry("viral")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Peticiones idénticas concurrentes: un solo cálculo
+    assert len(calls) == 1
+    assert [r.label for r in results] == ["viral"] * 4
+    assert cache.stats()["misses"] == 1
+
+    # Un proceso nuevo encuentra la entrada en disco
+    fresh = ResultCache(disk_dir=tmp_path)
+    entry = fresh.get("k")
+    assert entry is not None and entry.label == "viral"
+    np.testing.assert_array_equal(entry.cam, _entry().cam)
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_get_or_compute_rechecks_memory_after_a_stale_miss(monkeypatch):
+    cache = ResultCache()
+    cache.put("k", _entry("normal"))
+    # El `get` sin lock falló justo antes de que el líder guardara
+    monkeypatch.setattr(cache, "get", lambda key: None)
+
+    def compute():
+        raise AssertionError("no debe recalcular")
+
+    assert cache.get_or_compute("k", compute).label == "normal"
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 0
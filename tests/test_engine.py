@@ -0,0 +1,45 @@
+import numpy as np
+
+from src.app.integrator import PneumoniaDetector
+from src.models.engine import CompiledEngine
+from src.visualizations.grad_cam import build_grad_model, gradcam_forward_batch
+from tests.test_grad_cam import _build_tiny_model
+
+
+def test_compiled_engine_matches_eager_path():
+    model = _build_tiny_model()
+    engine = CompiledEngine(model, "conv10_thisone", buckets=(1, 4))
+    batch = np.random.rand(3, 512, 512, 1).astype(np.float32)
+
+    preds, cams = engine.infer_with_cam(batch)
+    eager_preds, eager_cams = gradcam_forward_batch(build_grad_model(model, "conv10_thisone"), batch)
+
+    assert preds.shape == eager_preds.shape
+    np.testing.assert_allclose(preds, eager_preds, rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(cams, eager_cams, rtol=1e-3, atol=1e-5)
+    np.testing.assert_allclose(engine.infer(batch), eager_preds, rtol=1e-4, atol=1e-5)
+    assert engine.check_parity(batch)["ok"]
+
+
+def test_compiled_engine_reuses_traces_across_batch_sizes():
+    engine = CompiledEngine(_build_tiny_model(), "conv10_thisone", buckets=(1, 2, 4))
+
+    for n in (1, 2, 3, 4, 6):
+        preds = engine.infer(np.random.rand(n, 512, 512, 1).astype(np.float32))
+        assert preds.shape[0] == n
+
+    stats = engine.stats()
+    # Firma con dimensión de lote libre: una sola traza para todos los tamaños
+    assert stats["traces"]["forward"] == 1
+    # 6 imágenes = trozo de 4 + trozo de 2
+    assert stats["calls"]["forward"] == 6
+    assert stats["compiled_batch_sizes"]["forward"] == [1, 2, 4]
+
+
+def test_detector_compiled_engine_predicts():
+    detector = PneumoniaDetector(model=_build_tiny_model(), engine="compiled")
+
+    result = detector.predict("data/raw/JPG/normal/NORMAL2-IM-1144-0001.jpeg")
+
+    assert result.heatmap.shape == (512, 512, 3)
+    assert detector.engine_stats()["traces"]["gradcam"] == 1
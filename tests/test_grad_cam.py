@@ -1,7 +1,14 @@
 import numpy as np
 import tensorflow as tf
 
-from src.visualizations.grad_cam import generate_gradcam
+from src.data.image import GrayImage
+from src.visualizations.grad_cam import (
+    build_grad_model,
+    generate_gradcam,
+    generate_gradcam_batch,
+    gradcam_forward,
+    overlay_cam,
+)
 
 
 def _build_tiny_model(layer_name: str = "conv10_thisone") -> tf.keras.Model:
@@ -42,3 +49,74 @@ def test_generate_gradcam_returns_uint8_rgb_image():
     assert isinstance(heatmap_rgb, np.ndarray)
     assert heatmap_rgb.shape == (512, 512, 3)
     assert heatmap_rgb.dtype == np.uint8
+
+
+def test_gradcam_forward_matches_model_prediction():
+    layer_name = "conv10_thisone"
+    model = _build_tiny_model(layer_name=layer_name)
+    grad_model = build_grad_model(model, layer_name)
+
+    image_batch = np.random.rand(1, 512, 512, 1).astype(np.float32)
+
+    preds, cam = gradcam_forward(grad_model, image_batch)
+
+    # Las probabilidades salen del mismo forward que el CAM
+    expected = model(image_batch, training=False).numpy()[0]
+    np.testing.assert_allclose(preds, expected, rtol=1e-5, atol=1e-6)
+    assert cam.shape == (512, 512)
+    assert cam.dtype == np.float32
+
+
+def test_generate_gradcam_batch_matches_single_image_path():
+    layer_name = "conv10_thisone"
+    model = _build_tiny_model(layer_name=layer_name)
+    grad_model = build_grad_model(model, layer_name)
+
+    image_batch = np.random.rand(3, 512, 512, 1).astype(np.float32)
+    originals = [
+        np.random.randint(0, 256, size=(h, w, 3), dtype=np.uint8)
+        for h, w in [(512, 512), (600, 800), (300, 400)]
+    ]
+    class_indices = [0, 1, 2]
+
+    heatmaps = generate_gradcam_batch(
+        model=model,
+        image_batch=image_batch,
+        originals_rgb=originals,
+        layer_name=layer_name,
+        class_indices=class_indices,
+        threshold=0.0,
+        grad_model=grad_model,
+    )
+
+    assert heatmaps.shape == (3, 512, 512, 3)
+    assert heatmaps.dtype == np.uint8
+
+    for i in range(3):
+        single = generate_gradcam(
+            model=model,
+            image_batch=image_batch[i:i + 1],
+            original_rgb=originals[i],
+            layer_name=layer_name,
+            class_index=class_indices[i],
+            threshold=0.0,
+            grad_model=grad_model,
+        )
+        # Diferencias mínimas por redondeo float entre einsum y forward individual
+        assert np.abs(heatmaps[i].astype(int) - single.astype(int)).max() <= 2
+
+
+def test_overlay_cam_on_gray_image_matches_rgb_overlay():
+    cam = np.random.rand(64, 64).astype(np.float32)
+    gray = GrayImage(np.random.randint(0, 256, size=(512, 512), dtype=np.uint8))
+
+    # La vista RGB se crea solo al pedirla
+    assert gray._rgb is None
+    from_gray = overlay_cam(cam, gray)
+    assert gray._rgb is None
+
+    from_rgb = overlay_cam(cam, gray.rgb)
+
+    assert from_gray.shape == (512, 512, 3)
+    assert from_gray.dtype == np.uint8
+    assert np.abs(from_gray.astype(int) - from_rgb.astype(int)).max() <= 1
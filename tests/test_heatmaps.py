@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.app.heatmaps import HeatmapStore, render_params
+from src.data.image import GrayImage
+from src.visualizations.grad_cam import overlay_cam, render_cam
+
+
+def _sample():
+    rng = np.random.default_rng(0)
+    cam = rng.standard_normal((32, 32)).astype(np.float32)
+    image = GrayImage(rng.integers(0, 256, size=(512, 512), dtype=np.uint8))
+    return cam, image
+
+
+def test_render_cam_defaults_match_overlay_and_params_apply():
+    cam, image = _sample()
+
+    np.testing.assert_array_equal(render_cam(cam, image), overlay_cam(cam, image))
+
+    small = render_cam(cam, image, size=256, colormap="inferno", threshold=0.5, alpha=0.7)
+    assert small.shape == (256, 256, 3) and small.dtype == np.uint8
+    # alpha=0: solo la imagen de base
+    plain = render_cam(cam, image, size=512, colormap="viridis", alpha=0.0)
+    np.testing.assert_array_equal(plain[..., 0], image.pixels)
+
+
+def test_heatmap_store_memoises_renders_and_persists(tmp_path):
+    cam, image = _sample()
+    store = HeatmapStore(disk_dir=tmp_path)
+    store.put("ab" * 16, cam, image)
+    store.save("ab" * 16)
+
+    first = store.render_png("ab" * 16, size=128, threshold="0.3")
+    again = store.render_png("ab" * 16, size="128", threshold=0.3)
+    assert first is again
+    assert Image.open(io.BytesIO(first)).size == (128, 128)
+    assert store.stats()["renders"] == 1 and store.stats()["render_hits"] == 1
+
+    # Otro proceso lo encuentra en disco; ids desconocidos o inválidos no
+    fresh = HeatmapStore(disk_dir=tmp_path)
+    assert fresh.render_png("ab" * 16) is not None
+    assert fresh.render_png("cd" * 16) is None
+    assert fresh.render_png("../etc") is None
+
+
+def test_background_encoding_is_shared_and_formats_apply(tmp_path):
+    cam, image = _sample()
+    store = HeatmapStore(disk_dir=tmp_path, image_format="webp", webp_quality=60)
+    store.put("ef" * 16, cam, image)
+
+    future = store.prerender("ef" * 16)
+    served = store.render_image("ef" * 16)
+    assert served == future.result()
+    assert Image.open(io.BytesIO(served)).format == "WEBP"
+    # Codificado una sola vez, lo haya terminado el hilo o la petición
+    assert store.stats()["renders"] == 1
+
+    png = store.render_png("ef" * 16)
+    assert Image.open(io.BytesIO(png)).format == "PNG"
+    assert store.stats()["renders"] == 2
+
+    store.save("ef" * 16)
+    assert store.stats()["disk"]["files"] == 1
+    with pytest.raises(ValueError):
+        HeatmapStore(image_format="gif")
+
+
+def test_render_params_validation():
+    assert render_params("256", "JET", "0.25", "0.5") == (256, "jet", 0.25, 0.5)
+    for bad in ({"size": 4}, {"colormap": "rainbowish"}, {"threshold": 2}, {"alpha": -1}):
+        with pytest.raises(ValueError):
+            render_params(**bad)
+
+
+def test_save_persists_entry_already_evicted_from_memory(tmp_path):
+    cam, image = _sample()
+    store = HeatmapStore(max_results=1, disk_dir=tmp_path)
+    entry = store.put("ab" * 16, cam, image)
+    # Llega otro resultado antes de que corra el guardado en segundo plano
+    store.put("cd" * 16, cam, image)
+
+    store.save("ab" * 16, entry)
+    assert (tmp_path / f"{'ab' * 16}.npz").exists()
+    restored_cam, restored_image = HeatmapStore(disk_dir=tmp_path).get("ab" * 16)
+    np.testing.assert_array_equal(restored_cam, entry[0])
+    np.testing.assert_array_equal(restored_image.pixels, image.pixels)
@@ -0,0 +1,142 @@
+import threading
+
+import numpy as np
+
+from src.app.cache import ResultCache
+from src.app.integrator import LABELS, BatchScheduler, PneumoniaDetector
+from src.models.registry import ModelRegistry
+from tests.test_grad_cam import _build_tiny_model
+
+
+def test_batch_scheduler_groups_concurrent_requests():
+    model = _build_tiny_model()
+    detector = PneumoniaDetector(model=model)
+    scheduler = BatchScheduler(detector, max_batch_size=4, max_wait_ms=200)
+
+    batches = [np.random.rand(1, 512, 512, 1).astype(np.float32) for _ in range(4)]
+    results = [None] * 4
+
+    def worker(i):
+        results[i] = scheduler.submit(batches[i]).result(timeout=30)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    scheduler.close()
+
+    # Cada llamador recibe SUS probabilidades
+    for batch, (preds, cam) in zip(batches, results):
+        assert cam.shape == (512, 512)
+        expected = model(batch, training=False).numpy()[0]
+        np.testing.assert_allclose(preds, expected, rtol=1e-4, atol=1e-5)
+
+    stats = scheduler.stats()
+    assert stats["items"] == 4
+    assert stats["batches"] < 4
+    assert stats["queue_depth"] == 0
+
+
+def test_predict_reuses_cached_grad_model():
+    detector = PneumoniaDetector(model=_build_tiny_model())
+
+    result = detector.predict("data/raw/JPG/normal/NORMAL2-IM-1144-0001.jpeg")
+
+    assert result.label in LABELS.values()
+    assert 0.0 <= result.probability <= 100.0
+    assert result.heatmap.shape == (512, 512, 3)
+    assert result.heatmap.dtype == np.uint8
+
+    # El modelo de Grad-CAM se construye una sola vez por (modelo, capa)
+    assert detector.get_grad_model() is detector.get_grad_model()
+
+
+def test_predict_batch_matches_single_predictions():
+    detector = PneumoniaDetector(model=_build_tiny_model())
+    paths = [
+        "data/raw/JPG/normal/NORMAL2-IM-1144-0001.jpeg",
+        "data/raw/JPG/virus/person1499_virus_2609.jpeg",
+    ]
+
+    results = detector.predict_batch(paths)
+
+    assert len(results) == 2
+    for path, result in zip(paths, results):
+        single = detector.predict(path)
+        assert result.label == single.label
+        assert abs(result.probability - single.probability) < 1e-3
+        assert result.heatmap.shape == (512, 512, 3)
+
+
+def test_predict_cache_hit_skips_model():
+    detector = PneumoniaDetector(model=_build_tiny_model(), cache=ResultCache())
+    path = "data/raw/JPG/normal/NORMAL2-IM-1144-0001.jpeg"
+
+    first = detector.predict(path)
+
+    # En un acierto no se toca el modelo
+    def fail(*args, **kwargs):
+        raise AssertionError("el modelo no debe ejecutarse en un acierto")
+
+    detector.get_grad_model = fail
+    detector.infer = fail
+    second = detector.predict(path)
+
+    assert second.label == first.label
+    np.testing.assert_array_equal(second.cam, first.cam)
+    assert second.heatmap.shape == (512, 512, 3)
+    assert detector.cache.stats()["hits"] == 1
+
+
+def test_lazy_detector_loads_on_warmup_and_records_phases(tmp_path):
+    model_path = tmp_path / "modelo.h5"
+    model_path.write_bytes(b"pesos")
+    calls = []
+
+    def fake_load(path, **kwargs):
+        calls.append(path)
+        return _build_tiny_model()
+
+    registry = ModelRegistry(loader=fake_load)
+    detector = PneumoniaDetector(model_path=str(model_path), lazy=True, registry=registry)
+    assert not detector.model_loaded
+    assert calls == []
+
+    timings = detector.warmup()
+
+    assert calls == [str(model_path)]
+    assert set(timings["phases_ms"]) >= {"model_load", "grad_model", "warmup_infer", "warmup_gradcam"}
+    # La carga es única aunque se acceda varias veces o haya otro detector
+    other = PneumoniaDetector(model_path=str(model_path), registry=registry)
+    assert detector.model is other.model
+    assert calls == [str(model_path)]
+
+
+def test_batch_scheduler_close_never_leaves_futures_pending():
+    class _Detector:
+        def infer_with_cam(self, batch):
+            return np.zeros((len(batch), 3)), np.zeros((len(batch), 4, 4))
+
+    scheduler = BatchScheduler(_Detector(), max_batch_size=2, max_wait_ms=1)
+    batch = np.zeros((1, 512, 512, 1), dtype=np.float32)
+    futures, rejected = [], []
+
+    def worker():
+        for _ in range(50):
+            try:
+                futures.append(scheduler.submit(batch))
+            except RuntimeError:
+                rejected.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    scheduler.close()
+    for t in threads:
+        t.join()
+
+    # Lo aceptado se resuelve (o falla); nada queda esperando tras el centinela
+    for future in futures:
+        assert future.exception(timeout=5) is None
+    assert len(futures) + len(rejected) == 200
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from src.app.jobs import DONE, ERROR, JobQueue, QueueFullError
+
+
+def test_job_queue_rejects_when_full_and_records_times():
+    release = threading.Event()
+
+    def handler(payload):
+        release.wait(timeout=10)
+        if payload == "falla":
+            raise ValueError("imagen inválida")
+        return payload * 2
+
+    jobs = JobQueue(handler, workers=1, max_queue=2)
+
+    running = jobs.submit(1)
+    # Esperar a que el único hilo tome el primer trabajo
+    jobs.wait_for_change(running.id, "queued", timeout=5)
+    queued = [jobs.submit(2), jobs.submit("falla")]
+
+    with pytest.raises(QueueFullError):
+        jobs.submit(3)
+
+    release.set()
+    for job in [running] + queued:
+        while not job.finished:
+            jobs.wait_for_change(job.id, job.status, timeout=5)
+
+    assert running.status == DONE and running.result == 2
+    assert queued[1].status == ERROR and "imagen inválida" in queued[1].error
+    assert queued[0].queue_wait_ms >= 0 and queued[0].service_ms >= 0
+
+    stats = jobs.stats()
+    assert stats["rejected"] == 1
+    assert stats["service_ms"]["count"] == 3
+    jobs.close()
+
+
+def test_other_worker_reads_published_status(tmp_path):
+    from src.app.artifacts import ArtifactStore
+
+    release = threading.Event()
+    owner = JobQueue(lambda p: release.wait(timeout=10) and {"label": p},
+                     workers=1, store=ArtifactStore(tmp_path))
+    # Otro proceso: su propia cola, misma carpeta, sin el trabajo en memoria
+    other = JobQueue(lambda p: p, workers=1, store=ArtifactStore(tmp_path), poll_interval=0.01)
+
+    job = owner.submit("normal")
+    assert other.get(job.id) is None
+    assert other.status(job.id)["status"] in ("queued", "running")
+
+    release.set()
+    last = None
+    while last is None or last["status"] not in (DONE, ERROR):
+        last = other.wait_for_status(job.id, last and last["status"], timeout=5)
+    assert last["status"] == DONE and last["result"] == {"label": "normal"}
+    assert other.status("no-existe") is None
+    owner.close()
+    other.close()
+
+
+def test_result_of_job_finished_by_other_worker(tmp_path):
+    from src.app.artifacts import ArtifactStore
+
+    store = ArtifactStore(tmp_path)
+    owner = JobQueue(lambda p: {"result_id": p}, workers=1, store=store)
+    other = JobQueue(lambda p: p, workers=1, store=store)
+
+    job = owner.submit("abc123")
+    while not job.finished:
+        owner.wait_for_change(job.id, job.status, timeout=5)
+
+    # Lo que usa /export-pdf/batch con los job_ids de la lista de trabajo
+    assert other.get(job.id) is None
+    assert other.result(job.id) == {"result_id": "abc123"}
+    assert other.result("no-existe") is None
+    owner.close()
+    other.close()
@@ -0,0 +1,46 @@
+from src.app.integrator import PneumoniaDetector
+from src.app.metrics import Metrics, collect_timings
+from tests.test_grad_cam import _build_tiny_model
+
+
+def test_histogram_renders_prometheus_text():
+    metrics = Metrics(prefix="t", buckets=(0.01, 0.1))
+    metrics.observe("decode", 0.005)
+    metrics.observe("decode", 0.05)
+    metrics.observe("decode", 1.0)
+    metrics.inc("predictions", cache="hit")
+    metrics.inc("predictions", cache="hit")
+    metrics.gauge("queue_depth", lambda: 3, "Cola")
+
+    text = metrics.render_prometheus()
+
+    assert 't_stage_seconds_bucket{stage="decode",le="0.01"} 1' in text
+    assert 't_stage_seconds_bucket{stage="decode",le="0.1"} 2' in text
+    assert 't_stage_seconds_bucket{stage="decode",le="+Inf"} 3' in text
+    assert 't_stage_seconds_count{stage="decode"} 3' in text
+    assert 't_predictions_total{cache="hit"} 2' in text
+    assert "t_queue_depth 3" in text
+
+
+def test_collect_timings_nests_into_outer_request():
+    metrics = Metrics()
+    with collect_timings() as outer:
+        metrics.observe("a", 0.002)
+        with collect_timings() as inner:
+            metrics.observe("b", 0.001)
+
+    assert set(inner) == {"b"}
+    assert outer["a"] == 2.0
+    assert outer["b"] == 1.0
+
+
+def test_detector_attaches_per_request_timings():
+    detector = PneumoniaDetector(model=_build_tiny_model(), record_timings=True)
+
+    result = detector.predict("data/raw/DICOM/normal (2).dcm")
+
+    for name in ("predict", "decode_dicom", "preprocess", "forward_gradcam"):
+        assert name in result.timings
+    # El overlay ya no se pinta en la petición
+    assert "gradcam_overlay" not in result.timings
+    assert result.timings["predict"] >= result.timings["forward_gradcam"]
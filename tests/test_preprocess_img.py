@@ -1,6 +1,7 @@
 import numpy as np
 
-from src.features.preprocess_img import preprocess_image
+from src.data.image import GrayImage
+from src.features.preprocess_img import preprocess_batch, preprocess_image
 
 
 def test_preprocess_image_output_shape_dtype_range():
@@ -18,3 +19,22 @@ def test_preprocess_image_output_shape_dtype_range():
     # Valores normalizados [0, 1]
     assert batch.min() >= 0.0
     assert batch.max() <= 1.0
+
+
+def test_preprocess_batch_matches_single_image_and_reuses_buffer():
+    images = [
+        np.random.randint(0, 256, size=(600, 800, 3), dtype=np.uint8),
+        np.random.randint(0, 256, size=(512, 512), dtype=np.uint8),
+        GrayImage(np.random.randint(0, 256, size=(512, 512), dtype=np.uint8)),
+    ]
+    out = np.empty((4, 512, 512, 1), dtype=np.float32)
+
+    batch = preprocess_batch(images, out=out)
+
+    assert batch.shape == (3, 512, 512, 1)
+    assert batch.dtype == np.float32
+    # Escribe directo en el buffer preasignado
+    assert np.shares_memory(batch, out)
+
+    for i, img in enumerate(images):
+        np.testing.assert_array_equal(batch[i:i + 1], preprocess_image(img))
@@ -1,7 +1,20 @@
+import io
 from pathlib import Path
+import cv2
 import numpy as np
+import pytest
 
-from src.data.read_img import read_dicom_image
+from src.data.read_img import (
+    read_dicom_header,
+    read_dicom_image,
+    read_dicom_lean,
+    read_image,
+    read_image_file,
+    read_gray,
+    read_image_file_fast,
+    reduced_decode_flag,
+    sniff_format,
+)
 
 
 def test_read_dicom_image_returns_rgb_array_and_pil():
@@ -21,3 +34,104 @@ def test_read_dicom_image_returns_rgb_array_and_pil():
     # Validar PIL
     assert pil_image is not None
     assert hasattr(pil_image, "size")
+
+
+def test_read_image_from_bytes_sniffs_format_by_content():
+    dcm_path = next(Path("data/raw/DICOM").glob("*.dcm"))
+    jpg_path = next(Path("data/raw/JPG/normal").glob("*.jpeg"))
+
+    dcm_bytes = dcm_path.read_bytes()
+    jpg_bytes = jpg_path.read_bytes()
+
+    assert sniff_format(dcm_bytes) == "dicom"
+    assert sniff_format(jpg_bytes) == "jpeg"
+
+    # Desde memoria se obtiene lo mismo que leyendo la ruta
+    rgb_mem, _ = read_image(io.BytesIO(dcm_bytes))
+    rgb_disk, _ = read_dicom_image(str(dcm_path))
+    np.testing.assert_array_equal(rgb_mem, rgb_disk)
+
+    rgb_mem, pil = read_image(jpg_bytes)
+    rgb_disk, _ = read_image_file(str(jpg_path))
+    np.testing.assert_array_equal(rgb_mem, rgb_disk)
+    assert pil.size == (rgb_mem.shape[1], rgb_mem.shape[0])
+
+
+def _dicom_16bit_bytes(size: int = 1024) -> bytes:
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1"
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = FileDataset(None, {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.Rows = ds.Columns = size
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 12, 11
+    ds.PixelRepresentation = 0
+    ds.RescaleSlope, ds.RescaleIntercept = 2, -100
+    ds.WindowCenter, ds.WindowWidth = 3000, 4000
+
+    ramp = np.linspace(0, 4095, size, dtype=np.float32).astype(np.uint16)
+    ds.PixelData = np.tile(ramp, (size, 1)).tobytes()
+
+    buf = io.BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
+
+
+def test_read_dicom_lean_applies_rescale_and_voi_window():
+    data = _dicom_16bit_bytes()
+
+    header = read_dicom_header(data)
+    assert (header.rows, header.columns) == (1024, 1024)
+    assert header.slope == 2.0 and header.intercept == -100.0
+
+    gray, pil = read_dicom_lean(data)
+    assert gray.shape == (512, 512)
+    assert gray.dtype == np.uint8
+    assert pil is None
+
+    # Referencia en float sobre el array completo
+    ramp = np.linspace(0, 4095, 1024, dtype=np.float32).astype(np.uint16)
+    hu = ramp.astype(np.float32) * 2 - 100
+    ref = np.clip(((hu - 2999.5) / 3999 + 0.5) * 255, 0, 255)
+    ref = cv2.resize(np.tile(ref, (8, 1)), (512, 8), interpolation=cv2.INTER_AREA)[0]
+    assert np.abs(gray[0].astype(float) - ref).max() <= 2
+
+    _, pil = read_dicom_lean(data, preview=True)
+    assert pil.size == (1024, 1024)
+
+
+def test_read_image_file_fast_decodes_reduced_grayscale():
+    assert reduced_decode_flag(4096, 4096) == cv2.IMREAD_REDUCED_GRAYSCALE_8
+    assert reduced_decode_flag(1241, 1682) == cv2.IMREAD_REDUCED_GRAYSCALE_2
+    assert reduced_decode_flag(640, 1016) == cv2.IMREAD_GRAYSCALE
+
+    jpg_path = Path("data/raw/JPG/normal/NORMAL2-IM-1144-0001.jpeg")
+    gray, pil = read_image_file_fast(str(jpg_path))
+
+    assert gray.shape == (512, 512)
+    assert gray.dtype == np.uint8
+    assert pil is None
+
+    # Cerca de la decodificación completa llevada a gris 512x512
+    rgb, _ = read_image_file(str(jpg_path))
+    ref = cv2.resize(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY), (512, 512), interpolation=cv2.INTER_AREA)
+    assert np.abs(gray.astype(int) - ref.astype(int)).mean() < 2
+
+    _, pil = read_image_file_fast(jpg_path.read_bytes(), preview=True)
+    assert pil.size == (rgb.shape[1], rgb.shape[0])
+
+
+def test_corrupt_image_bytes_raise_value_error():
+    # Cabecera irreconocible y PNG con cabecera válida pero cuerpo truncado
+    png = cv2.imencode(".png", np.full((64, 64), 128, dtype=np.uint8))[1].tobytes()
+    for data in (b"\x89PNG garbage" * 10, png[:40]):
+        with pytest.raises(ValueError, match="No se pudo leer la imagen"):
+            read_image_file_fast(data)
+        with pytest.raises(ValueError):
+            read_gray(data)
@@ -0,0 +1,67 @@
+import threading
+
+from src.models.load_model import converted_artifact_path, load_pneumonia_model
+from src.models.registry import ModelRegistry
+from tests.test_grad_cam import _build_tiny_model
+
+
+def test_registry_loads_once_and_hot_swaps_atomically(tmp_path):
+    v1 = tmp_path / "v1.h5"
+    v2 = tmp_path / "v2.h5"
+    v1.write_bytes(b"pesos-1")
+    v2.write_bytes(b"pesos-2")
+    calls = []
+
+    def fake_load(path, **kwargs):
+        calls.append(path)
+        return {"path": path}
+
+    registry = ModelRegistry(loader=fake_load)
+
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get(str(v1)))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Cuatro accesos concurrentes, una sola carga
+    assert len(calls) == 1
+    assert all(m is models[0] for m in models)
+
+    old_identity = registry.entry(str(v1)).identity
+    in_flight = registry.get(str(v1))
+
+    entry = registry.swap(str(v1), str(v2))
+
+    assert registry.get(str(v1)) is entry.model
+    assert entry.identity != old_identity
+    # La petición en curso conserva su referencia al modelo anterior
+    assert in_flight == {"path": str(v1)}
+    assert registry.stats()["swaps"] == 1
+
+
+def test_load_model_caches_converted_keras_artifact(tmp_path):
+    h5 = tmp_path / "modelo.h5"
+    _build_tiny_model().save(str(h5))
+
+    model = load_pneumonia_model(str(h5), content_hash="abc123def4567890")
+    artifact = converted_artifact_path(str(h5), "abc123def4567890")
+
+    assert artifact.endswith("modelo.abc123def456.keras")
+    assert (tmp_path / "modelo.abc123def456.keras").exists()
+
+    again = load_pneumonia_model(str(h5), content_hash="abc123def4567890")
+    assert [w.shape for w in again.weights] == [w.shape for w in model.weights]
+
+
+def test_prefetch_hashes_without_loading(tmp_path):
+    weights = tmp_path / "w.h5"
+    weights.write_bytes(b"pesos")
+    calls = []
+    registry = ModelRegistry(loader=lambda path, **kwargs: calls.append(path) or {"path": path})
+
+    sha = registry.prefetch(str(weights))
+
+    assert calls == [] and registry.loads == 0
+    assert registry.entry(str(weights)).sha256 == sha
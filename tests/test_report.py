@@ -0,0 +1,40 @@
+import numpy as np
+
+from src.app.report import ReportBuilder, ReportEntry
+
+
+def _entry(i: int) -> ReportEntry:
+    gray = np.full((512, 512), 40 * i, dtype=np.uint8)
+    heat = np.zeros((512, 512, 3), dtype=np.uint8)
+    return ReportEntry(
+        patient_id=str(i),
+        patient_name=f"Paciente {i}",
+        label="normal",
+        probability="90.00",
+        original_key=f"orig:{i}",
+        original=lambda px: gray,
+        heatmap_key=f"heat:{i}",
+        heatmap=lambda px: heat,
+    )
+
+
+def test_report_downscales_and_memoises_images():
+    builder = ReportBuilder(dpi=100)
+
+    first = builder.render([_entry(1)])
+    second = builder.render([_entry(1)])
+
+    assert first.startswith(b"%PDF") and second.startswith(b"%PDF")
+    # Original y heatmap se preparan una vez y luego se reutilizan
+    assert builder.stats() == {"images": 2, "image_hits": 2, "image_misses": 2}
+    assert b"/DCTDecode" in first  # incrustadas como JPEG
+
+
+def test_batch_report_streams_one_page_per_patient():
+    builder = ReportBuilder()
+    entries = [_entry(i) for i in range(3)] + [ReportEntry()]  # la última sin imágenes
+
+    pdf = b"".join(builder.stream(entries, chunk_size=4096))
+
+    assert pdf.startswith(b"%PDF") and pdf.rstrip().endswith(b"%%EOF")
+    assert b"/Count 4" in pdf
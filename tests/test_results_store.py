@@ -0,0 +1,66 @@
+import csv
+import io
+
+import pytest
+
+from src.app.results_store import CSV_HEADER, ResultRecord, ResultsStore, csv_chunks
+
+
+def _record(i: int, patient: str = "1010", day: int = 1) -> ResultRecord:
+    return ResultRecord(
+        result_id=f"{i:032x}",
+        label="viral" if i % 2 else "normal",
+        probability=50.0 + i / 100,
+        patient_id=patient,
+        created_at=f"2026-10-{day:02d}T08:00:00.{i % 1000:03d}+00:00",
+        image=f"uploads/{i:032x}.png",
+    )
+
+
+def test_batched_writer_persists_and_filters(tmp_path):
+    store = ResultsStore(tmp_path / "r.sqlite3", batch_size=50, flush_interval=0.05)
+    for i in range(120):
+        store.record(_record(i, patient="1010" if i < 100 else "2020", day=1 + i // 40))
+    store.flush()
+
+    stats = store.stats()
+    assert stats["rows"] == 120 and stats["errors"] == 0
+    assert stats["batches"] < 120  # agrupado en transacciones
+
+    assert store.get(f"{5:032x}").label == "viral"
+    assert store.get("no-existe") is None
+
+    # Por cédula, en orden cronológico, atravesando varias páginas
+    ids = [r.result_id for r in store.iter_records(patient_id="1010", page_size=7)]
+    assert ids == [f"{i:032x}" for i in range(100)]
+
+    # Rango de fechas: el límite superior sin hora cubre el día entero
+    day2 = list(store.iter_records(since="2026-10-02", until="2026-10-02"))
+    assert len(day2) == 40 and all(r.created_at.startswith("2026-10-02") for r in day2)
+
+    with pytest.raises(ValueError):
+        store.iter_records(since="ayer")
+
+    store.close()
+    # Un proceso nuevo ve el historial
+    reopened = ResultsStore(tmp_path / "r.sqlite3")
+    assert reopened.stats()["rows"] == 120
+    reopened.close()
+
+
+def test_cohort_csv_is_streamed_in_chunks(tmp_path):
+    store = ResultsStore(tmp_path / "r.sqlite3", flush_interval=0.01)
+    for i in range(25):
+        store.record(_record(i))
+    store.flush()
+
+    chunks = list(store.export_csv(page_size=10, patient_id="1010"))
+    assert len(chunks) == 3  # 10 + 10 + 5 filas
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert tuple(rows[0]) == CSV_HEADER
+    assert len(rows) == 26
+    assert rows[1][0] == "1010" and rows[1][4] == "50.00%"
+
+    single = "".join(csv_chunks([_record(3)]))
+    assert single.splitlines()[1].startswith("1010,,2026-10-01")
+    store.close()
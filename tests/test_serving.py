@@ -0,0 +1,148 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import cv2
+import numpy as np
+
+from benchmarks.serving import _free_port, _multipart, parse_layouts, start_server, stop_server
+from src.app.serving import thread_budget
+
+# App mínima (sin TF): cada respuesta dice qué worker la atendió
+_SERVER = """
+import sys
+from flask import Flask
+from src.app.serving import serve, thread_budget
+
+def load_app():
+    import os
+    app = Flask("prueba")
+    app.get("/")(lambda: {"pid": os.getpid()})
+    return app
+
+sys.exit(serve(load_app, port=int(sys.argv[1]), budget=thread_budget(2, cores=2), preload_modules=False))
+"""
+
+
+def test_thread_budget_splits_cores_between_workers():
+    assert thread_budget(4, cores=8).to_dict() == {"workers": 4, "intra_op": 2, "inter_op": 1, "cv2": 1}
+    assert thread_budget(1, cores=8).to_dict() == {"workers": 1, "intra_op": 8, "inter_op": 2, "cv2": 4}
+    # Más workers que núcleos: nunca menos de un hilo
+    assert thread_budget(16, cores=4).intra_op == 1
+    assert thread_budget(2, cores=8, intra_op=1, cv2_threads=3).to_dict() == {
+        "workers": 2, "intra_op": 1, "inter_op": 2, "cv2": 3,
+    }
+    assert parse_layouts("2x1, 1x2,4") == [(2, 1), (1, 2), (4, 0)]
+
+
+def _pids(port, n=12):
+    pids = set()
+    for _ in range(n):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as r:
+                pids.add(json.load(r)["pid"])
+        except OSError:
+            time.sleep(0.2)
+    return pids
+
+
+def test_prefork_serves_from_several_workers_and_replaces_dead_ones():
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, "-c", _SERVER, str(port)], cwd=os.getcwd())
+    try:
+        deadline = time.monotonic() + 30
+        pids = set()
+        while len(pids) < 2 and time.monotonic() < deadline:
+            pids |= _pids(port)
+        assert len(pids) == 2 and proc.pid not in pids
+
+        # Un worker que muere se reemplaza por otro
+        dead = pids.pop()
+        os.kill(dead, signal.SIGKILL)
+        seen = set()
+        while not (seen - pids - {dead}) and time.monotonic() < deadline + 30:
+            seen |= _pids(port, 4)
+        assert seen - pids - {dead}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=30) == 0
+
+
+def _fetch(port, path, body=None, content_type=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=body)
+    if content_type:
+        request.add_header("Content-Type", content_type)
+    try:
+        with urllib.request.urlopen(request, timeout=60) as r:
+            return r.status, r.read()
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read()
+
+
+def test_jobs_and_heatmaps_are_visible_from_every_worker(tmp_path):
+    from benchmarks.pipeline import stand_in_model
+
+    model_path = str(tmp_path / "stand_in.keras")
+    stand_in_model().save(model_path)
+    png = cv2.imencode(".png", np.random.default_rng(0).integers(0, 256, (256, 256), dtype=np.uint8))[1].tobytes()
+
+    proc, port = start_server(2, 1, model_path, tmp_path)
+    try:
+        status, body = _fetch(port, "/jobs", *_multipart("rx.png", png))
+        assert status == 202
+        job_id = json.loads(body)["job_id"]
+
+        # Cada urlopen abre otra conexión: la consulta cae en cualquier worker
+        deadline = time.monotonic() + 60
+        job = {"status": "queued"}
+        while job["status"] not in ("done", "error") and time.monotonic() < deadline:
+            status, body = _fetch(port, f"/jobs/{job_id}")
+            assert status == 200
+            job = json.loads(body)
+        assert job["status"] == "done"
+
+        result = job["result"]
+        for _ in range(8):
+            status, body = _fetch(port, result["heatmap_url"])
+            assert status == 200 and body
+            status, body = _fetch(port, f"/export-pdf?result_id={result['result_id']}")
+            assert status == 200 and body.startswith(b"%PDF")
+    finally:
+        stop_server(proc)
+
+
+def test_model_reload_reaches_every_worker(tmp_path, monkeypatch):
+    from benchmarks.pipeline import stand_in_model
+
+    model_a, model_b = str(tmp_path / "a.keras"), str(tmp_path / "b.keras")
+    stand_in_model(seed=0).save(model_a)
+    stand_in_model(seed=1).save(model_b)
+    monkeypatch.setenv("UAO_ADMIN_TOKEN", "secreto")
+    monkeypatch.setenv("UAO_MODEL_CHECK_SECONDS", "0.2")
+
+    proc, port = start_server(2, 1, model_a, tmp_path)
+    try:
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}/admin/reload-model",
+            data=json.dumps({"path": model_b}).encode(),
+            headers={"Content-Type": "application/json", "X-Admin-Token": "secreto"},
+        )
+        with urllib.request.urlopen(request, timeout=60) as r:
+            assert model_b in json.load(r)["model"]
+
+        # El worker que no recibió la petición aplica el modelo publicado
+        on_b = set()
+        deadline = time.monotonic() + 60
+        while len(on_b) < 2 and time.monotonic() < deadline:
+            status, body = _fetch(port, "/ready")
+            worker = json.loads(body)["worker"]
+            if model_b in (worker["model"] or ""):
+                on_b.add(worker["pid"])
+        assert len(on_b) == 2
+    finally:
+        stop_server(proc)
@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+
+from src.app.integrator import PneumoniaDetector
+from src.app.studies import predict_studies
+from src.data.read_img import iter_dicom_frames, read_dicom_image, read_dicom_lean
+from src.data.series import group_studies
+from tests.test_grad_cam import _build_tiny_model
+
+
+def _dicom_bytes(study_uid: str, frames: int = 1, instance: int = 1, size: int = 64) -> bytes:
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1"
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = FileDataset(None, {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.StudyInstanceUID = study_uid
+    ds.SeriesInstanceUID = study_uid + ".1"
+    ds.InstanceNumber = instance
+    ds.Rows = ds.Columns = size
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = 8, 8, 7
+    ds.PixelRepresentation = 0
+    if frames > 1:
+        ds.NumberOfFrames = frames
+    # Cada frame con un nivel de gris distinto para reconocerlo
+    pixels = np.stack([np.full((size, size), 40 * (i % 6 + 1), np.uint8) for i in range(frames)])
+    ds.PixelData = pixels.tobytes()
+
+    buf = io.BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
+
+
+def test_multiframe_dicom_is_read_frame_by_frame():
+    data = _dicom_bytes("1.2.3", frames=3)
+
+    frames = list(iter_dicom_frames(data, size=32))
+    assert [i for i, _ in frames] == [0, 1, 2]
+    assert [int(g.max()) for _, g in frames] == [255, 255, 255]  # sin ventana: 0..máximo por frame
+    assert all(g.shape == (32, 32) for _, g in frames)
+
+    # Los lectores de una sola imagen toman el primer frame en lugar de fallar
+    rgb, _ = read_dicom_image(data)
+    assert rgb.shape == (64, 64, 3)
+    gray, _ = read_dicom_lean(data, size=32)
+    assert gray.shape == (32, 32)
+
+
+def test_series_grouped_by_study_and_scored_in_batches():
+    sources = {
+        "b.dcm": _dicom_bytes("1.2.3", instance=2),
+        "a.dcm": _dicom_bytes("1.2.3", frames=4, instance=1),
+        "otro.dcm": _dicom_bytes("9.9.9"),
+        "notas.txt": b"no es un DICOM",
+    }
+    studies = group_studies(sources)
+    assert sorted(studies) == ["1.2.3", "9.9.9"]
+    # Orden de la serie: instancia 1 (4 frames) y luego la instancia 2
+    assert [(r.name, r.frame) for r in studies["1.2.3"]] == [
+        ("a.dcm", 0), ("a.dcm", 1), ("a.dcm", 2), ("a.dcm", 3), ("b.dcm", 0),
+    ]
+
+    model = _build_tiny_model()
+    detector = PneumoniaDetector(model=model)
+    seen = []
+    results = {
+        s.study_uid: s
+        for s in predict_studies(
+            detector, sources, batch_size=2,
+            on_frame=lambda ref, r: seen.append(r.cam.shape) or {"id": f"{ref.name}:{ref.frame}"},
+        )
+    }
+
+    study = results["1.2.3"].to_dict()
+    assert study["frames"] == 5 and len(seen) == 6
+    assert study["per_frame"][4]["id"] == "b.dcm:0"
+    assert sum(study["votes"].values()) == 5
+    assert abs(sum(study["mean_probabilities"].values()) - 100.0) <= 0.02  # redondeo a 2 decimales
+    assert study["label"] == max(study["mean_probabilities"], key=study["mean_probabilities"].get)
+
+    # Por frame coincide con la predicción imagen a imagen
+    single = detector.predict(sources["otro.dcm"])
+    assert abs(results["9.9.9"].frames[0].probability - single.probability) < 1e-3
@@ -0,0 +1,89 @@
+import os
+import types
+
+import cv2
+import numpy as np
+
+from src.data.read_img import read_gray
+from src.features.preprocess_img import preprocess_image
+from src.features import tensor_cache
+from src.features.tensor_cache import TensorCache
+from src.models.evaluate import evaluate
+
+LABELS = {0: "bacteriana", 1: "normal", 2: "viral"}
+
+
+def _write_dataset(root):
+    paths = []
+    for folder, level in (("bacteria", 40), ("normal", 120), ("virus", 200)):
+        (root / folder).mkdir(parents=True)
+        for i in range(3):
+            path = root / folder / f"{folder}_{i}.png"
+            img = np.full((600, 600), level + i, np.uint8)
+            img[100:200, 100:200] = 255 - level
+            cv2.imwrite(str(path), img)
+            paths.append(os.path.normpath(str(path)))
+    return sorted(paths)
+
+
+def test_shards_are_reused_and_only_changed_files_rebuilt(tmp_path):
+    paths = _write_dataset(tmp_path / "raw")
+    cache = TensorCache(tmp_path / "cache", shard_size=4)
+
+    first = cache.build(paths, batch_size=2)
+    assert first["reused"] == 0 and first["processed"] == 9
+    assert cache.stats()["shards"] == 3
+
+    # Los lotes son los mismos tensores que produce preprocess_image
+    batches = list(cache.iter_batches(paths, batch_size=4))
+    assert sum(len(entries) for entries, _ in batches) == 9
+    entries, batch = batches[0]
+    assert isinstance(batch, np.memmap) or isinstance(batch.base, np.memmap)
+    np.testing.assert_array_equal(batch[0], preprocess_image(read_gray(entries[0].path))[0])
+
+    # Otra instancia (otro proceso) no reprocesa nada
+    again = TensorCache(tmp_path / "cache", shard_size=4)
+    assert again.build(paths)["processed"] == 0
+
+    # Un archivo modificado se reprocesa solo él
+    cv2.imwrite(paths[0], np.zeros((600, 600), np.uint8))
+    os.utime(paths[0], ns=(1, 1))
+    rebuilt = again.build(paths)
+    assert rebuilt["reused"] == 8 and rebuilt["processed"] == 1
+    entries = {e.path: e for batch_entries, _ in again.iter_batches(paths) for e in batch_entries}
+    np.testing.assert_array_equal(
+        again.shard(entries[paths[0]].shard)[entries[paths[0]].index],
+        preprocess_image(read_gray(paths[0]))[0],
+    )
+
+
+def test_evaluate_reports_accuracy_and_confusion(tmp_path):
+    paths = _write_dataset(tmp_path / "raw")
+
+    def predict(batch):
+        # Clasifica por brillo medio: acierta bacteria y virus, confunde normal con viral
+        mean = batch.reshape(len(batch), -1).mean(axis=1)
+        out = np.zeros((len(batch), 3), np.float32)
+        out[np.arange(len(batch)), np.where(mean < 0.3, 0, 2)] = 1.0
+        return out
+
+    report = evaluate(predict, paths, LABELS, TensorCache(tmp_path / "cache"), batch_size=4)
+    assert report["images"] == report["labelled"] == 9
+    assert report["confusion"]["bacteriana"]["bacteriana"] == 3
+    assert report["confusion"]["normal"]["viral"] == 3
+    assert report["accuracy"] == round(6 / 9, 4)
+    assert report["per_class"] == {"bacteriana": 1.0, "normal": 0.0, "viral": 1.0}
+    assert report["images_per_sec"] > 0
+
+
+def test_decoder_change_invalidates_the_cache(tmp_path, monkeypatch):
+    paths = _write_dataset(tmp_path / "raw")
+    TensorCache(tmp_path / "cache").build(paths)
+
+    # Otro código de lectura (p. ej. otra decodificación reducida): otros tensores
+    decoder = tmp_path / "read_img.py"
+    decoder.write_text("# otra decodificación\n", encoding="utf-8")
+    modules = (types.SimpleNamespace(__file__=str(decoder)),) + tensor_cache._PIXEL_MODULES[1:]
+    monkeypatch.setattr(tensor_cache, "_PIXEL_MODULES", modules)
+
+    assert TensorCache(tmp_path / "cache").build(paths)["processed"] == 9
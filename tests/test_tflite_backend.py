@@ -0,0 +1,81 @@
+import shutil
+
+import numpy as np
+
+from src.app.integrator import LABELS, PneumoniaDetector
+from src.models.tflite_backend import (
+    TFLiteModel,
+    agreement_report,
+    calibration_fingerprint,
+    convert_model,
+    label_from_path,
+    load_tflite_model,
+    tflite_artifact_path,
+)
+from tests.test_grad_cam import _build_tiny_model
+
+PATHS = [
+    "data/raw/JPG/normal/NORMAL2-IM-1144-0001.jpeg",
+    "data/raw/JPG/virus/person1499_virus_2609.jpeg",
+    "data/raw/DICOM/viral (2).dcm",
+]
+
+
+def test_float16_backend_matches_keras():
+    model = _build_tiny_model()
+    tflite = load_tflite_model(model, "float16")
+    batch = np.random.rand(2, 512, 512, 1).astype(np.float32)
+
+    np.testing.assert_allclose(
+        tflite.predict(batch), model(batch, training=False).numpy(), atol=1e-2
+    )
+
+
+def test_int8_backend_is_calibrated_and_agrees():
+    model = _build_tiny_model()
+    tflite = TFLiteModel(convert_model(model, "int8", "data/raw", calibration_limit=4))
+
+    report = agreement_report(
+        lambda batch: model(batch, training=False).numpy(), tflite.predict, PATHS, LABELS
+    )
+
+    assert report["images"] == 3
+    assert report["labelled"] == 3
+    assert report["prob_diff_pp"]["max"] < 5.0
+
+
+def test_label_from_path():
+    assert label_from_path("data/raw/JPG/bacteria/person1_bacteria_1.jpeg") == "bacteriana"
+    assert label_from_path("data/raw/DICOM/viral (2).dcm") == "viral"
+    assert label_from_path("otros/imagen.png") is None
+
+
+def test_detector_tflite_backend_keeps_keras_gradcam():
+    model = _build_tiny_model()
+    detector = PneumoniaDetector(model=model, backend="tflite-float16")
+
+    result = detector.predict(PATHS[0])
+
+    assert result.label in LABELS.values()
+    assert result.heatmap.shape == (512, 512, 3)
+    # Las claves de caché no se mezclan con las del modelo float32
+    assert detector.model_id.endswith(":tflite-float16")
+
+
+def test_int8_artifact_depends_on_calibration_set(tmp_path):
+    calib = tmp_path / "calib"
+    calib.mkdir()
+    shutil.copy(PATHS[0], calib / "a.jpeg")
+    first = calibration_fingerprint(str(calib))
+    assert calibration_fingerprint(str(calib)) == first
+    assert calibration_fingerprint(str(calib), limit=1) != first
+
+    shutil.copy(PATHS[1], calib / "b.jpeg")
+    second = calibration_fingerprint(str(calib))
+    assert second != first
+
+    sha = "ab" * 32
+    assert tflite_artifact_path("models/m.h5", sha, "float16") == "models/m.abababababab.float16.tflite"
+    assert tflite_artifact_path("models/m.h5", sha, "int8", first) != tflite_artifact_path(
+        "models/m.h5", sha, "int8", second
+    )
@@ -1,34 +1,431 @@
+import atexit
 import sys
 import os
 import csv
 import uuid
 import io
+import json
+import threading
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+_IMPORT_STARTED = time.perf_counter()
+
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from flask import Flask, render_template, request, redirect, url_for, Response, send_file
+from flask import (Flask, render_template, request, redirect, url_for, Response, send_file, jsonify,
+                   stream_with_context)
 from PIL import Image
 import numpy as np
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle, HRFlowable
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
 
-from src.app.integrator import PneumoniaDetector
+from src.app.batch_upload import BatchLimitError, BatchLimits, iter_zip_members, open_zip, score_stream
+from src.app.cache import ResultCache
+from src.app.artifacts import ArtifactStore
+from src.app.heatmaps import FORMATS, HeatmapStore
+from src.app.integrator import BatchScheduler, PneumoniaDetector
+from src.app.jobs import DONE, ERROR, JobQueue, QueueFullError
+from src.app.report import ReportBuilder, ReportEntry
+from src.app.results_store import ResultRecord, ResultsStore, csv_chunks
+from src.app.serving import configure_threads, thread_budget
+from src.app.metrics import METRICS, timed
+from src.app.startup import StartupTimer
+from src.app.studies import predict_study
+from src.data.read_img import read_gray
+from src.data.series import group_studies
+from src.visualizations.grad_cam import render_cam
+
+startup = StartupTimer()
+startup.record("imports", (time.perf_counter() - _IMPORT_STARTED) * 1000.0)
 
 app = Flask(__name__)
+app.config["MODEL_PATH"] = os.environ.get("UAO_MODEL_PATH", "models/conv_MLP_84.h5")
+# Token para /admin/reload-model (sin token el endpoint queda deshabilitado)
+app.config["ADMIN_TOKEN"] = os.environ.get("UAO_ADMIN_TOKEN") or None
 app.config["UPLOAD_FOLDER"] = "ui/static/uploads"
 app.config["HEATMAP_FOLDER"] = "ui/static/heatmaps"
+# Resultados cuyo CAM se retiene en memoria para renderizar heatmaps bajo demanda
+app.config["HEATMAP_MAX_RESULTS"] = int(os.environ.get("UAO_HEATMAP_MAX_RESULTS", "512"))
+# Formato de los heatmaps ("png" o "webp"), nivel PNG (0-9) y calidad WebP
+app.config["HEATMAP_FORMAT"] = os.environ.get("UAO_HEATMAP_FORMAT", "png")
+app.config["HEATMAP_PNG_LEVEL"] = int(os.environ.get("UAO_HEATMAP_PNG_LEVEL", "1"))
+app.config["HEATMAP_WEBP_QUALITY"] = int(os.environ.get("UAO_HEATMAP_WEBP_QUALITY", "80"))
+# Cuotas (MB) y TTL desde el último acceso (horas, 0 = sin TTL) de uploads y heatmaps
+app.config["UPLOADS_MAX_MB"] = float(os.environ.get("UAO_UPLOADS_MAX_MB", "2048"))
+app.config["HEATMAPS_MAX_MB"] = float(os.environ.get("UAO_HEATMAPS_MAX_MB", "1024"))
+app.config["ARTIFACT_TTL_HOURS"] = float(os.environ.get("UAO_ARTIFACT_TTL_HOURS", "168"))
+# Reportes PDF: resolución de las imágenes incrustadas y tamaño máximo de un lote
+app.config["REPORT_DPI"] = int(os.environ.get("UAO_REPORT_DPI", "150"))
+app.config["REPORT_MAX_ITEMS"] = int(os.environ.get("UAO_REPORT_MAX_ITEMS", "200"))
+# Micro-batching: tamaño máximo de lote y espera máxima para agrupar peticiones
+app.config["BATCH_MAX_SIZE"] = int(os.environ.get("UAO_BATCH_MAX_SIZE", "8"))
+app.config["BATCH_MAX_WAIT_MS"] = float(os.environ.get("UAO_BATCH_MAX_WAIT_MS", "5"))
+# Caché de resultados por contenido (re-subidas del mismo estudio)
+app.config["CACHE_MAX_ENTRIES"] = int(os.environ.get("UAO_CACHE_MAX_ENTRIES", "256"))
+app.config["CACHE_MAX_BYTES"] = int(os.environ.get("UAO_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+app.config["CACHE_DIR"] = os.environ.get("UAO_CACHE_DIR") or None
+# Guardar el original subido (se hace fuera del camino de la petición)
+app.config["PERSIST_UPLOADS"] = os.environ.get("UAO_PERSIST_UPLOADS", "1") != "0"
+# Modo asíncrono (/jobs): hilos de análisis y trabajos en espera admitidos
+app.config["JOB_WORKERS"] = int(os.environ.get("UAO_JOB_WORKERS", "2"))
+app.config["JOB_MAX_QUEUE"] = int(os.environ.get("UAO_JOB_MAX_QUEUE", "16"))
+# Estudios DICOM (/study): frames por forward y máximo de frames por petición
+app.config["STUDY_BATCH_SIZE"] = int(os.environ.get("UAO_STUDY_BATCH_SIZE", "8"))
+app.config["STUDY_MAX_FRAMES"] = int(os.environ.get("UAO_STUDY_MAX_FRAMES", "256"))
+# Lotes (/batch, ZIP o multipart): imágenes por forward y límites de tamaño
+app.config["BATCH_UPLOAD_SIZE"] = int(os.environ.get("UAO_BATCH_UPLOAD_SIZE", "8"))
+app.config["BATCH_MAX_MB"] = float(os.environ.get("UAO_BATCH_MAX_MB", "512"))
+app.config["BATCH_MAX_FILES"] = int(os.environ.get("UAO_BATCH_MAX_FILES", "1000"))
+app.config["BATCH_MAX_FILE_MB"] = float(os.environ.get("UAO_BATCH_MAX_FILE_MB", "64"))
+# Warm-up al arrancar (carga del modelo + lote de prueba) en segundo plano
+app.config["WARMUP"] = os.environ.get("UAO_WARMUP", "1") != "0"
+# Motor de inferencia: "eager" o "compiled" (tf.function, XLA opcional)
+app.config["ENGINE"] = os.environ.get("UAO_ENGINE", "eager")
+app.config["XLA"] = os.environ.get("UAO_XLA", "0") == "1"
+# Backend de la predicción: "keras", "tflite-float16" o "tflite-int8"
+app.config["BACKEND"] = os.environ.get("UAO_BACKEND", "keras")
+app.config["CALIBRATION_DIR"] = os.environ.get("UAO_CALIBRATION_DIR", "data/raw")
+# Incluir los ms por etapa en cada resultado (las métricas agregadas van siempre en /metrics)
+app.config["REQUEST_TIMINGS"] = os.environ.get("UAO_REQUEST_TIMINGS", "0") == "1"
+# Historial de resultados (SQLite); se escribe por lotes en segundo plano
+app.config["RESULTS_DB"] = os.environ.get("UAO_RESULTS_DB", "ui/results.sqlite3")
+# Procesos de `python main.py serve` e hilos de TF/OpenCV por proceso (0 = derivar de los núcleos)
+app.config["WORKERS"] = int(os.environ.get("UAO_WORKERS", "1"))
+app.config["TF_INTRA_THREADS"] = int(os.environ.get("UAO_TF_INTRA_THREADS", "0"))
+app.config["TF_INTER_THREADS"] = int(os.environ.get("UAO_TF_INTER_THREADS", "0"))
+app.config["CV2_THREADS"] = int(os.environ.get("UAO_CV2_THREADS", "0"))
+# Con varios workers: segundos entre relecturas de las carpetas de artefactos
+# (archivos y cuota compartidos) y carpeta donde se publica el estado de /jobs
+app.config["ARTIFACT_RESCAN_SECONDS"] = float(os.environ.get("UAO_ARTIFACT_RESCAN_SECONDS", "5"))
+app.config["JOB_FOLDER"] = os.environ.get("UAO_JOB_FOLDER", "ui/jobs")
+# Con varios workers: modelo vigente publicado por /admin/reload-model y
+# segundos entre comprobaciones (de ese archivo y del mtime de los pesos)
+app.config["MODEL_STATE"] = os.environ.get("UAO_MODEL_STATE", "ui/model.json")
+app.config["MODEL_CHECK_SECONDS"] = float(os.environ.get("UAO_MODEL_CHECK_SECONDS", "2"))
+
+# Antes de que el warm-up inicie TF (bajo `serve`, el worker ya lo aplicó y esto lo devuelve)
+threads = configure_threads(thread_budget(
+    workers=app.config["WORKERS"],
+    intra_op=app.config["TF_INTRA_THREADS"] or None,
+    inter_op=app.config["TF_INTER_THREADS"] or None,
+    cv2_threads=app.config["CV2_THREADS"] or None,
+))
+
+# Varios workers comparten las carpetas: cada uno relee lo que escriben los
+# demás (la cuota cuenta todos los archivos) y persiste los CAMs antes de
+# responder, porque la siguiente petición puede llegar a otro proceso
+shared = app.config["WORKERS"] > 1
+
+# Carpetas de artefactos con cuota y TTL (se crean si no existen)
+_ttl = app.config["ARTIFACT_TTL_HOURS"] * 3600 or None
+_rescan = app.config["ARTIFACT_RESCAN_SECONDS"] if shared else None
+uploads = ArtifactStore(app.config["UPLOAD_FOLDER"],
+                        max_bytes=int(app.config["UPLOADS_MAX_MB"] * 1024 * 1024), ttl_seconds=_ttl,
+                        rescan_seconds=_rescan)
+heatmap_files = ArtifactStore(app.config["HEATMAP_FOLDER"],
+                              max_bytes=int(app.config["HEATMAPS_MAX_MB"] * 1024 * 1024), ttl_seconds=_ttl,
+                              rescan_seconds=_rescan)
+
+result_cache = ResultCache(
+    max_entries=app.config["CACHE_MAX_ENTRIES"],
+    max_bytes=app.config["CACHE_MAX_BYTES"],
+    disk_dir=app.config["CACHE_DIR"],
+)
+# El modelo se carga en el warm-up (o en la primera petición), no al importar
+detector = PneumoniaDetector(
+    model_path=app.config["MODEL_PATH"],
+    cache=result_cache,
+    lazy=True,
+    timer=startup,
+    engine=app.config["ENGINE"],
+    jit_compile=app.config["XLA"],
+    backend=app.config["BACKEND"],
+    calibration_dir=app.config["CALIBRATION_DIR"],
+    record_timings=app.config["REQUEST_TIMINGS"],
+)
+# CAMs crudos por resultado; el overlay se pinta al pedirlo (/heatmap/<id>.png)
+# y el render por defecto se codifica en segundo plano
+heatmaps = HeatmapStore(
+    max_results=app.config["HEATMAP_MAX_RESULTS"],
+    artifacts=heatmap_files,
+    image_format=app.config["HEATMAP_FORMAT"],
+    png_level=app.config["HEATMAP_PNG_LEVEL"],
+    webp_quality=app.config["HEATMAP_WEBP_QUALITY"],
+)
+reports = ReportBuilder(dpi=app.config["REPORT_DPI"])
+results_store = ResultsStore(app.config["RESULTS_DB"])
+atexit.register(results_store.close)
+# Escrituras a disco que no deben bloquear la respuesta
+io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="uploads-io")
+
+
+scheduler = BatchScheduler(
+    detector,
+    max_batch_size=app.config["BATCH_MAX_SIZE"],
+    max_wait_ms=app.config["BATCH_MAX_WAIT_MS"],
+)
+
+
+def save_heatmap(result_id, entry):
+    """
+    Persiste el CAM (`entry`, lo que retornó `heatmaps.put`): en segundo
+    plano con un worker, antes de responder con varios.
+    """
+    if shared:
+        heatmaps.save(result_id, entry)
+    else:
+        io_executor.submit(heatmaps.save, result_id, entry)
+
+
+def analyze_upload(data, filename, patient_id="", patient_name=""):
+    """
+    Ejecuta el análisis de una imagen subida y guarda sus artefactos.
+
+    Returns:
+        dict con los datos que muestra la plantilla / la API de trabajos.
+    """
+    # Inferencia directa desde memoria (el formato se detecta por contenido)
+    result = scheduler.predict(data)
+
+    # Nombre único para evitar colisiones; el original se guarda en segundo plano
+    result_id = uuid.uuid4().hex
+    ext = Path(filename).suffix.lower()
+    unique_name = f"{result_id}{ext}"
+    if app.config["PERSIST_UPLOADS"]:
+        io_executor.submit(uploads.write, unique_name, data)
+
+    prob_value = result.probability
+    prob_class = "danger" if prob_value > 70 else "ok"
+
+    # Solo el CAM crudo: el heatmap se pinta cuando el navegador o el PDF lo piden
+    entry = heatmaps.put(result_id, result.cam, result.image)
+    heatmaps.prerender(result_id)
+    save_heatmap(result_id, entry)
+
+    image_rel = f"uploads/{unique_name}"
+    results_store.record(ResultRecord(
+        result_id=result_id,
+        label=result.label,
+        probability=round(prob_value, 2),
+        patient_id=patient_id,
+        patient_name=patient_name,
+        model_id=detector.model_id,
+        image=image_rel if app.config["PERSIST_UPLOADS"] else "",
+        heatmap=f"heatmaps/{result_id}.npz",
+    ))
 
-# Crear carpetas si no existen
-Path(app.config["UPLOAD_FOLDER"]).mkdir(parents=True, exist_ok=True)
-Path(app.config["HEATMAP_FOLDER"]).mkdir(parents=True, exist_ok=True)
-
-detector = PneumoniaDetector(model_path="models/conv_MLP_84.h5")
+    response = {
+        "label": result.label,
+        "probability": f"{prob_value:.2f}",
+        "prob_class": prob_class,
+        "image": image_rel,
+        "result_id": result_id,
+        "heatmap_url": f"/heatmap/{result_id}.{heatmaps.image_format}",
+        "patient_id": patient_id,
+        "patient_name": patient_name,
+    }
+    if result.timings is not None:
+        response["timings_ms"] = result.timings
+    return response
+
+
+def register_result(result, patient_id="", patient_name=""):
+    """
+    Guarda el CAM y el registro de un resultado de estudio o de lote;
+    retorna sus campos para la respuesta.
+    """
+    result_id = uuid.uuid4().hex
+    save_heatmap(result_id, heatmaps.put(result_id, result.cam, result.image))
+    results_store.record(ResultRecord(
+        result_id=result_id,
+        label=result.label,
+        probability=round(result.probability, 2),
+        patient_id=patient_id,
+        patient_name=patient_name,
+        model_id=detector.model_id,
+        heatmap=f"heatmaps/{result_id}.npz",
+    ))
+    return {"result_id": result_id, "heatmap_url": f"/heatmap/{result_id}.{heatmaps.image_format}"}
+
+
+jobs = JobQueue(
+    lambda payload: analyze_upload(**payload),
+    workers=app.config["JOB_WORKERS"],
+    max_queue=app.config["JOB_MAX_QUEUE"],
+    store=ArtifactStore(app.config["JOB_FOLDER"], ttl_seconds=_ttl, rescan_seconds=_rescan) if shared else None,
+)
+
+
+warmup_done = threading.Event()
+warmup_error = None
+
+
+def run_warmup():
+    """Carga el modelo y ejecuta un lote de prueba; marca la app como lista."""
+    global warmup_error
+    try:
+        detector.warmup()
+        app.logger.info("Arranque por fases: %s", startup.as_dict())
+    except Exception as exc:  # noqa: BLE001 - se reporta en /ready
+        warmup_error = f"{type(exc).__name__}: {exc}"
+        app.logger.error("Warm-up fallido: %s", warmup_error)
+    finally:
+        warmup_done.set()
+
+
+if app.config["WARMUP"]:
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
+
+
+def publish_model(path):
+    """
+    Publica (escritura atómica) los pesos vigentes para los demás workers.
+    Se marca con el pid del proceso padre de `serve`, para que un archivo
+    de una ejecución anterior no pise UAO_MODEL_PATH al arrancar.
+    """
+    state = Path(app.config["MODEL_STATE"])
+    state.parent.mkdir(parents=True, exist_ok=True)
+    tmp = state.with_name(f"{state.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"path": path, "server": os.getppid()}), encoding="utf-8")
+    os.replace(tmp, state)
+
+
+def watch_model():
+    """
+    Con varios workers, /admin/reload-model solo llega a uno: los demás
+    siguen aquí los pesos publicados y recargan los suyos si cambian en disco.
+    """
+    published = None
+    while True:
+        time.sleep(app.config["MODEL_CHECK_SECONDS"])
+        if not detector.model_loaded:
+            continue
+        try:
+            try:
+                state = json.loads(Path(app.config["MODEL_STATE"]).read_text(encoding="utf-8"))
+                path = state["path"] if state.get("server") == os.getppid() else None
+            except (OSError, ValueError, KeyError, AttributeError):
+                path = None
+            current = detector.registry.peek(detector.model_path)
+            if path and path != published and current is not None and path != current.path:
+                detector.swap_model(path)
+                app.logger.info("Modelo cambiado a %s (publicado por otro worker)", path)
+            elif detector.registry.reload_if_changed(detector.model_path):
+                app.logger.info("Pesos recargados: %s", detector.model_id)
+            published = path
+        except Exception:  # noqa: BLE001 - el hilo sigue vigilando
+            app.logger.exception("No se pudo aplicar el modelo publicado")
+            published = path
+
+
+if shared:
+    threading.Thread(target=watch_model, name="model-watch", daemon=True).start()
+
+
+METRICS.gauge("scheduler_queue_depth", lambda: scheduler.stats()["queue_depth"],
+              "Tensores esperando lote en el micro-batching.")
+METRICS.gauge("jobs_queue_depth", lambda: jobs.stats()["queue_depth"],
+              "Trabajos asíncronos en espera.")
+METRICS.gauge("cache_hit_rate", lambda: result_cache.stats()["hit_rate"],
+              "Tasa de aciertos de la caché de resultados.")
+for _name, _store in (("uploads", uploads), ("heatmaps", heatmap_files)):
+    METRICS.gauge(f"{_name}_disk_bytes", lambda s=_store: s.stats()["bytes"],
+                  f"Bytes en disco de {_name}.")
+    METRICS.gauge(f"{_name}_evictions", lambda s=_store: sum(s.stats()["evictions"].values()),
+                  f"Archivos de {_name} borrados por cuota o TTL.")
+METRICS.gauge("model_ready", lambda: float(warmup_done.is_set() and warmup_error is None),
+              "1 si el warm-up terminó sin errores.")
+
+
+@app.after_request
+def count_request(response):
+    METRICS.inc("http_requests", endpoint=request.endpoint or "none", status=response.status_code)
+    return response
+
+
+@app.route("/metrics")
+def metrics():
+    """Métricas en formato de texto Prometheus (latencia por etapa, contadores)."""
+    return Response(METRICS.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/heatmap/<result_id>.<ext>")
+def heatmap(result_id, ext):
+    """
+    Overlay Grad-CAM de un resultado (.png o .webp), pintado bajo demanda.
+    Parámetros opcionales: size, colormap, threshold y alpha.
+    """
+    if ext not in FORMATS:
+        return jsonify(error="Formato no soportado"), 404
+    args = request.args
+    try:
+        data = heatmaps.render_image(
+            result_id,
+            size=args.get("size", 512),
+            colormap=args.get("colormap", "jet"),
+            threshold=args.get("threshold", 0.10),
+            alpha=args.get("alpha", 0.4),
+            image_format=ext,
+        )
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    if data is None:
+        return jsonify(error="Resultado no encontrado"), 404
+    return Response(data, mimetype=FORMATS[ext], headers={"Cache-Control": "private, max-age=3600"})
+
+
+@app.route("/heatmap-stats")
+def heatmap_stats():
+    """CAMs retenidos, renders memoizados y ocupación en disco."""
+    return jsonify(heatmaps.stats())
+
+
+@app.route("/storage-stats")
+def storage_stats():
+    """Uso en disco, cuotas y expulsiones de uploads y heatmaps."""
+    return jsonify(uploads=uploads.stats(), heatmaps=heatmap_files.stats())
+
+
+@app.route("/ready")
+def ready():
+    """200 cuando el modelo está cargado y calentado; 503 mientras tanto."""
+    body = {
+        "ready": warmup_done.is_set() and warmup_error is None,
+        "model_loaded": detector.model_loaded,
+        "error": warmup_error,
+        "startup": startup.as_dict(),
+        "worker": {
+            "pid": os.getpid(),
+            "threads": threads.to_dict(),
+            "model": detector.model_id if detector.model_loaded else None,
+        },
+    }
+    return jsonify(body), 200 if body["ready"] else 503
+
+
+@app.route("/admin/reload-model", methods=["POST"])
+def reload_model():
+    """
+    Cambia en caliente a otros pesos (JSON {"path": ...}) o recarga los
+    actuales, sin reiniciar ni cortar las peticiones en curso.
+    """
+    token = app.config["ADMIN_TOKEN"]
+    if token is None:
+        return jsonify(error="Recarga deshabilitada (UAO_ADMIN_TOKEN)"), 404
+    if request.headers.get("X-Admin-Token") != token:
+        return jsonify(error="No autorizado"), 403
+
+    new_path = (request.get_json(silent=True) or {}).get("path")
+    try:
+        identity = detector.swap_model(new_path)
+    except FileNotFoundError as exc:
+        return jsonify(error=str(exc)), 400
+    if shared:
+        # Los demás workers lo aplican en su próxima comprobación (`watch_model`)
+        publish_model(detector.registry.peek(detector.model_path).path)
+    return jsonify(model=identity, registry=detector.registry.stats())
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -38,221 +435,383 @@ def index():
         if not file or file.filename == "":
             return render_template("index.html")
 
-        # Guardar imagen con nombre único para evitar colisiones
-        ext = Path(file.filename).suffix.lower()
-        unique_name = f"{uuid.uuid4().hex}{ext}"
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], unique_name)
-        file.save(filepath)
-
-        # Inferencia
-        result = detector.predict(filepath)
-
-        patient_id   = request.form.get("patient_id", "")
-        patient_name = request.form.get("patient_name", "")
-        prob_value   = result.probability
-        prob_class   = "danger" if prob_value > 70 else "ok"
-
-        # Guardar heatmap — result.heatmap es numpy array uint8 (H,W,3)
-        heatmap_name = f"heatmap_{unique_name.replace(ext, '.png')}"
-        heatmap_path = os.path.join(app.config["HEATMAP_FOLDER"], heatmap_name)
-        Image.fromarray(result.heatmap.astype("uint8")).save(heatmap_path)
-
-        return render_template(
-            "index.html",
-            label=result.label,
-            probability=f"{prob_value:.2f}",
-            prob_class=prob_class,
-            image=f"uploads/{unique_name}",
-            heatmap_image=f"heatmaps/{heatmap_name}",
-            patient_id=patient_id,
-            patient_name=patient_name,
+        context = analyze_upload(
+            file.read(),
+            file.filename,
+            patient_id=request.form.get("patient_id", ""),
+            patient_name=request.form.get("patient_name", ""),
         )
+        return render_template("index.html", **context)
 
     return render_template("index.html")
 
 
-@app.route("/export-pdf")
-def export_pdf():
-    """Genera y descarga un PDF con el reporte del diagnóstico."""
-    patient_id   = request.args.get("patient_id", "Sin ID")
-    patient_name = request.args.get("patient_name", "Sin nombre")
-    label        = request.args.get("label", "—")
-    probability  = request.args.get("probability", "—")
-    image_file   = request.args.get("image", "")
-    heatmap_file = request.args.get("heatmap", "")
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, pagesize=A4,
-        leftMargin=2*cm, rightMargin=2*cm,
-        topMargin=2*cm, bottomMargin=2*cm
+@app.route("/study", methods=["POST"])
+def analyze_study():
+    """
+    Analiza uno o varios DICOM (campo images, repetible): los frames se
+    agrupan por StudyInstanceUID y pasan por el modelo en lotes. Responde
+    el resultado por frame y el agregado de cada estudio.
+    """
+    files = [f for f in request.files.getlist("images") if f and f.filename]
+    if not files:
+        return jsonify(error="Falta al menos un archivo 'images'"), 400
+    # Nombre único por archivo (dos subidas pueden llamarse igual)
+    sources = {f"{i}:{f.filename}": f.read() for i, f in enumerate(files)}
+
+    studies = group_studies(sources)
+    if not studies:
+        return jsonify(error="Ningún archivo es un DICOM válido"), 400
+    frames = sum(len(refs) for refs in studies.values())
+    if frames > app.config["STUDY_MAX_FRAMES"]:
+        return jsonify(error=f"Máximo {app.config['STUDY_MAX_FRAMES']} frames por petición"), 413
+
+    patient_id = request.form.get("patient_id", "")
+    patient_name = request.form.get("patient_name", "")
+    on_frame = lambda ref, result: register_result(result, patient_id, patient_name)
+    body = [
+        predict_study(detector, uid, refs, sources, app.config["STUDY_BATCH_SIZE"], on_frame).to_dict()
+        for uid, refs in studies.items()
+    ]
+    return jsonify(studies=body, frames=frames)
+
+
+def batch_limits():
+    mb = 1024 * 1024
+    return BatchLimits(
+        max_archive_bytes=int(app.config["BATCH_MAX_MB"] * mb),
+        max_members=app.config["BATCH_MAX_FILES"],
+        max_member_bytes=int(app.config["BATCH_MAX_FILE_MB"] * mb),
+        max_total_bytes=int(app.config["BATCH_MAX_MB"] * 4 * mb),
     )
 
-    # ── estilos ──
-    styles = getSampleStyleSheet()
-    style_title = ParagraphStyle("title",
-        fontName="Helvetica-Bold", fontSize=18,
-        textColor=colors.HexColor("#0d1117"),
-        spaceAfter=4, alignment=TA_CENTER)
-    style_subtitle = ParagraphStyle("subtitle",
-        fontName="Helvetica", fontSize=10,
-        textColor=colors.HexColor("#5a6070"),
-        spaceAfter=2, alignment=TA_CENTER)
-    style_section = ParagraphStyle("section",
-        fontName="Helvetica-Bold", fontSize=11,
-        textColor=colors.HexColor("#005cff"),
-        spaceBefore=14, spaceAfter=6)
-    style_body = ParagraphStyle("body",
-        fontName="Helvetica", fontSize=10,
-        textColor=colors.HexColor("#1a1a2e"),
-        spaceAfter=4, leading=15)
-    style_disclaimer = ParagraphStyle("disclaimer",
-        fontName="Helvetica-Oblique", fontSize=8,
-        textColor=colors.HexColor("#888888"),
-        alignment=TA_CENTER, spaceBefore=10)
-
-    story = []
-    W = A4[0] - 4*cm  # ancho útil
-
-    # ── encabezado ──
-    story.append(Paragraph("PneumoScan", style_title))
-    story.append(Paragraph("Sistema de Apoyo al Diagnóstico Médico de Neumonía", style_subtitle))
-    story.append(Spacer(1, 0.3*cm))
-    story.append(HRFlowable(width="100%", thickness=1.5, color=colors.HexColor("#005cff")))
-    story.append(Spacer(1, 0.4*cm))
-
-    # ── fecha y folio ──
-    now = datetime.now().strftime("%d/%m/%Y %H:%M")
-    meta_data = [
-        ["Fecha del reporte:", now],
-        ["Folio:", uuid.uuid4().hex[:8].upper()],
-    ]
-    meta_table = Table(meta_data, colWidths=[4*cm, W-4*cm])
-    meta_table.setStyle(TableStyle([
-        ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
-        ("FONTNAME", (1,0), (1,-1), "Helvetica"),
-        ("FONTSIZE", (0,0), (-1,-1), 9),
-        ("TEXTCOLOR", (0,0), (-1,-1), colors.HexColor("#5a6070")),
-        ("ALIGN", (0,0), (-1,-1), "LEFT"),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 3),
-    ]))
-    story.append(meta_table)
-    story.append(Spacer(1, 0.5*cm))
-
-    # ── datos del paciente ──
-    story.append(Paragraph("Datos del Paciente", style_section))
-    patient_data = [
-        ["Nombre completo:", patient_name],
-        ["Cédula / ID:", patient_id],
-    ]
-    pt = Table(patient_data, colWidths=[4.5*cm, W-4.5*cm])
-    pt.setStyle(TableStyle([
-        ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
-        ("FONTNAME", (1,0), (1,-1), "Helvetica"),
-        ("FONTSIZE", (0,0), (-1,-1), 10),
-        ("TEXTCOLOR", (0,0), (0,-1), colors.HexColor("#1a1a2e")),
-        ("TEXTCOLOR", (1,0), (1,-1), colors.HexColor("#1a1a2e")),
-        ("ROWBACKGROUNDS", (0,0), (-1,-1), [colors.HexColor("#f4f6fb"), colors.white]),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 7),
-        ("TOPPADDING", (0,0), (-1,-1), 7),
-        ("LEFTPADDING", (0,0), (-1,-1), 10),
-    ]))
-    story.append(pt)
-    story.append(Spacer(1, 0.5*cm))
-
-    # ── resultado ──
-    story.append(Paragraph("Resultado del Análisis", style_section))
-
-    diag_color = colors.HexColor("#ff4d6d") if label == "PNEUMONIA" else colors.HexColor("#00c9a7")
-    result_data = [
-        ["Diagnóstico:", label],
-        ["Confianza en el modelo:", f"{probability}%"],
-    ]
-    rt = Table(result_data, colWidths=[5.5*cm, W-5.5*cm])
-    rt.setStyle(TableStyle([
-        ("FONTNAME", (0,0), (0,-1), "Helvetica-Bold"),
-        ("FONTNAME", (1,0), (1,-1), "Helvetica-Bold"),
-        ("FONTSIZE", (0,0), (-1,-1), 11),
-        ("TEXTCOLOR", (0,0), (0,-1), colors.HexColor("#1a1a2e")),
-        ("TEXTCOLOR", (1,0), (1,-1), diag_color),
-        ("ROWBACKGROUNDS", (0,0), (-1,-1), [colors.HexColor("#f4f6fb"), colors.white]),
-        ("BOTTOMPADDING", (0,0), (-1,-1), 9),
-        ("TOPPADDING", (0,0), (-1,-1), 9),
-        ("LEFTPADDING", (0,0), (-1,-1), 10),
-        ("BOX", (0,0), (-1,-1), 1, colors.HexColor("#e0e4ef")),
-    ]))
-    story.append(rt)
-    story.append(Spacer(1, 0.6*cm))
-
-    # ── imágenes ──
-    img_w = (W - 0.8*cm) / 2
-    img_h = img_w * 0.9
-
-    def load_rl_image(rel_path, w, h):
-        full = os.path.join("ui/static", rel_path)
-        if rel_path and os.path.exists(full):
-            return RLImage(full, width=w, height=h)
-        # placeholder gris
-        placeholder = io.BytesIO()
-        Image.new("RGB", (300, 270), color=(220, 224, 235)).save(placeholder, "PNG")
-        placeholder.seek(0)
-        return RLImage(placeholder, width=w, height=h)
-
-    img_original = load_rl_image(image_file, img_w, img_h)
-    img_heatmap  = load_rl_image(heatmap_file, img_w, img_h)
-
-    img_table = Table(
-        [[Paragraph("Radiografía original", style_body),
-          Paragraph("Mapa de calor Grad-CAM", style_body)],
-         [img_original, img_heatmap]],
-        colWidths=[img_w, img_w], hAlign="CENTER"
+
+def _spool_body(limit):
+    """Copia el cuerpo (ZIP crudo) a un archivo con seek, cortando en `limit`."""
+    spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    copied = 0
+    while chunk := request.stream.read(1024 * 1024):
+        copied += len(chunk)
+        if copied > limit:
+            spool.close()
+            raise BatchLimitError(f"El lote supera {limit} bytes")
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _take_stream(storage):
+    """
+    Se queda con el stream de un archivo subido. Flask cierra los archivos
+    de la petición al retornar la vista, antes de que termine una respuesta
+    en streaming; el FileStorage se queda con un stream vacío.
+    """
+    stream, storage.stream = storage.stream, io.BytesIO()
+    return stream
+
+
+@app.route("/batch", methods=["POST"])
+def analyze_batch():
+    """
+    Lote de imágenes: un ZIP (cuerpo application/zip o campo archive) o
+    varios archivos (campo images). Responde NDJSON: una línea por imagen
+    a medida que termina cada lote y una línea final con el resumen.
+    """
+    limits = batch_limits()
+    # Werkzeug corta el multipart al superar este tamaño (413)
+    request.max_content_length = limits.max_archive_bytes
+    try:
+        if request.mimetype in ("application/zip", "application/x-zip-compressed"):
+            archive, members = open_zip(_spool_body(limits.max_archive_bytes), limits)
+        elif request.files.get("archive"):
+            archive, members = open_zip(_take_stream(request.files["archive"]), limits)
+        else:
+            files = [f for f in request.files.getlist("images") if f and f.filename]
+            if len(files) > limits.max_members:
+                raise BatchLimitError(f"Máximo {limits.max_members} imágenes por lote")
+            archive, members = None, [(f.filename, _take_stream(f)) for f in files]
+    except BatchLimitError as exc:
+        return jsonify(error=str(exc)), 413
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    if not members:
+        return jsonify(error="El lote no contiene imágenes (.dcm/.jpg/.jpeg/.png)"), 400
+
+    if archive is not None:
+        items = iter_zip_members(archive, members, limits)
+    else:
+        items = ((name, stream.read()) for name, stream in members)
+    patient_id = request.form.get("patient_id", "")
+    patient_name = request.form.get("patient_name", "")
+
+    def stream():
+        started = time.perf_counter()
+        counts = {"ok": 0, "error": 0}
+        try:
+            for row in score_stream(
+                detector, items, app.config["BATCH_UPLOAD_SIZE"],
+                on_result=lambda name, result: register_result(result, patient_id, patient_name),
+            ):
+                counts["error" if "error" in row else "ok"] += 1
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+        except BatchLimitError as exc:
+            yield json.dumps({"error": str(exc), "aborted": True}, ensure_ascii=False) + "\n"
+        finally:
+            if archive is not None:
+                fileobj = archive.fp  # ZipFile no cierra un archivo que recibió abierto
+                archive.close()
+                fileobj.close()
+            else:
+                for _, f in members:
+                    f.close()
+        summary = {"done": True, "images": counts["ok"], "errors": counts["error"],
+                   "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1)}
+        yield json.dumps(summary) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no"})
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """Encola el análisis y responde de inmediato con el id del trabajo."""
+    file = request.files.get("image")
+    if not file or file.filename == "":
+        return jsonify(error="Falta el archivo 'image'"), 400
+
+    try:
+        job = jobs.submit({
+            "data": file.read(),
+            "filename": file.filename,
+            "patient_id": request.form.get("patient_id", ""),
+            "patient_name": request.form.get("patient_name", ""),
+        })
+    except QueueFullError as exc:
+        return jsonify(error=str(exc)), 503, {"Retry-After": "5"}
+
+    body = {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("job_status", job_id=job.id),
+        "events_url": url_for("job_events", job_id=job.id),
+    }
+    return jsonify(body), 202, {"Location": body["status_url"]}
+
+
+@app.route("/jobs", methods=["GET"])
+def jobs_stats():
+    """Profundidad de cola, rechazos y tiempos de espera/servicio."""
+    return jsonify(jobs.stats())
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify(error="Trabajo no encontrado"), 404
+    return jsonify(status)
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-sent events con cada cambio de estado hasta que termina."""
+    if jobs.status(job_id) is None:
+        return jsonify(error="Trabajo no encontrado"), 404
+
+    def stream():
+        last_status = None
+        while True:
+            status = jobs.wait_for_status(job_id, last_status, timeout=15.0)
+            if status is None:
+                return
+            if status["status"] == last_status:
+                yield ": keep-alive\n\n"
+                continue
+            last_status = status["status"]
+            yield f"event: {last_status}\ndata: {json.dumps(status)}\n\n"
+            if last_status in (DONE, ERROR):
+                return
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/scheduler-stats")
+def scheduler_stats():
+    """Estadísticas del micro-batching (profundidad de cola, tamaños de lote)."""
+    return jsonify(scheduler.stats())
+
+
+@app.route("/engine-stats")
+def engine_stats():
+    """Motor de inferencia en uso; con el compilado, trazas y paridad."""
+    return jsonify(detector.engine_stats())
+
+
+@app.route("/cache-stats")
+def cache_stats():
+    """Aciertos/fallos y ocupación de la caché de resultados."""
+    return jsonify(result_cache.stats())
+
+
+def _static_file(rel_path):
+    """Ruta real de un archivo bajo ui/static (None si no existe o se sale)."""
+    if not rel_path:
+        return None
+    root = os.path.realpath("ui/static")
+    full = os.path.realpath(os.path.join(root, rel_path))
+    if not full.startswith(root + os.sep) or not os.path.isfile(full):
+        return None
+    return full
+
+
+def report_entry(fields):
+    """
+    Entrada de reporte a partir de los campos de un análisis (query string,
+    JSON o resultado de un trabajo). Las imágenes se cargan solo si el
+    reporte no las tiene ya preparadas.
+    """
+    result_id = fields.get("result_id") or ""
+    record = results_store.get(result_id) if result_id else None
+    if record is not None:
+        # El historial manda sobre lo que venga en la petición
+        fields = {**fields, **record.to_dict(), "probability": f"{record.probability:.2f}"}
+    stored = heatmaps.get(result_id) if result_id else None
+
+    original_key = original = None
+    upload = _static_file(fields.get("image", ""))
+    if upload is not None:
+        original_key = f"upload:{upload}:{os.stat(upload).st_mtime_ns}"
+        original = lambda px: read_gray(upload, size=px).pixels
+    elif stored is not None:
+        original_key = f"result:{result_id}"
+        original = lambda px: stored[1].pixels
+
+    heatmap_key = heatmap = None
+    if stored is not None:
+        heatmap_key = f"heatmap:{result_id}"
+        heatmap = lambda px: render_cam(stored[0], stored[1], size=px)
+    else:
+        legacy = _static_file(fields.get("heatmap", ""))
+        if legacy is not None and not legacy.endswith(".npz"):
+            heatmap_key = f"file:{legacy}:{os.stat(legacy).st_mtime_ns}"
+            heatmap = lambda px: np.asarray(Image.open(legacy).convert("RGB"))
+
+    return ReportEntry(
+        patient_id=fields.get("patient_id") or "Sin ID",
+        patient_name=fields.get("patient_name") or "Sin nombre",
+        label=fields.get("label") or "—",
+        probability=fields.get("probability") or "—",
+        original_key=original_key,
+        original=original,
+        heatmap_key=heatmap_key,
+        heatmap=heatmap,
     )
-    img_table.setStyle(TableStyle([
-        ("ALIGN", (0,0), (-1,-1), "CENTER"),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTSIZE", (0,0), (-1,0), 9),
-        ("TEXTCOLOR", (0,0), (-1,0), colors.HexColor("#5a6070")),
-        ("BOTTOMPADDING", (0,0), (-1,0), 5),
-        ("TOPPADDING", (1,0), (-1,-1), 0),
-        ("COLPADDING", (0,0), (-1,-1), 5),
-    ]))
-    story.append(img_table)
-    story.append(Spacer(1, 0.8*cm))
-
-    # ── línea final ──
-    story.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor("#cccccc")))
-    story.append(Paragraph(
-        "⚠ Este reporte es generado por un sistema de inteligencia artificial con fines de apoyo diagnóstico. "
-        "No reemplaza el criterio clínico de un médico especialista.",
-        style_disclaimer
-    ))
 
-    doc.build(story)
-    buffer.seek(0)
 
-    filename = f"Reporte_{patient_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+@app.route("/export-pdf")
+@timed("export_pdf")
+def export_pdf():
+    """Genera y descarga un PDF con el reporte del diagnóstico."""
+    entry = report_entry(request.args)
+    buffer = io.BytesIO(reports.render([entry]))
+
+    filename = f"Reporte_{entry.patient_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     return send_file(buffer, mimetype="application/pdf",
                      as_attachment=True, download_name=filename)
 
 
+@app.route("/export-pdf/batch", methods=["POST"])
+def export_pdf_batch():
+    """
+    Un solo PDF (una página por paciente) para una lista de trabajo, enviado
+    por trozos. JSON: {"items": [{patient_id, patient_name, label,
+    probability, result_id, image}, ...]} y/o {"job_ids": [...]}.
+    """
+    body = request.get_json(silent=True) or {}
+    items = list(body.get("items") or [])
+    for job_id in body.get("job_ids") or []:
+        # Puede haberlo corrido otro worker: `result` lee también lo publicado
+        result = jobs.result(job_id)
+        if result is None:
+            return jsonify(error=f"Trabajo sin resultado: {job_id}"), 404
+        items.append(result)
+    if not items:
+        return jsonify(error="Lista de trabajo vacía"), 400
+    if len(items) > app.config["REPORT_MAX_ITEMS"]:
+        return jsonify(error=f"Máximo {app.config['REPORT_MAX_ITEMS']} pacientes por reporte"), 413
+
+    entries = [report_entry(item) for item in items]
+    filename = f"Reporte_lote_{len(entries)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return Response(
+        reports.stream(entries),
+        mimetype="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _cohort_filters(args):
+    return {
+        "patient_id": args.get("patient_id") or None,
+        "since": args.get("since") or None,
+        "until": args.get("until") or None,
+    }
+
+
+@app.route("/results")
+def results_history():
+    """
+    Historial de resultados (JSON), filtrado por patient_id y/o rango
+    since/until (fechas ISO). Como máximo `limit` filas, las más antiguas
+    primero.
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit", 100)), 1000))
+        records = results_store.iter_records(**_cohort_filters(request.args), page_size=limit)
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    rows = [r.to_dict() for _, r in zip(range(limit), records)]
+    return jsonify(results=rows, count=len(rows))
+
+
+@app.route("/results-stats")
+def results_stats():
+    """Filas del historial y estado del escritor por lotes."""
+    return jsonify(results_store.stats())
+
+
 @app.route("/export-csv")
 def export_csv():
-    """Exporta el resultado actual como descarga CSV."""
-    patient_id  = request.args.get("patient_id", "")
-    label       = request.args.get("label", "")
-    probability = request.args.get("probability", "")
-
-    def generate():
-        yield "cedula,diagnostico,probabilidad\n"
-        yield f"{patient_id},{label},{probability}%\n"
+    """
+    Exporta resultados del historial como CSV: uno (result_id) o una
+    cohorte (patient_id y/o since/until). La cohorte se envía por trozos,
+    página a página, sin cargarla completa en memoria.
+    """
+    result_id = request.args.get("result_id")
+    if result_id:
+        record = results_store.get(result_id)
+        if record is None:
+            results_store.flush()  # puede estar aún en el lote del escritor
+            record = results_store.get(result_id)
+        if record is None:
+            return jsonify(error="Resultado no encontrado"), 404
+        name = record.patient_id or "paciente"
+        body = csv_chunks([record])
+    else:
+        filters = _cohort_filters(request.args)
+        try:
+            body = results_store.export_csv(**filters)
+        except ValueError as exc:
+            return jsonify(error=str(exc)), 400
+        name = filters["patient_id"] or "cohorte"
 
     headers = {
-        "Content-Disposition": f"attachment; filename=reporte_{patient_id or 'paciente'}.csv",
+        "Content-Disposition": f"attachment; filename=reporte_{name}.csv",
         "Content-Type": "text/csv",
     }
-    return Response(generate(), headers=headers)
+    return Response(body, headers=headers)
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    # Servidor de desarrollo; en producción: python main.py serve --workers N
+    app.run(debug=os.environ.get("UAO_DEBUG", "0") == "1", threaded=True)
\ No newline at end of file